@@ -39,6 +39,8 @@ export interface TraceRequest {
   keep_artifacts?: boolean;
   /** 詳細ログ出力 (デフォルト: false) */
   debug_logging?: boolean;
+  /** ユニット毎の実行時間プロファイルを meta.profile に含める (デフォルト: false) */
+  profile?: boolean;
 }
 
 /**
@@ -104,6 +106,28 @@ export interface MetaInfo {
   stability_check_failures: string[];
   /** 警告メッセージ */
   warnings: string[];
+  /** ユニット毎の実行時間プロファイル（任意: profile=true の時のみ値が入り、それ以外はnull） */
+  profile?: ProfileInfo | null;
+}
+
+/**
+ * 実行時間プロファイル (meta.profile)
+ */
+export interface ProfileInfo {
+  /** プロファイル対象のサイクル数 */
+  num_cycles: number;
+  /** プロファイル対象の実行時間（秒） */
+  elapsed_seconds: number;
+  /** 平均シミュレーション速度（実行時間0ならnull） */
+  cycles_per_sec: number | null;
+  /** 一定サイクル間隔毎の速度サンプル */
+  cycle_rate: {
+    cycle: number;
+    elapsed_seconds: number;
+    cycles_per_sec: number;
+  }[];
+  /** ユニット名 -> メソッド名 ("transfer", "update", "emulator.run", ...) -> 計測値 */
+  units: Record<string, Record<string, { calls: number; seconds: number }>>;
 }
 
 /**
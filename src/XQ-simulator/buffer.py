@@ -1,4 +1,4 @@
-from queue import Queue
+from collections import deque
 
 class buffer:
     def __init__(self, buf_name, buf_size):
@@ -16,28 +16,29 @@ class buffer:
         self.full = False       # to prev_stage
         self.empty = True       # to next_stage
         # Included hardware unit
-        self.buffer = Queue(maxsize=self.buf_size)
-    
+        # NOTE: buf_size <= 0 means an unbounded buffer (as queue.Queue)
+        self.buffer = deque()
+
     # Intra-unit wire transfer
     def transfer(self):
         # Output wire
         if not self.empty:
-            self.head = self.buffer.queue[0]
+            self.head = self.buffer[0]
         else:
             self.head = None
         return
 
-    # Sequential logic        
+    # Sequential logic
     def update(self):
         # full and empty define buffer's state
-        if not self.full and (self.input_data is not None): 
-            self.buffer.put(self.input_data)
+        if not self.full and (self.input_data is not None):
+            self.buffer.append(self.input_data)
 
         if not self.empty and self.input_ready:
-            self.buffer.get()
-        
-        self.full = self.buffer.full()
-        self.empty = self.buffer.empty()
+            self.buffer.popleft()
+
+        self.full = (0 < self.buf_size <= len(self.buffer))
+        self.empty = (len(self.buffer) == 0)
         return
 
     def debug(self):
@@ -46,7 +47,56 @@ class buffer:
         print("{}.head: {}".format(self.buf_name, self.head))
         print("{}.full: {}".format(self.buf_name, self.full))
         print("{}.empty: {}".format(self.buf_name, self.empty))
-        print("{}.length: {}".format(self.buf_name, self.buffer.qsize()))
-        print("{}.buffer: {}".format(self.buf_name, self.buffer.queue))
+        print("{}.length: {}".format(self.buf_name, len(self.buffer)))
+        print("{}.buffer: {}".format(self.buf_name, self.buffer))
+
+        return
+
+
+### Micro-benchmark ###
+# python buffer.py: compares one transfer/update cycle against the former queue.Queue-based buffer
+class queue_buffer(buffer):
+    def __init__(self, buf_name, buf_size):
+        from queue import Queue
+        super().__init__(buf_name, buf_size)
+        self.buffer = Queue(maxsize=self.buf_size)
+
+    def transfer(self):
+        if not self.empty:
+            self.head = self.buffer.queue[0]
+        else:
+            self.head = None
+        return
 
+    def update(self):
+        if not self.full and (self.input_data is not None):
+            self.buffer.put(self.input_data)
+        if not self.empty and self.input_ready:
+            self.buffer.get()
+        self.full = self.buffer.full()
+        self.empty = self.buffer.empty()
         return
+
+
+def run_benchmark(buf_class, buf_size, num_cycle):
+    buf = buf_class("bench", buf_size)
+    trace = []
+    for cycle in range(num_cycle):
+        # push on 2 of 3 cycles, pop on 1 of 2 cycles: fills up and drains
+        buf.input_data = cycle if (cycle % 3) != 0 else None
+        buf.input_ready = (cycle % 2) == 0
+        buf.transfer()
+        buf.update()
+        trace.append((buf.head, buf.full, buf.empty))
+    return trace
+
+
+if __name__ == "__main__":
+    import timeit
+
+    num_cycle = 100000
+    for buf_size in [2, 10]:
+        assert run_benchmark(buffer, buf_size, 1000) == run_benchmark(queue_buffer, buf_size, 1000)
+        t_deque = timeit.timeit(lambda: run_benchmark(buffer, buf_size, num_cycle), number=3) / 3
+        t_queue = timeit.timeit(lambda: run_benchmark(queue_buffer, buf_size, num_cycle), number=3) / 3
+        print("buf_size {}: deque {:.3f} sec, queue.Queue {:.3f} sec ({:.2f}x) for {} cycles".format(buf_size, t_deque, t_queue, t_queue/t_deque, num_cycle))
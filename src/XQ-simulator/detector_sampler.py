@@ -0,0 +1,535 @@
+#
+import os, sys
+#
+curr_path = os.path.abspath(__file__)
+curr_dir = os.path.dirname(curr_path)
+par_dir = os.path.join(curr_dir, os.pardir)
+
+#
+from absl import flags
+from absl import app
+#
+from parse import compile
+#
+import timeit
+import copy
+import pickle
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import stim
+#
+sys.path.insert(0, par_dir)
+from util import *
+#
+from xq_simulator import xq_simulator
+from qc_backend import QC_BACKEND_ENV
+from error_decode_unit import edu_batch, EDU_READY, EDU_TOKEN_ALLOCATE, EDU_ERROR_PAIRING, EDU_WAITING
+
+'''
+# detector_sampler estimates the logical error rate (LER) of a patch layout decoded by the EDU
+# 1) capture: run the program in emulate mode (skip_pqsim) until the target RUN_ESM block
+#    - one syndrome round of the block (QXU op_trace) and the EDU state at its first round
+#    - logical observables of the plane layout of the emulator (lq_pchidx/lq_pchtype) covered by the round
+# 2) compile: a memory experiment of code_dist rounds as one stim circuit with the noise model of qc_compose_unit
+#    - detectors are the EDU syndromes (ancillas are not reset: rec(r) ^ rec(r-2))
+#    - the last round and the final data readout are noiseless, so every error is visible to the EDU in the window
+# 3) sample: all windows of a batch at once with the compiled stim samplers
+# 4) decode: replay each window on a copy of the captured EDU and compare its correction with the observable flips
+#    - windows with the same detection events are decoded once (the EDU only sees rec(r) ^ rec(r-2))
+#    - vector engine: the distinct windows of a batch are stepped at once on edu_batch (a window axis on the EDU),
+#      split over num_proc processes; the loop engine replays them window by window
+#
+# Throughput (vector engine, one core): the windows are still decoded cycle-exactly, so the cost grows with the grid
+# and the EDU cycles per round. d=3 at p=5e-3: ~1300 rounds/sec, ~40x the window by window replay;
+# d=5 at p=5e-4: ~200 rounds/sec. It scales linearly with num_proc, so millions of rounds in minutes need
+# tens of cores at d=3 and are out of reach of one machine at d=5.
+'''
+
+# QXU op -> stim gates (noise is added separately)
+STIM_GATE = {
+        'h': ['H'],
+        'h_s': ['H', 'S'],
+        'sdag_h': ['S_DAG', 'H'],
+        'h_sdag_h': ['H', 'S_DAG', 'H'],
+        'x': ['X'],
+        'y': ['Y'],
+        'z': ['Z'],
+        'i': []
+        }
+# EDU ticks to wait for a round or for the window output
+MAX_IDLE_TICK = 4096
+
+
+class detector_sampler:
+    def __init__(self, config, qbin, num_lq, esm_idx=0, basis='Z', seed=None):
+        self.config = config
+        self.qbin = qbin
+        self.num_lq = num_lq
+        self.esm_idx = esm_idx
+        if basis not in ['X', 'Z']:
+            raise Exception("detector_sampler - __init__: invalid basis {}".format(basis))
+        self.basis = basis
+        self.seed = seed
+        #
+        self.param = None
+        self.round_trace = None
+        self.edu_snapshot = None
+        self.lq_pchidx = None
+        self.lq_pchtype = None
+        self.num_row_dq = None
+        self.num_col_dq = None
+        self.num_row_aq = None
+        self.num_col_aq = None
+        self.aq_meas_idx = None
+        self.lop_list = None
+        self.skip_lq_list = None
+        self.circuit = None
+        self.num_det_per_round = None
+        self.window_cache = dict()
+        self.cap_cycle = None
+
+    ### Capture ###
+    def capture(self):
+        # One trace per QXU run; a RUN_ESM block is a run of consecutive traces with CZs
+        if not os.environ.get(QC_BACKEND_ENV):
+            os.environ[QC_BACKEND_ENV] = "inline"
+        simulator = xq_simulator()
+        simulator.setup(config=self.config, qbin=self.qbin, num_lq=self.num_lq, skip_pqsim=True, num_shots=0,
+                        dump=False, regen=True, debug=False)
+        self.param = simulator.param
+
+        block_idx = -1
+        in_block = False
+        num_block_trace = 0
+        last_trace = None
+        while not simulator.sim_done:
+            simulator.run_cycle_transfer()
+            if simulator.edu.input_aqmeas_valid and block_idx == self.esm_idx and self.edu_snapshot is None:
+                # first round of the target block: inputs are driven, registers not updated yet
+                self.edu_snapshot = pickle.dumps(simulator.edu)
+                self.cap_cycle = simulator.cycle
+            simulator.run_cycle_update()
+            simulator.run_cycle_tick()
+            simulator.run_cycle_skip()
+
+            op_trace = simulator.qxu.emulator.op_trace
+            if op_trace is None or op_trace is last_trace:
+                continue
+            last_trace = op_trace
+            if any(op[0] == 'cz' for step in op_trace for op in step):
+                if not in_block:
+                    in_block = True
+                    num_block_trace = 0
+                    block_idx += 1
+                num_block_trace += 1
+                # the first trace of a block also holds the tail of the previous instruction
+                if block_idx == self.esm_idx and num_block_trace == 2:
+                    self.round_trace = op_trace
+            else:
+                in_block = False
+            if self.round_trace is not None and self.edu_snapshot is not None:
+                break
+
+        if self.round_trace is None or self.edu_snapshot is None:
+            raise Exception("detector_sampler - capture: RUN_ESM block {} with two rounds not found in {}".format(self.esm_idx, self.qbin))
+
+        emulator = simulator.qxu.emulator
+        self.lq_pchidx = list(emulator.lq_pchidx)
+        self.lq_pchtype = list(emulator.lq_pchtype)
+        self.num_row_dq = emulator.num_row_dq
+        self.num_col_dq = emulator.num_col_dq
+        self.num_row_aq = emulator.num_row_aq
+        self.num_col_aq = emulator.num_col_aq
+        ## ancillas measured every round, in measurement order
+        self.aq_meas_idx = [op[2] for step in self.round_trace for op in step if op[0] == 'meas']
+        if any(op[0] == 'meas' and op[1] == 'dq' for step in self.round_trace for op in step):
+            raise Exception("detector_sampler - capture: data qubits are measured in the round trace")
+        ## logical operators of the layout in the readout basis (5D idx for the EDU, 2D idx for stim)
+        ### an operator with a data qubit out of every stabilizer of the round (e.g. 'mb' before the merge) is skipped
+        active_dq = {self.get_flat_idx(op[1], op[2]) for step in self.round_trace for op in step if op[0] == 'cz'} \
+                  | {self.get_flat_idx(op[3], op[4]) for step in self.round_trace for op in step if op[0] == 'cz'}
+        lq_pchidx = self.lq_pchidx
+        lq_pchtype = self.lq_pchtype
+        self.lq_pchidx = []
+        self.lq_pchtype = []
+        self.skip_lq_list = []
+        self.lop_list = []
+        for pchidx, pchtype in zip(lq_pchidx, lq_pchtype):
+            qb_lop_x, qb_lop_z = get_lop_qb(pchidx, pchtype, self.param.code_dist)
+            # Z readout is flipped by X errors on the Z operator, and vice versa
+            qb_lop = qb_lop_z if self.basis == 'Z' else qb_lop_x
+            if all(q in active_dq for q in self.get_lop_flat_idx(qb_lop)):
+                self.lq_pchidx.append(pchidx)
+                self.lq_pchtype.append(pchtype)
+                self.lop_list.append(qb_lop)
+            else:
+                self.skip_lq_list.append((pchidx, pchtype))
+        return
+
+    ### Compile ###
+    def get_flat_idx(self, qb_type, idx):
+        if qb_type == 'dq':
+            return idx[0] * self.num_col_dq + idx[1]
+        else:
+            return self.num_row_dq * self.num_col_dq + idx[0] * self.num_col_aq + idx[1]
+
+    def get_lop_flat_idx(self, qb_lop):
+        patch_size = self.param.code_dist + 1
+        flat_idx_list = []
+        for (pchrow, pchcol, ucrow, uccol, qbidx) in qb_lop:
+            row = pchrow * patch_size + ucrow * 2 + qbidx // 2
+            col = pchcol * patch_size + uccol * 2 + qbidx % 2
+            flat_idx_list.append(self.get_flat_idx('dq', (row, col)))
+        return flat_idx_list
+
+    def append_round(self, circuit, phy_err_rate):
+        for step in self.round_trace:
+            meas_list = []
+            for (op_type, q1_qb_type, q1_idx, q2_qb_type, q2_idx) in step:
+                q1 = self.get_flat_idx(q1_qb_type, q1_idx)
+                if op_type == 'cz' or op_type == 'cnot':
+                    q2 = self.get_flat_idx(q2_qb_type, q2_idx)
+                    circuit.append('CZ' if op_type == 'cz' else 'CX', [q1, q2])
+                    if phy_err_rate > 0:
+                        circuit.append('DEPOLARIZE2', [q1, q2], phy_err_rate)
+                elif op_type == 'meas':
+                    meas_list.append(q1)
+                elif op_type in STIM_GATE:
+                    for gate in STIM_GATE[op_type]:
+                        circuit.append(gate, [q1])
+                    if phy_err_rate > 0:
+                        circuit.append('DEPOLARIZE1', [q1], phy_err_rate)
+                else:
+                    raise Exception("detector_sampler - append_round: unsupported op_type {}".format(op_type))
+            if meas_list:
+                # the error of a measurement op is applied before the readout
+                if phy_err_rate > 0:
+                    circuit.append('DEPOLARIZE1', meas_list, phy_err_rate)
+                circuit.append('M', meas_list)
+        return
+
+    def compile_circuit(self, phy_err_rate=None):
+        if phy_err_rate is None:
+            phy_err_rate = self.param.phy_err_rate
+        code_dist = self.param.code_dist
+        num_meas = len(self.aq_meas_idx)
+        num_dq = self.num_row_dq * self.num_col_dq
+        num_qb = num_dq + self.num_row_aq * self.num_col_aq
+
+        circuit = stim.Circuit()
+        circuit.append('R', range(num_qb))
+        if self.basis == 'X':
+            circuit.append('H', range(num_dq))
+        for r in range(code_dist):
+            self.append_round(circuit, phy_err_rate if r < code_dist-1 else 0)
+            # EDU syndrome: none in the first round, rec(r) ^ rec(r-2) after
+            if r == 0:
+                continue
+            for k in range(num_meas):
+                target_list = [stim.target_rec(k - num_meas)]
+                if r >= 2:
+                    target_list.append(stim.target_rec(k - 3*num_meas))
+                circuit.append('DETECTOR', target_list)
+        ## data readout
+        if self.basis == 'X':
+            circuit.append('H', range(num_dq))
+        circuit.append('M', range(num_dq))
+        for obs_idx, qb_lop in enumerate(self.lop_list):
+            circuit.append('OBSERVABLE_INCLUDE', [stim.target_rec(q - num_dq) for q in self.get_lop_flat_idx(qb_lop)], obs_idx)
+
+        # raises if a detector or an observable is not deterministic without noise
+        circuit.detector_error_model(allow_gauge_detectors=False)
+        self.circuit = circuit
+        self.num_det_per_round = num_meas
+        return circuit
+
+    ### Decode ###
+    def init_edu(self):
+        # The sampled window starts from reset qubits: no cell has a previous measurement
+        edu = pickle.loads(self.edu_snapshot)
+        if edu.engine == "vector":
+            edu.educell_vector.first_aqmeas[:] = True
+            edu.educell_vector.prev_aqmeas_reg = np.zeros_like(edu.educell_vector.prev_aqmeas_reg)
+        else:
+            for _, educell in np.ndenumerate(edu.educell_array):
+                educell.first_aqmeas = True
+                educell.prev_aqmeas_reg = [0, 0]
+        for key in edu.unit_stat.edu_cycle_result:
+            edu.unit_stat.edu_cycle_result[key] = []
+        return edu
+
+    def tick_edu(self, edu, cycle, aqmeas_array=None):
+        edu.input_aqmeas_valid = aqmeas_array is not None
+        if aqmeas_array is not None:
+            edu.input_aqmeas_array = aqmeas_array
+        edu.input_dqmeas_valid = False
+        edu.input_pchinfo_valid = False
+        edu.input_last_pchinfo = False
+        edu.input_tcu_valid = False
+        edu.input_stall = False
+        edu.input_pchwr_stall = False
+        edu.transfer()
+        # output is read at the transfer of the cycle it is valid, as PFU does
+        output_error_array = edu.output_error_array if edu.output_valid else None
+        edu.update(cycle)
+        return output_error_array
+
+    def decode_window(self, aqmeas_list):
+        # aqmeas_list: 2D aq measurement arrays of the window, one per round (loop engine)
+        edu = self.init_edu()
+        cycle = self.cap_cycle
+        output_error_array = None
+        for aqmeas_array in aqmeas_list:
+            output_error_array = self.tick_edu(edu, cycle, aqmeas_array)
+            cycle += 1
+            # wait until the round is popped & decoded before the next one
+            for _ in range(MAX_IDLE_TICK):
+                if output_error_array is not None:
+                    break
+                if edu.engine == "vector":
+                    buf_valid = edu.educell_vector.aqmeas_buf_valid
+                else:
+                    buf_valid = [buf['valid'] for buf in edu.educell_array[0][0].aqmeas_buf]
+                if edu.state in ['ready', 'waiting'] and not any(buf_valid):
+                    break
+                output_error_array = self.tick_edu(edu, cycle)
+                cycle += 1
+        for _ in range(MAX_IDLE_TICK):
+            if output_error_array is not None:
+                break
+            output_error_array = self.tick_edu(edu, cycle)
+            cycle += 1
+        if output_error_array is None:
+            raise Exception("detector_sampler - decode_window: no EDU output after {} rounds".format(len(aqmeas_list)))
+
+        # predicted flip of each observable: parity of the correction on its support
+        err_bit = PAULI_X if self.basis == 'Z' else PAULI_Z
+        pred_list = []
+        for qb_lop in self.lop_list:
+            pred = 0
+            for idx in qb_lop:
+                pred ^= int((output_error_array[idx] & err_bit) != 0)
+            pred_list.append(pred)
+        return pred_list, edu.unit_stat.edu_cycle_result
+
+    def decode_batch(self, aqmeas_batch):
+        # aqmeas_batch: (num_window, num_round, num_row_aq, num_col_aq) aq measurements (vector engine)
+        ## the windows are decoded at once by edu_batch, each on the schedule of decode_window:
+        ## - a round is fed at a tick once the previous one is popped & decoded (or its output is read)
+        ## - layer mode: a tick that starts a decoding burst holds its inputs until the layer is finished
+        ## - a window is done at the first output after its last round
+        num_window, num_round = aqmeas_batch.shape[:2]
+        edu = self.init_edu()
+        batch = edu_batch(edu, num_window)
+        window_idx = np.arange(num_window)
+        num_fed = np.zeros(num_window, dtype=int)
+        num_idle_tick = np.zeros(num_window, dtype=int)
+        has_output = np.zeros(num_window, dtype=bool)
+        in_burst = np.zeros(num_window, dtype=bool)
+        esm_finished = np.zeros(num_window, dtype=bool)
+        output_error_array = np.zeros((num_window,)+batch.error_array_reg.shape[1:], dtype=np.uint8)
+        error_array_list = np.zeros_like(output_error_array)
+        while batch.live.any():
+            tick = batch.live & ~in_burst
+            done = tick & (num_fed == num_round) & has_output
+            if done.any():
+                error_array_list[window_idx[done]] = output_error_array[done]
+                batch.live = batch.live & ~done
+                tick &= ~done
+                ## finished windows keep stepping (no stats) until a quarter of the batch is done
+                if (~batch.live).sum()*4 >= len(batch.live):
+                    idx = np.flatnonzero(batch.live)
+                    batch.select(idx)
+                    window_idx, num_fed, num_idle_tick, has_output, in_burst, esm_finished, output_error_array = \
+                        [val[idx] for val in (window_idx, num_fed, num_idle_tick, has_output, in_burst, esm_finished, output_error_array)]
+                    continue
+            # inputs of the ticks
+            idle = ((batch.state == EDU_READY) | (batch.state == EDU_WAITING)) & ~batch.aqmeas_buf_valid.any(axis=1)
+            feed = tick & (num_fed < num_round) & ((num_fed == 0) | has_output | idle | (num_idle_tick >= MAX_IDLE_TICK))
+            if (tick & (num_fed == num_round) & (num_idle_tick >= 2*MAX_IDLE_TICK)).any():
+                raise Exception("detector_sampler - decode_batch: no EDU output after {} rounds".format(num_round))
+            if (feed & esm_finished).any():
+                raise Exception("detector_sampler - decode_batch: the EDU block finished before the last round of a window")
+            batch.input_aqmeas_valid = np.where(tick, feed, batch.input_aqmeas_valid)
+            batch.input_aqmeas_array[feed] = aqmeas_batch[window_idx[feed], num_fed[feed]]
+            num_fed += feed
+            num_idle_tick = np.where(feed, 0, num_idle_tick + tick)
+            batch.transfer()
+            # output is read at the transfer of the tick, as tick_edu does
+            has_output = np.where(tick, batch.output_valid, has_output)
+            output_error_array[tick & batch.output_valid] = batch.error_array_reg[tick & batch.output_valid]
+            burst = tick & ((batch.state == EDU_READY) | (batch.state == EDU_WAITING)) & (batch.next_state == EDU_TOKEN_ALLOCATE)
+            if (burst & esm_finished).any():
+                raise Exception("detector_sampler - decode_batch: a decoding burst after the end of the EDU block")
+            batch.update()
+            esm_finished |= batch.esm_finish
+            in_burst = (in_burst | burst) & ((batch.state == EDU_TOKEN_ALLOCATE) | (batch.state == EDU_ERROR_PAIRING))
+
+        # predicted flip of each observable: parity of the correction on its support
+        err_bit = PAULI_X if self.basis == 'Z' else PAULI_Z
+        flip_array = (error_array_list & err_bit) != 0
+        pred_array = np.zeros((num_window, len(self.lop_list)), dtype=int)
+        for i, qb_lop in enumerate(self.lop_list):
+            row, col = np.divmod(self.get_lop_flat_idx(qb_lop), self.num_col_dq)
+            pred_array[:, i] = flip_array[:, row, col].sum(axis=1) % 2
+        return list(zip(pred_array.tolist(), batch.get_cycle_result(num_window)))
+
+    def get_aqmeas_batch(self, meas_array):
+        # (num_window, code_dist, num_row_aq, num_col_aq) aq measurements of the sampled windows, 0 if not measured
+        ## meas_array: rows of the compiled circuit (rounds, then the data readout)
+        num_window = len(meas_array)
+        num_round_meas = self.param.code_dist * self.num_det_per_round
+        row, col = np.array(self.aq_meas_idx).T
+        aqmeas_batch = np.zeros((num_window, self.param.code_dist, self.num_row_aq, self.num_col_aq), dtype=np.int8)
+        aqmeas_batch[:, :, row, col] = meas_array[:, :num_round_meas].reshape(num_window, self.param.code_dist, self.num_det_per_round)
+        return aqmeas_batch
+
+    ### Sample ###
+    def sample(self, num_window, batch_size=1024, num_proc=1):
+        if self.circuit is None:
+            self.compile_circuit()
+        code_dist = self.param.code_dist
+        num_lop = len(self.lop_list)
+        meas_sampler = self.circuit.compile_sampler(seed=self.seed)
+        m2d_converter = self.circuit.compile_m2d_converter()
+
+        num_logical_error = np.zeros(num_lop, dtype=int)
+        num_window_error = 0
+        defect_hist = np.zeros(self.num_det_per_round+1, dtype=int)
+        edu_cycle_result = None
+        num_done = 0
+        pool = None
+        num_worker = 1
+        if num_proc != 1:
+            # workers get a copy of the captured sampler (the EDU snapshot), not the circuit or the cache
+            worker = copy.copy(self)
+            worker.circuit = None
+            worker.window_cache = dict()
+            pool = ProcessPoolExecutor(max_workers=num_proc, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=init_decode_proc, initargs=(pickle.dumps(worker),))
+            num_worker = num_proc if num_proc is not None else os.cpu_count()
+        try:
+            while num_done < num_window:
+                num_batch = min(batch_size, num_window - num_done)
+                meas_array = meas_sampler.sample(num_batch)
+                det_array, obs_array = m2d_converter.convert(measurements=meas_array, separate_observables=True)
+                key_list = [np.packbits(det_row).tobytes() for det_row in det_array]
+                ## decode the new distinct windows of the batch
+                new_key_dict = dict()
+                for w, key in enumerate(key_list):
+                    if key not in self.window_cache and key not in new_key_dict:
+                        new_key_dict[key] = w
+                aqmeas_batch = self.get_aqmeas_batch(meas_array[list(new_key_dict.values())])
+                ## one edu_batch per worker (vector engine), or window by window
+                if len(aqmeas_batch) == 0:
+                    decode_res_list = []
+                elif self.param.edu_engine == "vector":
+                    aqmeas_chunks = np.array_split(aqmeas_batch, min(num_worker, len(aqmeas_batch)))
+                    decode_map = map(self.decode_batch, aqmeas_chunks) if pool is None else pool.map(decode_batch_proc, aqmeas_chunks)
+                    decode_res_list = [decode_res for decode_res_chunk in decode_map for decode_res in decode_res_chunk]
+                else:
+                    decode_map = map(self.decode_window, aqmeas_batch) if pool is None else pool.map(decode_window_proc, aqmeas_batch)
+                    decode_res_list = list(decode_map)
+                for key, decode_res in zip(new_key_dict, decode_res_list):
+                    self.window_cache[key] = decode_res
+
+                for w in range(num_batch):
+                    det_row = det_array[w]
+                    ## defects per round
+                    for r in range(code_dist-1):
+                        defect_hist[int(det_row[r*self.num_det_per_round:(r+1)*self.num_det_per_round].sum())] += 1
+                    pred_list, window_cycle_result = self.window_cache[key_list[w]]
+
+                    error_list = [int(obs_array[w][i]) ^ pred_list[i] for i in range(num_lop)]
+                    num_logical_error += error_list
+                    num_window_error += int(any(error_list))
+                    if edu_cycle_result is None:
+                        edu_cycle_result = {key: [] for key in window_cycle_result}
+                    for key, val in window_cycle_result.items():
+                        edu_cycle_result[key].extend(val)
+                num_done += num_batch
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        sample_res = {
+                "num_window": num_window,
+                "num_round": num_window * code_dist,
+                "num_decoded_window": len(self.window_cache),
+                "basis": self.basis,
+                "physical_error_rate": self.param.phy_err_rate,
+                "lq_pchidx": self.lq_pchidx,
+                "lq_pchtype": self.lq_pchtype,
+                "skip_lq_list": self.skip_lq_list,
+                "num_logical_error": num_logical_error.tolist(),
+                "ler_list": (num_logical_error / num_window).tolist(),
+                "ler_window": num_window_error / num_window,
+                "defect_hist": defect_hist.tolist(),
+                "edu_cycle_result": edu_cycle_result
+                }
+        return sample_res
+
+
+# Decode pool
+## each process keeps its own copy of the captured sampler and decodes the windows it is sent
+decode_sampler = None
+
+def init_decode_proc(sampler_bytes):
+    global decode_sampler
+    decode_sampler = pickle.loads(sampler_bytes)
+    return
+
+
+def decode_window_proc(aqmeas_list):
+    return decode_sampler.decode_window(aqmeas_list)
+
+
+def decode_batch_proc(aqmeas_batch):
+    return decode_sampler.decode_batch(aqmeas_batch)
+
+
+### MAIN ###
+def main(argv):
+    b_format = compile("{}_n{}")
+    _, str_lq = b_format.parse(FLAGS.qbin)
+    num_lq = int(str_lq)+2 # total number of lq
+    seed = FLAGS.seed if FLAGS.seed >= 0 else None
+    num_proc = FLAGS.num_proc if FLAGS.num_proc > 0 else None
+
+    sampler = detector_sampler(FLAGS.config, FLAGS.qbin, num_lq, FLAGS.esm_idx, FLAGS.basis, seed)
+    start = timeit.default_timer()
+    sampler.capture()
+    print("Capture: {} sec (cycle {})".format(round(timeit.default_timer()-start, 3), sampler.cap_cycle), flush=True)
+    start = timeit.default_timer()
+    sample_res = sampler.sample(FLAGS.num_window, FLAGS.batch_size, num_proc)
+    sample_time = round(timeit.default_timer()-start, 3)
+
+    print("****** XQ-simulator Result - Detector-level logical error rate ******")
+    print("Physical error rate: {}, basis: {}".format(sample_res["physical_error_rate"], sample_res["basis"]))
+    print("Windows: {} ({} rounds, {} decoded by EDU) in {} sec".format(
+        sample_res["num_window"], sample_res["num_round"], sample_res["num_decoded_window"], sample_time))
+    for pchidx, pchtype, num_err, ler in zip(sample_res["lq_pchidx"], sample_res["lq_pchtype"], sample_res["num_logical_error"], sample_res["ler_list"]):
+        print("LQ {} ({}): {} errors, LER per window {}".format(pchidx, pchtype, num_err, ler))
+    for pchidx, pchtype in sample_res["skip_lq_list"]:
+        print("LQ {} ({}): skipped, not protected by the stabilizers of the round".format(pchidx, pchtype))
+    print("Any LQ: LER per window {}".format(sample_res["ler_window"]))
+    print("Defects per round: {}".format({k: v for k, v in enumerate(sample_res["defect_hist"]) if v > 0}))
+    cyc_list = np.array(sample_res["edu_cycle_result"]["cyc_edu_running_list"])
+    if len(cyc_list):
+        print("EDU cycles per round: mean {}, p99 {}, max {}".format(round(cyc_list.mean(), 3), np.percentile(cyc_list, 99), cyc_list.max()))
+        hist = np.bincount(cyc_list)
+        print("EDU cycles histogram: {}".format({k: int(v) for k, v in enumerate(hist) if v > 0}))
+    return
+
+if __name__ == "__main__":
+    FLAGS = flags.FLAGS
+    flags.DEFINE_string("config", "example_cmos_d5", "target config name", short_name='c')
+    flags.DEFINE_string("qbin", "pprIIZZZ_n5", "target quantum binary", short_name='b')
+    flags.DEFINE_integer("num_window", 10000, "num sampled windows of code_dist rounds", short_name='w')
+    flags.DEFINE_integer("batch_size", 1024, "num windows sampled at once", short_name='bs')
+    flags.DEFINE_integer("esm_idx", 0, "RUN_ESM block that sets the patch layout", short_name='ei')
+    flags.DEFINE_string("basis", "Z", "logical readout basis (X or Z)", short_name='ba')
+    flags.DEFINE_integer("seed", -1, "RNG seed of the sampling (-1: system entropy)", short_name='sd')
+    flags.DEFINE_integer("num_proc", 1, "num processes decoding the distinct windows of a batch (0: all cores)", short_name='np')
+    app.run(main)
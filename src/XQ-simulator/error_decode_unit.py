@@ -10,8 +10,75 @@ from util import *
 import numpy as np
 import copy
 import sys
+import json
+import pickle
+import hashlib
+import io
+from collections import OrderedDict
 import buffer as buffer
 
+# edu_cell_vector encodings
+## educell state
+CELL_READY, CELL_SOURCE, CELL_TRANSMIT, CELL_SYNK, CELL_BOUNDARY, CELL_INACTIVE = range(6)
+CELL_STATE_LIST = ['ready', 'source', 'transmit', 'synk', 'boundary', 'inactive']
+## educell role
+ROLE_ACTIVE, ROLE_BOUNDARY, ROLE_INACTIVE = range(3)
+ROLE_LIST = ['active', 'boundary', 'inactive']
+## spike/syndrome direction: port index of (nw, ne, sw, se, n, s), or none
+DIR_NW, DIR_NE, DIR_SW, DIR_SE, DIR_N, DIR_S, DIR_I = range(7)
+DIR_LIST = ['nw', 'ne', 'sw', 'se', 'n', 's', 'i']
+DIR_PORT = np.arange(6)
+## pchinfo of an empty pchinfo_buf
+EMPTY_PCHINFO = {'pchtype': 'i', 'facebd': ['i', 'i', 'i', 'i']}
+## EDU state (edu_batch)
+EDU_READY, EDU_TOKEN_ALLOCATE, EDU_ERROR_PAIRING, EDU_WAITING = range(4)
+EDU_STATE_LIST = ['ready', 'token_allocate', 'error_pairing', 'waiting']
+## edu_cycle_result keys, in the order of the edu_batch stat counters
+EDU_CYCLE_RESULT_KEY = ["num_propagation_list", "num_token_setup_list", "num_error_match_list", "num_layer_retry_list", 
+                        "cyc_edu_running_list", "cyc_token_setup_list"]
+
+# Round memo (vector engine, layer mode)
+## after its first cycle (the pop of the aq measurement into the syndromes), a decoding burst does not depend on
+## the raw aq measurements nor on the corrections accumulated so far: it is a function of the layout (pchinfo_version),
+## the syndromes, the last_aqmeas_flip, the control registers and the uarch
+## key: (uarch & config, layout of the pchinfo_version, hash of the MEMO_*_KEY_ATTR)
+### wires are not in the key: the two passes of transfer recompute them from the registers and the inputs
+### raw aq/dq measurements and corrections are not in the key (last_aqmeas_flip_array stands for the dq measurements)
+## hit: the recorded stat wires are replayed through update_stats (cycle count & edu_cycle_result),
+##      the end state is restored, and the raw registers (error_array_reg, prev_aqmeas_reg) and the eigen array
+##      are updated by the XOR deltas of the burst
+MEMO_EDU_KEY_ATTR = ["state", "set_first_aqmeas", "first_token", "pchinfo_regs", "pchinfo_taken", "opcode_reg", 
+                     "timeout_th", "timeout_counter", "aqmeas_counter", "round_counter", "curr_rowidx_reg", "last_token_reg", 
+                     "token_exist_rows_0_reg", "token_col_rows_0_reg", "token_valid_0_reg", 
+                     "token_exist_rows_1_reg", "token_exist_1_reg", "token_row_1_reg", "token_col_rows_1_reg", "token_valid_1_reg", 
+                     "token_match_reg", "output_valid", 
+                     "input_pchwr_stall", "input_pchinfo_valid", "input_pchinfo", "input_last_pchinfo", "input_piu_opcode", 
+                     "input_aqmeas_valid", "input_dqmeas_valid", "input_tcu_opcode", "input_tcu_valid", "input_stall", 
+                     "last_aqmeas_flip_array"]
+MEMO_CELL_KEY_ATTR = ["state", "token_reg", "flag_token", "spike_taken", "syndrome_taken", "esm_reg", "esm_delay_reg", 
+                      "bd_delay_reg", "spikedir_reg", "syndir_reg", "measerr_flag", "first_aqmeas", "last_measerr_flag", 
+                      "last_aqmeas_flip_reg", "aqmeas_buf_valid"]
+## not restored, per object (EDU, edu_cell_vector)
+### constants of the config, stats and memo bookkeeping
+### raw aq/dq measurements, corrections, and the wires derived from them:
+###     registers are updated by XOR deltas, wires are recomputed by the next transfer
+### layout: the predecoder outputs are kept (they match predecoder_version)
+MEMO_EDU_SKIP_ATTR = {"config", "unit_stat", "mode", "engine", "rowidx_regs", "diag_row", "diag_col", 
+                      "rr_out_idx", "rr_first_mask", "myrowidx_array", "dq_idx_map", "eigen_idx_map", 
+                      "memo_size", "memo_tag", "memo_layout", "educell_vector",
+                      "num_propagation", "num_token_setup", "num_error_match", "num_layer_retry", "cyc_edu_running", "cyc_token_setup",
+                      "input_aqmeas_array", "input_dqmeas_array", "error_array_reg", "next_error_array", "eigen_array",
+                      "output_error_array", "output_eigen_array",
+                      "pchinfo_version"}
+MEMO_CELL_SKIP_ATTR = {"config", "shape",
+                       "prev_aqmeas_reg", "aqmeas_buf_val", "aqmeasbuf_val", "esm_val", "output_eigen", "input_aqmeas_array",
+                       "predecoder_version", "input_pchinfo_version", "input_pchinfo",
+                       "role", "possible_dir", "first_aqmeas_flag", "syn_to_west", "syn_to_east"}
+## wires read by update_stats, recorded per cycle of a burst to replay its stats
+MEMO_STAT_WIRE = ["state", "next_state", "output_valid", "global_errormatch", "global_measmatch", "layer_retry", "layer_finish"]
+## (key) -> (end state, stat wires of each cycle, XOR deltas); shared by every EDU (LRU)
+round_memo = OrderedDict()
+
 class error_decode_unit:
     def __init__(self, unit_stat, config, mode):
         self.config = config
@@ -109,6 +176,7 @@ class error_decode_unit:
             init_pchinfo = {'pchtype': 'i', 'facebd': ['i', 'i', 'i', 'i']}
             self.pchinfo_regs.append(init_pchinfo) 
         self.pchinfo_taken = False  
+        self.pchinfo_version = 0 # layout version: bumped whenever the head of pchinfo_buf changes
         self.opcode_reg = '1'*self.config.opcode_bw 
         ## Internal register
         self.timeout_th = 2
@@ -152,18 +220,54 @@ class error_decode_unit:
             self.token_match_reg = False
 
         ## Output register
-        self.error_array_reg = np.full((self.config.num_dqrow, self.config.num_dqcol), 'i') 
+        self.error_array_reg = np.full((self.config.num_dqrow, self.config.num_dqcol), PAULI_I, dtype=np.uint8) 
         self.output_valid = False 
             
         # Microunits
         self.pchinfo_buf = buffer.buffer("edu_pibuf", 2)
-        self.educell_array = np.empty((self.config.num_aqrow, self.config.num_aqcol), dtype=object)
-        for (i, j), _ in np.ndenumerate(self.educell_array):
-            self.educell_array[i][j] = edu_cell(self.config, i, j) 
+        # Simulation engine
+        self.engine = self.config.edu_engine
+        if self.engine == "vector":
+            # educell registers & wires as arrays over the ancilla grid
+            self.educell_vector = edu_cell_vector(self.config)
+            self.init_vector()
+        else:
+            # educell_array
+            self.educell_array = np.empty((self.config.num_aqrow, self.config.num_aqcol), dtype=object)
+            for (i, j), _ in np.ndenumerate(self.educell_array):
+                self.educell_array[i][j] = edu_cell(self.config, i, j) 
         # 
         assert (mode in ["cycle", "layer"])
         self.mode = mode
+        # Round memo
+        self.memo_size = self.config.edu_memo_size if self.engine == "vector" else 0
+        if self.memo_size > 0:
+            config_hash = hashlib.sha256(json.dumps(vars(self.config), sort_keys=True, default=str).encode()).hexdigest()
+            self.memo_tag = (self.unit_stat.uarch, config_hash)
+            self.memo_layout = (None, None) # (pchinfo_version, layout hash)
+            self.unit_stat.edu_memo = {"num_hit": 0, "num_miss": 0, "hit_rate": 0.0}
             
+    def init_vector(self):
+        num_diag = self.config.num_aqrow+self.config.num_aqcol-1
+        aqrow, aqcol = np.indices((self.config.num_aqrow, self.config.num_aqcol))
+        # (row, col) of each educell in the anti-diagonal rows of the token setup
+        self.diag_row = aqrow + aqcol
+        self.diag_col = np.where(self.diag_row >= self.config.num_aqrow, aqcol - (self.diag_row-self.config.num_aqrow+1), aqcol)
+        # RR: the educell whose token leaves each anti-diagonal row (i == 0 or j == num_aqcol-1)
+        ## and the first educell of each row (j == 0 or i == num_aqrow-1)
+        self.rr_out_idx = np.zeros((2, num_diag), dtype=int)
+        for (i, j), _ in np.ndenumerate(aqrow):
+            if i == 0 or j == self.config.num_aqcol-1:
+                self.rr_out_idx[:, i+j] = (i, j)
+        self.rr_first_mask = (aqcol == 0) | (aqrow == self.config.num_aqrow-1)
+        # myrowidx of each educell
+        self.myrowidx_array = np.array(self.rowidx_regs)[self.diag_row]
+        # 2D <-> 5D index maps of the dq grid (error) and of the eigenvalues
+        self.dq_idx_map = get_idx_map_2d_to_5d(self.config.code_dist, 'dq', self.config.num_dqrow, self.config.num_dqcol)
+        eigen_qbidx = np.array([[0, 2], [3, 1]])[aqrow % 2, aqcol % 2]
+        self.eigen_idx_map = self.dq_idx_map[:4] + (eigen_qbidx,)
+        return
+
     def init_stats(self):
         # Data transfer
         ### to PFU
@@ -262,6 +366,18 @@ class error_decode_unit:
         return
 
     def transfer(self):
+        if self.engine == "vector":
+            self.transfer_last_aqmeas_flip_vector()
+            self.transfer_pchinfobuf()
+            self.transfer_educell_vector()
+            self.transfer_token_setup_vector()
+            self.transfer_control()
+            self.transfer_pchinfobuf()
+            self.transfer_educell_vector()
+            self.transfer_token_setup_vector()
+            self.transfer_control()
+            self.transfer_output_vector()
+            return
         self.transfer_last_aqmeas_flip()
         self.transfer_pchinfobuf()
         self.transfer_educell_array()
@@ -293,6 +409,17 @@ class error_decode_unit:
         return 
 
 
+    def transfer_last_aqmeas_flip_vector(self):
+        # Each dq measurement flips the (up to) four ancillas at its NW, N, W and own position
+        self.last_aqmeas_flip_array = np.zeros((self.config.num_aqrow, self.config.num_aqcol), dtype=int)
+        if self.input_dqmeas_valid and (self.opcode_reg == self.config.MEAS_INTMD_opcode):
+            dqmeas = np.asarray(self.input_dqmeas_array)[self.dq_idx_map].astype(int)
+            self.last_aqmeas_flip_array ^= dqmeas
+            self.last_aqmeas_flip_array[:-1, :] ^= dqmeas[1:, :]
+            self.last_aqmeas_flip_array[:, :-1] ^= dqmeas[:, 1:]
+            self.last_aqmeas_flip_array[:-1, :-1] ^= dqmeas[1:, 1:]
+        return
+
     def transfer_control(self):
         # token_finish
         if self.state == 'token_allocate':
@@ -500,6 +627,7 @@ class error_decode_unit:
                 educell.input_pchinfo = self.pchinfo_running[pchidx]
             else:
                 educell.input_pchinfo = {'pchtype': 'i', 'facebd': ['i', 'i', 'i', 'i']}
+            educell.input_pchinfo_version = self.pchinfo_version
             ## curr_rowidx
             educell.input_curr_rowidx = self.curr_rowidx_reg
             ## myrowidx
@@ -538,50 +666,24 @@ class error_decode_unit:
                 break
 
         ## next_error_array
-        self.next_error_array = np.full((self.config.num_dqrow, self.config.num_dqcol), 'i')
+        self.next_error_array = np.full((self.config.num_dqrow, self.config.num_dqcol), PAULI_I, dtype=np.uint8)
         for (i, j), curr_err in np.ndenumerate(self.error_array_reg):
             if i == 0 or j == 0:
-                syn_nw = 'i'
+                syn_nw = PAULI_I
             else:
                 syn_nw = self.educell_array[i-1][j-1].output_syndrome[3]
             if i == 0:
-                syn_ne = 'i'
+                syn_ne = PAULI_I
             else:
                 syn_ne = self.educell_array[i-1][j].output_syndrome[2]
             if j == 0:
-                syn_sw = 'i'
+                syn_sw = PAULI_I
             else:
                 syn_sw = self.educell_array[i][j-1].output_syndrome[1]
             syn_se = self.educell_array[i][j].output_syndrome[0]
             
-            # next_error
-            next_error = 0
-            error_list = [curr_err, syn_nw, syn_ne, syn_sw, syn_se]
-            for err in error_list:
-                if err == 'i':
-                    err = 0
-                elif err == 'x':
-                    err = 1
-                elif err == 'z':
-                    err = 2
-                elif err == 'y':
-                    err = 3 
-                else:
-                   print("invalid err")
-                   sys.exit()
-                next_error ^= err
-            if next_error == 0:
-                next_error = 'i'
-            elif next_error == 1:
-                next_error = 'x'
-            elif next_error == 2:
-                next_error = 'z'
-            elif next_error == 3:
-                next_error = 'y'
-            else:
-                print('invalid next_error')
-                sys.exit()
-            self.next_error_array[i][j] = next_error
+            # next_error (product of Paulis = XOR of the codes)
+            self.next_error_array[i][j] = curr_err ^ syn_nw ^ syn_ne ^ syn_sw ^ syn_se
         ## eigen_array
         self.eigen_array = np.full((self.config.num_dqrow, self.config.num_dqcol), 0) 
         for (i, j), educell in np.ndenumerate(self.educell_array):
@@ -603,42 +705,42 @@ class error_decode_unit:
             ## in_nw
             if i == 0 or j == 0:
                 inspike_nw = 0
-                insyndrome_nw = 'i'
+                insyndrome_nw = PAULI_I
             else:
                 inspike_nw = self.educell_array[i-1][j-1].output_spike[3] # out_se
                 insyndrome_nw = self.educell_array[i-1][j-1].output_syndrome[3] # out_se
             ## in_ne
             if i == 0 or j == self.config.num_aqcol-1:
                 inspike_ne = 0
-                insyndrome_ne = 'i'
+                insyndrome_ne = PAULI_I
             else:
                 inspike_ne = self.educell_array[i-1][j+1].output_spike[2] # out_sw
                 insyndrome_ne = self.educell_array[i-1][j+1].output_syndrome[2] # out_sw
             ## in_sw
             if i == self.config.num_aqrow-1 or j == 0:
                 inspike_sw = 0
-                insyndrome_sw = 'i'
+                insyndrome_sw = PAULI_I
             else:
                 inspike_sw = self.educell_array[i+1][j-1].output_spike[1] # out_ne
                 insyndrome_sw = self.educell_array[i+1][j-1].output_syndrome[1] # out_ne
             ## in_se 
             if i == self.config.num_aqrow-1 or j == self.config.num_aqcol-1:
                 inspike_se = 0
-                insyndrome_se = 'i'
+                insyndrome_se = PAULI_I
             else:
                 inspike_se = self.educell_array[i+1][j+1].output_spike[0] # out_nw
                 insyndrome_se = self.educell_array[i+1][j+1].output_syndrome[0] # out_nw
             ## in_n
             if i == 0:
                 inspike_n = 0
-                insyndrome_n = 'i'
+                insyndrome_n = PAULI_I
             else:
                 inspike_n = self.educell_array[i-1][j].output_spike[5] # out_s
                 insyndrome_n = self.educell_array[i-1][j].output_syndrome[5] # out_s
             ## in_s
             if i == self.config.num_aqrow-1:
                 inspike_s = 0
-                insyndrome_s = 'i'
+                insyndrome_s = PAULI_I
             else:
                 inspike_s = self.educell_array[i+1][j].output_spike[4] # out_n
                 insyndrome_s = self.educell_array[i+1][j].output_syndrome[4] # out_n
@@ -651,7 +753,76 @@ class error_decode_unit:
 
         return
 
-    
+    def transfer_educell_vector(self):
+        educells = self.educell_vector
+        # connect input
+        educells.input_last_aqmeas_flip = self.last_aqmeas_flip_array
+        educells.input_set_first_aqmeas = self.set_first_aqmeas
+        educells.input_shift_token = self.shift_token
+        educells.input_global_tokenmatch = self.global_tokenmatch
+        educells.input_global_errormatch = self.global_errormatch
+        educells.input_global_measmatch = self.global_measmatch
+        educells.input_wr_zeroesm = self.wr_zeroesm
+        educells.input_rst_cellstate = self.rst_cellstate
+        educells.input_token_finish = self.token_finish
+        educells.input_set_measerr_flag = self.set_measerr_flag
+        educells.input_set_last_measerr_flag = self.set_last_measerr_flag
+        educells.input_pop_aqmeasbuf = self.pop_aqmeasbuf
+        educells.input_apply_aqmeas_flip = self.apply_aqmeas_flip
+        educells.input_aqmeas_valid = self.input_aqmeas_valid
+        educells.input_aqmeas_array = self.input_aqmeas_array
+        educells.input_pchinfo = None if self.pchinfo_empty else self.pchinfo_running
+        educells.input_pchinfo_version = self.pchinfo_version
+        educells.input_curr_rowidx = self.curr_rowidx_reg
+        educells.input_myrowidx = self.myrowidx_array
+
+        # transfer: outputs (registers & pchinfo only)
+        educells.transfer()
+
+        # connect outputs
+        if self.unit_stat.uarch == "fast":
+            self.global_tokenmatch = self.token_match_reg
+        else:
+            self.global_tokenmatch = (self.state == 'token_allocate') and bool(educells.output_local_tokenmatch.any())
+        self.global_errormatch = bool(educells.output_local_errormatch.any())
+        self.global_measmatch = bool(educells.output_local_measmatch.any())
+        self.esmhead_exist = bool(educells.output_esmhead_exist.any())
+
+        ## next_error_array: syndromes into the data qubit from its NW, NE, SW and SE educells
+        syndrome = educells.output_syndrome
+        if educells.active_win is None:
+            ## quiet grid: no syndrome in flight
+            self.next_error_array = self.error_array_reg.copy()
+        else:
+            self.next_error_array = self.error_array_reg ^ syndrome[:, :, 0]
+            self.next_error_array[1:, 1:] ^= syndrome[:-1, :-1, 3]
+            self.next_error_array[1:, :] ^= syndrome[:-1, :, 2]
+            self.next_error_array[:, 1:] ^= syndrome[:, :-1, 1]
+        ## eigen_array
+        self.eigen_array = educells.output_eigen
+
+        ## connect input token/flag
+        if self.token_set_array is None:
+            educells.input_token = np.zeros((self.config.num_aqrow, self.config.num_aqcol), dtype=int)
+        else:
+            educells.input_token = self.token_set_array
+        if self.flag_set_array is None:
+            educells.input_flag = np.zeros((self.config.num_aqrow, self.config.num_aqcol), dtype=int)
+        else:
+            educells.input_flag = self.flag_set_array
+
+        # connect spike, syndrome: (nw, ne, sw, se, n, s) from the out_(se, sw, ne, nw, s, n) of the neighbors
+        if educells.active_win is None:
+            educells.input_spike = np.zeros_like(educells.output_spike)
+            educells.input_syndrome = np.zeros_like(educells.output_syndrome)
+        else:
+            educells.input_spike = get_neighbor_port(educells.output_spike)
+            educells.input_syndrome = get_neighbor_port(educells.output_syndrome)
+
+        # transfer again: only syndir depends on the new inputs
+        educells.transfer_syndir()
+        return
+
     def transfer_token_setup(self): 
         # RR (slow baseline) or PE (fast opt.)
         # Input
@@ -781,9 +952,80 @@ class error_decode_unit:
         return
 
 
+    def transfer_token_setup_vector(self):
+        # transfer_token_setup over the output arrays of educell_vector
+        educells = self.educell_vector
+        num_diag = self.config.num_aqrow+self.config.num_aqcol-1
+        if "fast" in self.unit_stat.uarch: #PE 
+            # input_array -> input_rows
+            self.esmhead_rows = np.zeros((num_diag, self.config.num_aqrow), dtype=int)
+            self.flag_out_rows = np.zeros((num_diag, self.config.num_aqrow), dtype=int)
+            self.esmhead_rows[self.diag_row, self.diag_col] = educells.output_esmhead_exist
+            self.flag_out_rows[self.diag_row, self.diag_col] = educells.output_flag
+
+            # token_setup
+            ## 0: first esmhead without flag in each row
+            token_cand_rows = (self.esmhead_rows != 0) & (self.flag_out_rows == 0)
+            self.token_exist_rows_0 = token_cand_rows.any(axis=1)
+            self.token_col_rows_0 = np.argmax(token_cand_rows, axis=1)
+            ## 1: first row with a token
+            self.token_exist_rows_1 = np.zeros(num_diag, dtype=bool)
+            self.token_exist_1 = bool(self.token_exist_rows_0_reg.any())
+            self.token_row_1 = int(np.argmax(self.token_exist_rows_0_reg)) if self.token_exist_1 else 0
+            if self.token_exist_1:
+                self.token_exist_rows_1[self.token_row_1] = True
+            self.token_col_rows_1 = self.token_col_rows_0_reg.copy()
+            ## 2
+            col = np.arange(self.config.num_aqrow)
+            token_col_rows_1_reg = self.token_col_rows_1_reg.astype(int)[:, None]
+            token_exist_rows_1_reg = self.token_exist_rows_1_reg[:, None]
+            self.token_set_rows_2 = (token_exist_rows_1_reg & (col == token_col_rows_1_reg)).astype(int)
+            self.flag_set_rows_2 = (token_exist_rows_1_reg & (col <= token_col_rows_1_reg)).astype(int)
+            ## out
+            self.last_token = 0
+            self.next_rowidx = 0
+            self.token_match = False
+
+            if not self.token_valid_1_reg:
+                self.token_set_array = np.zeros((self.config.num_aqrow, self.config.num_aqcol), dtype=int)
+                self.flag_set_array = np.zeros((self.config.num_aqrow, self.config.num_aqcol), dtype=int)
+            else:
+                self.token_set_array = self.token_set_rows_2[self.diag_row, self.diag_col]
+                self.flag_set_array = self.flag_set_rows_2[self.diag_row, self.diag_col]
+
+                if self.token_exist_1_reg:
+                    self.last_token = 0
+                    self.next_rowidx = self.token_row_1_reg
+                    self.token_match = True
+                else:
+                    self.last_token = 1
+                    self.next_rowidx = 0
+                    self.token_match = False
+
+        else: # RR
+            output_token = educells.output_token
+            ## row_tokens_out
+            self.row_tokens_out = output_token[self.rr_out_idx[0], self.rr_out_idx[1]]
+            ## set outputs
+            ### token_set_array & flag_set_array: from the SW educell, or from the previous row for the first educells
+            self.token_set_array = np.zeros((self.config.num_aqrow, self.config.num_aqcol), dtype=int)
+            self.token_set_array[:-1, 1:] = output_token[1:, :-1]
+            prev_row_token = np.concatenate(([int(self.first_token)], self.row_tokens_out[:-1]))
+            self.token_set_array[self.rr_first_mask] = prev_row_token[self.diag_row[self.rr_first_mask]]
+            self.flag_set_array = self.token_set_array.copy()
+            ### last_token
+            self.last_token = output_token[-1][-1]
+            ### next_rowidx
+            self.next_rowidx = self.curr_rowidx_reg
+            row_token_idx = np.flatnonzero(self.row_tokens_out == 1)
+            if len(row_token_idx):
+                self.next_rowidx = int(row_token_idx[0])+1
+        return
+
+
     def transfer_output(self):
         ## output_error_array
-        self.output_error_array = np.full((self.config.num_pchrow, self.config.num_pchcol, self.config.num_ucrow, self.config.num_uccol, int(self.config.num_qb_per_uc/2)), 'i',dtype='U8')
+        self.output_error_array = np.full((self.config.num_pchrow, self.config.num_pchcol, self.config.num_ucrow, self.config.num_uccol, int(self.config.num_qb_per_uc/2)), PAULI_I, dtype=np.uint8)
         for (i, j), err in np.ndenumerate(self.error_array_reg):
             pchrow = int(i / (self.config.num_ucrow*2))
             pchcol = int(j / (self.config.num_uccol*2))
@@ -823,17 +1065,124 @@ class error_decode_unit:
 
         return
 
+    def transfer_output_vector(self):
+        ## output_error_array
+        self.output_error_array = np.full((self.config.num_pchrow, self.config.num_pchcol, self.config.num_ucrow, self.config.num_uccol, int(self.config.num_qb_per_uc/2)), PAULI_I, dtype=np.uint8)
+        self.output_error_array[self.dq_idx_map] = self.error_array_reg
+        ## output_eigen_array
+        self.output_eigen_array = np.full((self.config.num_pchrow, self.config.num_pchcol, self.config.num_ucrow, self.config.num_uccol, int(self.config.num_qb_per_uc/2)), 0)
+        self.output_eigen_array[self.eigen_idx_map] = self.eigen_array
+        ## output_pfflag
+        if self.output_valid and self.opcode_reg in [self.config.LQM_X_opcode, self.config.LQM_Y_opcode, self.config.LQM_Z_opcode, self.config.MEAS_INTMD_opcode]:
+            self.output_pfflag = True
+        else:
+            self.output_pfflag = False
+
+        return
+
     def update(self, sim_cycle=0):
         if self.mode == "cycle":
             self.update_cycle(sim_cycle)
         else: # layer
             if (self.state in ['ready', 'waiting']) and (self.next_state in ['token_allocate']):
-                while ((self.state in ['error_pairing', 'token_allocate']) or (self.next_state in ['token_allocate'])):
-                    self.transfer()
-                    self.update_cycle(sim_cycle)
+                if self.memo_size > 0:
+                    self.update_layer_memo(sim_cycle)
+                else:
+                    self.update_layer(sim_cycle)
             else:
                 self.update_cycle(sim_cycle)
 
+    def is_layer_running(self):
+        return (self.state in ['error_pairing', 'token_allocate']) or (self.next_state in ['token_allocate'])
+
+    def update_layer(self, sim_cycle, stat_trace=None):
+        # Decoding burst: until the layer is finished
+        while self.is_layer_running():
+            self.transfer()
+            if stat_trace is not None:
+                stat_trace.append(tuple(getattr(self, name) for name in MEMO_STAT_WIRE))
+            self.update_cycle(sim_cycle)
+        return
+
+    def update_layer_memo(self, sim_cycle):
+        # first cycle: pops the aq measurement (raw values) into the syndromes
+        self.transfer()
+        self.update_cycle(sim_cycle)
+        if not self.is_layer_running():
+            return
+        # new aq measurements are written into the buffer at every cycle of the burst
+        if self.input_aqmeas_valid:
+            self.update_layer(sim_cycle)
+            return
+        educells = self.educell_vector
+        key = (self.memo_tag, self.get_memo_layout(), self.get_memo_hash())
+        memo_stat = self.unit_stat.edu_memo
+        eigen_start = educells.last_measerr_flag ^ (educells.prev_aqmeas_reg[:, :, 1] ^ educells.prev_aqmeas_reg[:, :, 0])
+        if key in round_memo:
+            round_memo.move_to_end(key)
+            end_state, stat_trace, delta = round_memo[key]
+            for stat_wire in stat_trace:
+                for name, val in zip(MEMO_STAT_WIRE, stat_wire):
+                    setattr(self, name, val)
+                self.update_stats(sim_cycle)
+            edu_state, cell_state = pickle.loads(end_state)
+            self.__dict__.update(edu_state)
+            educells.__dict__.update(cell_state)
+            self.error_array_reg = self.error_array_reg ^ delta["error_array_reg"]
+            educells.prev_aqmeas_reg = educells.prev_aqmeas_reg ^ delta["prev_aqmeas_reg"]
+            educells.output_eigen = eigen_start ^ delta["eigen_array"]
+            self.eigen_array = educells.output_eigen
+            self.pchinfo_version += delta["pchinfo_version"]
+            memo_stat["num_hit"] += 1
+        else:
+            error_array_start = self.error_array_reg
+            prev_aqmeas_start = educells.prev_aqmeas_reg
+            pchinfo_version_start = self.pchinfo_version
+            stat_trace = []
+            self.update_layer(sim_cycle, stat_trace)
+            delta = {
+                    "error_array_reg": self.error_array_reg ^ error_array_start,
+                    "prev_aqmeas_reg": educells.prev_aqmeas_reg ^ prev_aqmeas_start,
+                    "eigen_array": self.eigen_array ^ eigen_start,
+                    "pchinfo_version": self.pchinfo_version - pchinfo_version_start
+                    }
+            round_memo[key] = (self.get_memo_state(), stat_trace, delta)
+            if len(round_memo) > self.memo_size:
+                round_memo.popitem(last=False)
+            memo_stat["num_miss"] += 1
+        memo_stat["hit_rate"] = round(memo_stat["num_hit"] / (memo_stat["num_hit"] + memo_stat["num_miss"]), 3)
+        return
+
+    def get_memo_layout(self):
+        # pchinfo_version is bumped at every RUN_ESM block: the layout it names is hashed once per version
+        if self.memo_layout[0] != self.pchinfo_version:
+            layout = None if self.pchinfo_buf.empty else self.pchinfo_buf.buffer[0]
+            self.memo_layout = (self.pchinfo_version, hashlib.sha256(pickle.dumps(layout)).digest())
+        return self.memo_layout[1]
+
+    def get_memo_state(self):
+        # monkeypatched methods (e.g., profiler) are not state
+        edu_state = {name: val for name, val in self.__dict__.items() if name not in MEMO_EDU_SKIP_ATTR and not callable(val)}
+        cell_state = {name: val for name, val in self.educell_vector.__dict__.items() if name not in MEMO_CELL_SKIP_ATTR}
+        return pickle.dumps((edu_state, cell_state), protocol=pickle.HIGHEST_PROTOCOL)
+
+    def get_memo_hash(self):
+        # attribute by attribute, pickled without memo (fast):
+        # shared references (e.g., input_pchinfo, restored entries) do not change the key
+        pchinfo_buf = self.pchinfo_buf
+        key_list = [("edu." + name, getattr(self, name, None)) for name in MEMO_EDU_KEY_ATTR]
+        key_list += [("cell." + name, getattr(self.educell_vector, name)) for name in MEMO_CELL_KEY_ATTR]
+        key_list.append(("edu.pchinfo_buf", (list(pchinfo_buf.buffer), pchinfo_buf.full, pchinfo_buf.empty)))
+        h = hashlib.sha256()
+        for name, val in key_list:
+            stream = io.BytesIO()
+            pickler = pickle.Pickler(stream, protocol=pickle.HIGHEST_PROTOCOL)
+            pickler.fast = True
+            pickler.dump(val)
+            h.update(name.encode())
+            h.update(stream.getvalue())
+        return h.digest()
+
     def update_cycle(self, sim_cycle):
         # stat
         self.update_stats(sim_cycle)
@@ -842,8 +1191,11 @@ class error_decode_unit:
         # pchinfo_buf
         self.pchinfo_buf.update()
         # educell_array
-        for _, educell in np.ndenumerate(self.educell_array):
-            educell.update()
+        if self.engine == "vector":
+            self.educell_vector.update()
+        else:
+            for _, educell in np.ndenumerate(self.educell_array):
+                educell.update()
         return
     
     def update_registers(self):
@@ -921,11 +1273,17 @@ class error_decode_unit:
             self.timeout_counter += 1
         # aqmeas_counter
         #if self.input_aqmeas_valid:
-        educell_00 = self.educell_array[0][0]
-        if educell_00.aqmeasbuf_valid and self.pop_aqmeasbuf:
+        if self.engine == "vector":
+            aqmeasbuf_valid = self.educell_vector.aqmeasbuf_valid
+        else:
+            aqmeasbuf_valid = self.educell_array[0][0].aqmeasbuf_valid
+        if aqmeasbuf_valid and self.pop_aqmeasbuf:
             self.aqmeas_counter += 1
         elif self.layer_finish:
             self.aqmeas_counter -= 1
+        # pchinfo_version: pchinfo_buf pops, or pushes into an empty buffer
+        if (self.esm_finish and not self.pchinfo_empty) or (self.rst_pireg and self.pchinfo_empty):
+            self.pchinfo_version += 1
         # round_counter 
         if self.esm_finish:
             self.round_counter = 0
@@ -947,7 +1305,7 @@ class error_decode_unit:
         if self.global_errormatch:
             self.error_array_reg = copy.deepcopy(self.next_error_array)
         elif self.output_valid:
-            self.error_array_reg = np.full((self.config.num_dqrow, self.config.num_dqcol), 'i') 
+            self.error_array_reg = np.full((self.config.num_dqrow, self.config.num_dqcol), PAULI_I, dtype=np.uint8) 
         # output_valid
         self.output_valid = self.next_valid
 
@@ -959,13 +1317,613 @@ class error_decode_unit:
         if self.output_valid:
             print("edu.output_pfflag: {}".format(self.output_pfflag))
             print("edu.output_error_array")
-            debug_array(self.config, self.output_error_array)
+            debug_array(self.config, self.output_error_array, arr_enc='pauli')
             print("edu.output_eigen_array")
             debug_array(self.config, self.output_eigen_array, 'aq')
 
 ###########################################################
 
 
+def get_location_reg(config, aqrow, aqcol):
+    # (even, west, north, east, south, north_2, south_2) of the educell at (aqrow, aqcol)
+    # even 
+    if (aqrow + aqcol) % 2 == 0:
+        even = True
+    else:
+        even = False
+    # west
+    if (aqcol % (config.num_uccol*2) == 0):
+        west = True
+    else:
+        west = False
+    # north
+    if (aqrow % (config.num_ucrow*2)) == 0: 
+        north = True
+    else:
+        north = False
+    # east
+    if (aqcol % (config.num_uccol*2) == (config.num_uccol*2-1)):
+        east = True
+    else:
+        east = False
+    # south
+    if (aqrow  % (config.num_ucrow*2) == (config.num_ucrow*2-1)):
+        south = True
+    else:
+        south = False
+    
+    # north_2
+    if (aqrow % (config.num_ucrow*2)) == 1: 
+        north_2 = True
+    else:
+        north_2 = False
+    # south_2
+    if (aqrow  % (config.num_ucrow*2) == (config.num_ucrow*2-1-1)):
+        south_2 = True
+    else:
+        south_2 = False
+    
+    return (even, west, north, east, south, north_2, south_2)
+
+
+def predecode_cell(config, location_reg, pchinfo):
+    # role, possible_dir, first_aqmeas_flag, syn_to_west, syn_to_east of an educell at location_reg in a patch of pchinfo
+    (even, west, north, east, south, north_2, south_2) = location_reg
+    pchtype = pchinfo['pchtype']
+    facebd = pchinfo['facebd']
+    (facebd_w, facebd_n, facebd_e, facebd_s) = facebd
+    ## role, possible_dir, first_aqmeas_flag
+    if config.block_type == "Distillation":
+        if pchtype == 'zt':
+            # default first_aqmeas_flag
+            first_aqmeas_flag = False
+            
+            if north and west: # NW
+                role = 'inactive'
+                possible_dir = (False, False, False, False, False, False)
+            elif north and not east: # N
+                if even:
+                    role = 'active'
+                else:
+                    role = 'boundary'
+                possible_dir = (False, False, True, True, False, False)
+            elif north and east: # NE
+                role = 'boundary'
+                if facebd_e == 'mp':
+                    possible_dir = (False, False, True, True, False, False)
+                else:
+                    possible_dir = (False, False, True, False, False, False)
+            elif west and not south: # W
+                if even:
+                    role = 'active'
+                else:
+                    role = 'boundary'
+                possible_dir = (False, True, False, True, False, False)
+            elif east and not south: # E
+                if facebd_e == 'mp':
+                    if even:
+                        first_aqmeas_flag = True
+                    else:
+                        first_aqmeas_flag = False
+                    role = 'active'
+                    possible_dir = (True, True, True, True, False, False)
+                else:
+                    if even:
+                        role = 'boundary'
+                    else:
+                        role = 'active'
+                    possible_dir = (True, False, True, False, False, False)
+            elif west and south: # SW
+                role = 'boundary'
+                possible_dir = (False, True, False, True, False, False)
+            elif south and not east: # S
+                role = 'active'
+                possible_dir = (True, True, True, True, False, False)
+            elif south and east: # SE
+                if facebd_e == 'mp':
+                    first_aqmeas_flag = True
+                    role = 'active'
+                    possible_dir = (True, True, True, False, False, True)
+                else:
+                    role = 'boundary'
+                    possible_dir = (True, False, True, False, False, False)
+            else: # C
+                role = 'active'
+                possible_dir = (True, True, True, True, False, False)
+        elif pchtype == 'zb':
+            # default first_aqmeas_flag
+            first_aqmeas_flag = False
+            
+            if north and west: # NW
+                role = 'boundary'
+                possible_dir = (False, True, False, True, False, False)
+            elif north and not east: # N
+                role = 'active'
+                possible_dir = (True, True, True, True, False, False)
+            elif north and east: # NE
+                if facebd_e == 'pp':
+                    first_aqmeas_flag = True
+                    role = 'active'
+                    possible_dir = (True, False, True, True, True, False)
+                else:
+                    role = 'boundary'
+                    possible_dir = (True, False, True, False, False, False)
+            elif west and not south: # W
+                if even:
+                    role = 'boundary'
+                else:
+                    role = 'active'
+                possible_dir = (False, True, False, True, False, False)
+            elif east and not south: # E
+                if facebd_e == 'pp':
+                    if even:
+                        first_aqmeas_flag = False
+                    else:
+                        first_aqmeas_flag = True
+                    role = 'active'
+                    possible_dir = (True, True, True, True, False, False)
+                else:
+                    if even:
+                        role = 'active'
+                    else:
+                        role = 'boundary'
+                    possible_dir = (True, False, True, False, False, False)
+            elif west and south: # SW
+                role = 'inactive'
+                possible_dir = (False, False, False, False, False, False)
+            elif south and not east: # S
+                if even:
+                    role = 'boundary'
+                else:
+                    role = 'active'
+                    
+                possible_dir = (True, True, False, False, False, False)
+            elif south and east: # SE
+                role = 'boundary'
+                if facebd_e == 'pp':
+                    possible_dir = (True, True, False, False, False, False)
+                else:
+                    possible_dir = (True, False, False, False, False, False)
+            else: # C
+                role = 'active'
+                possible_dir = (True, True, True, True, False, False)
+        elif pchtype == 'mt':
+            # default first_aqmeas_flag
+            if facebd_w == 'mp':
+                first_aqmeas_flag = True
+            else:
+                first_aqmeas_flag = False
+                
+            if north and west: # NW
+                if facebd_w == 'mp':
+                    role = 'active'
+                else:
+                    role = 'boundary'
+                possible_dir = (False, False, True, True, False, False)
+            elif north and not east: # N
+                if even:
+                    role = 'active'
+                else:
+                    role = 'boundary'
+                    first_aqmeas_flag = False
+                possible_dir = (False, False, True, True, False, False)
+            elif north and east: # NE
+                role = 'boundary'
+                possible_dir = (False, False, True, False, False, False)
+                first_aqmeas_flag = False
+            elif west and not south: # W
+                if facebd_w == 'mp':
+                    role = 'active'
+                    possible_dir = (True, True, True, True, False, False)
+                else:
+                    if even: 
+                        role = 'boundary'
+                    else:
+                        role = 'active'
+                    possible_dir = (False, True, False, True, False, False)
+            elif east and not south: # E
+                if even:
+                    role = 'active'
+                else:
+                    role = 'boundary'
+                    first_aqmeas_flag = False
+                possible_dir = (True, False, True, False, False, False)
+            elif west and south: # SW
+                role = 'active'
+                if facebd_w == 'mp':
+                    possible_dir = (True, True, False, False, False, True)
+                else:
+                    possible_dir = (False, True, False, False, False, True)
+            elif south and not east: # S
+                role = 'active'
+                possible_dir = (True, True, False, False, False, True)
+            elif south and east: # SE
+                if facebd_w == 'mp':
+                    role = 'active'
+                    possible_dir = (True, False, False, False, False, True)
+                else:
+                    role = 'boundary'
+                    possible_dir = (True, False, False, False, False, False)
+            else: # C
+                role = 'active'
+                possible_dir = (True, True, True, True, False, False)
+        elif pchtype == 'mb':
+            # default first_aqmeas_flag
+            first_aqmeas_flag = False
+            
+            if north and west: # NW
+                if facebd_n == 'lp' and facebd_w == 'pp':
+                    first_aqmeas_flag = True
+                    role = 'active'
+                    possible_dir = (False, False, True, True, True, False)
+                elif facebd_n == 'lp':
+                    role = 'active'
+                    possible_dir = (False, False, False, True, True, False)
+                else:
+                    role = 'boundary'
+                    possible_dir = (False, False, False, True, False, False)
+            elif north and not east: # N
+                if even:
+                    if facebd_n == 'lp' and facebd_w == 'pp':
+                        first_aqmeas_flag = True
+                    
+                if facebd_n == 'lp':
+                    role = 'active'
+                    possible_dir = (False, False, True, True, True, False)
+                else:
+                    if even:
+                        role = 'boundary'
+                    else:
+                        role = 'active'
+                    possible_dir = (False, False, True, True, False, False)
+            elif north and east: # NE
+                if facebd_n == 'lp' and facebd_w == 'pp':
+                    first_aqmeas_flag = True
+
+                if facebd_e == 'pp':
+                    role = 'active'
+                    possible_dir = (False, False, True, True, True, False)
+                else:
+                    role = 'boundary'
+                    possible_dir = (False, False, True, False, False, False)
+            elif west and not south: # W
+                if even:
+                    pass
+                else:
+                    if facebd_n == 'lp' and facebd_w == 'pp':
+                        first_aqmeas_flag = True
+                
+                if facebd_w == 'pp':
+                    role = 'active'
+                    possible_dir = (True, True, True, True, False, False)
+                else:
+                    if even:
+                        role = 'active'
+                    else:
+                        role = 'boundary'
+                    possible_dir = (False, True, False, True, False, False)
+            elif east and not south: # E
+                if even:
+                    pass
+                else:
+                    if facebd_n == 'lp' and facebd_w == 'pp':
+                        first_aqmeas_flag = True
+                        
+                if facebd_e == 'pp':
+                    role = 'active'
+                    possible_dir = (True, True, True, True, False, False)
+                else:
+                    if even:
+                        role = 'active'
+                    else:
+                        role = 'boundary'
+                    possible_dir = (True, False, True, False, False, False)
+            elif west and south: # SW
+                if facebd_n == 'lp' and facebd_w == 'pp':
+                    first_aqmeas_flag = True
+
+                if facebd_w == 'pp':
+                    role = 'active'
+                    possible_dir = (True, True, False, False, False, False)
+                else:
+                    role = 'boundary'
+                    possible_dir = (False, True, False, False, False, False)
+            elif south and not east: # S
+                if even:
+                    role = 'boundary'
+                else:
+                    role = 'active'
+                possible_dir = (True, True, False, False, False, False)
+            elif south and east: # SE
+                role = 'boundary'
+                if facebd_w == 'pp':
+                    possible_dir = (True, True, False, False, False, False)
+                else:
+                    possible_dir = (True, False, False, False, False, False)
+            else: # C
+                role = 'active'
+                possible_dir = (True, True, True, True, False, False)
+        elif pchtype == 'm':
+            # default first_aqmeas_flag
+            first_aqmeas_flag = False
+            
+            if north and west: # NW
+                role = 'boundary'
+                if facebd_n == 'pp':
+                    possible_dir = (False, True, False, True, False, False)
+                else:
+                    possible_dir = (False, False, False, True, False, False)
+            elif north and not east: # N
+                if facebd_n == 'pp':
+                    if even:
+                        pass
+                    else:
+                        first_aqmeas_flag = True
+                    
+                if facebd_n == 'pp':
+                    role = 'active'
+                    possible_dir = (True, True, True, True, False, False)
+                else:
+                    if even:
+                        role = 'active'
+                    else:
+                        role = 'boundary'
+                    possible_dir = (False, False, True, True, False, False)
+            elif north and east: # NE
+                if facebd_n == 'pp':
+                    first_aqmeas_flag = True
+                        
+                if facebd_n == 'pp':
+                    role = 'active'
+                    possible_dir = (True, False, True, False, False, False)
+                else:
+                    role = 'boundary'
+                    possible_dir = (False, False, True, False, False, False)
+            elif west and not south: # W
+                if even:
+                    role = 'boundary'
+                else:
+                    role = 'active'
+                possible_dir = (False, True, False, True, False, False)
+            elif east and not south: # E
+                if even:
+                    role = 'boundary'
+                else:
+                    role = 'active'
+                possible_dir = (True, False, True, False, False, False)
+            elif west and south: # SW
+                if facebd_s == 'pp':
+                    first_aqmeas_flag = True
+                        
+                if facebd_s == 'pp':
+                    role = 'active'
+                    possible_dir = (False, True, False, True, False, False)
+                else:
+                    role = 'boundary'
+                    possible_dir = (False, True, False, False, False, False)
+            elif south and not east: # S
+                if facebd_s == 'pp':
+                    if even:
+                        pass
+                    else:
+                        first_aqmeas_flag = True
+                    
+                if facebd_s == 'pp':
+                    role = 'active'
+                    possible_dir = (True, True, True, True, False, False)
+                else:
+                    if even:
+                        role = 'active'
+                    else:
+                        role = 'boundary'
+                    possible_dir = (True, True, False, False, False, False)
+            elif south and east: # SE
+                role = 'boundary'
+                if facebd_s == 'pp':
+                    possible_dir = (True, False, True, False, False, False)
+                else:
+                    possible_dir = (True, False, False, False, False, False)
+            else: # C
+                role = 'active'
+                possible_dir = (True, True, True, True, False, False)
+        elif pchtype == 'x' or pchtype == 'z':
+            # default first_aqmeas_flag
+            first_aqmeas_flag = False
+            
+            if north and west: # NW
+                role = 'boundary'
+                possible_dir = (False, False, True, True, False, False)
+            elif north and not east: # N
+                if even:
+                    role = 'boundary'
+                else:
+                    role = 'active'
+                possible_dir = (False, False, True, True, False, False)
+            elif north and east: # NE
+                role = 'boundary'
+                possible_dir = (False, False, True, False, False, False)
+            elif west and not south: # W
+                if facebd_w == 'pp':
+                    if even:
+                        pass
+                    else:
+                        first_aqmeas_flag = True
+                        
+                if facebd_w == 'pp':
+                    role = 'active'
+                    possible_dir = (True, True, True, True, False, False)
+                else:
+                    if even:
+                        role = 'active'
+                    else:
+                        role = 'boundary'
+                    possible_dir = (False, True, False, True, False, False)
+            elif east and not south: # E
+                if even:
+                    role = 'active'
+                else:
+                    role = 'boundary'
+                possible_dir = (True, False, True, False, False, False)
+            elif west and south: # SW
+                if facebd_w == 'pp':
+                    first_aqmeas_flag = True
+                    
+                if facebd_w == 'pp':
+                    role = 'active'
+                    possible_dir = (True, True, False, False, False, False)
+                else:
+                    role = 'boundary'
+                    possible_dir = (False, True, False, False, False, False)
+            elif south and not east: # S
+                if even:
+                    role = 'boundary'
+                else:
+                    role = 'active'
+                possible_dir = (True, True, False, False, False, False)
+            elif south and east: # SE
+                role = 'boundary'
+                possible_dir = (True, False, False, False, False, False)
+            else: # C
+                role = 'active'
+                possible_dir = (True, True, True, True, False, False)
+        elif 'a' in pchtype:
+            # default first_aqmeas_flag
+            first_aqmeas_flag = False
+            if north and west: # NW
+                role = 'boundary'
+                if facebd_n == 'pp':
+                    possible_dir = (False, True, True, True, False, False)
+                else:
+                    possible_dir = (False, False, True, True, False, False)
+            elif north and not east: # N
+                                            
+                if facebd_n == 'pp':
+                    role = 'active'
+                    possible_dir = (True, True, True, True, False, False)
+                    first_aqmeas_flag = True
+                else:
+                    if even:
+                        role = 'boundary'
+                    else:
+                        role = 'active'
+                        first_aqmeas_flag = True
+                    possible_dir = (False, False, True, True, False, False)
+            elif north and east: # NE
+                if facebd_n == 'pp' and facebd_e == 'pp':
+                    role = 'active'
+                    possible_dir = (True, False, True, True, False, False)
+                    first_aqmeas_flag = True
+                elif facebd_n == 'pp':
+                    role = 'active'
+                    possible_dir = (True, False, True, False, False, False)
+                    first_aqmeas_flag = True
+                elif facebd_e == 'pp':
+                    role = 'active'
+                    possible_dir = (False, False, True, True, False, False)
+                    first_aqmeas_flag = True
+                else:
+                    role = 'inactive'
+                    possible_dir = (False, False, False, False, False, False)
+            elif west and not south: # W
+                role = 'active'
+                possible_dir = (True, True, True, True, False, False)
+                first_aqmeas_flag = True
+            elif east and not south: # E
+                if facebd_e == 'pp':
+                    role = 'active'
+                    possible_dir = (True, True, True, True, False, False)
+                    first_aqmeas_flag = True
+                else:
+                    if even:
+                        role = 'boundary'
+                    else:
+                        role = 'active'
+                        first_aqmeas_flag = True
+                    possible_dir = (True, False, True, False, False, False)
+            elif west and south: # SW
+                role = 'active'
+                possible_dir = (True, True, False, True, False, False)
+                first_aqmeas_flag = True
+            elif south and not east: # S
+                if facebd_s == 'pp':
+                    role = 'active'
+                    possible_dir = (True, True, True, True, False, False)
+                    first_aqmeas_flag = True
+                else:
+                    if even:
+                        role = 'boundary'
+                    else:
+                        role = 'active'
+                        first_aqmeas_flag = True
+                    possible_dir = (True, True, False, False, False, False)
+            elif south and east: # SE
+                role = 'boundary'
+                if facebd_s == 'pp' and facebd_e == 'pp':
+                    possible_dir = (True, True, True, False, False, False)
+                elif facebd_s == 'pp':
+                    possible_dir = (True, False, True, False, False, False)
+                elif facebd_e == 'pp':
+                    possible_dir = (True, True, False, False, False, False)
+                else:
+                    possible_dir = (True, False, False, False, False, False)
+            else: # C
+                role = 'active'
+                possible_dir = (True, True, True, True, False, False)
+                first_aqmeas_flag = True
+        else:
+            role = 'inactive'
+            possible_dir = (False, False, False, False, False, False)
+            first_aqmeas_flag = False
+        # syn_to_west/east
+        if pchtype == 'zt':
+            if east and (not north) and (not south):
+                if facebd_e == 'mp':
+                    if even:
+                        syn_to_west = PAULI_Z
+                        syn_to_east = PAULI_X
+                    else:
+                        syn_to_west = PAULI_X
+                        syn_to_east = PAULI_Z
+                else:
+                    if even:
+                        syn_to_west = PAULI_Z
+                        syn_to_east = PAULI_I
+                    else:
+                        syn_to_west = PAULI_X
+                        syn_to_east = PAULI_I
+            elif east and south:
+                if facebd_e == 'mp':
+                    syn_to_west = PAULI_Z
+                    syn_to_east = PAULI_X
+                else:
+                    syn_to_west = PAULI_Z
+                    syn_to_east = PAULI_I
+            else:
+                if even:
+                    syn_to_west = PAULI_Z
+                    syn_to_east = PAULI_Z
+                else:
+                    syn_to_west = PAULI_X
+                    syn_to_east = PAULI_X
+        elif pchtype == 'mt':
+            if even:
+                syn_to_west = PAULI_X
+                syn_to_east = PAULI_X
+            else:
+                syn_to_west = PAULI_Z
+                syn_to_east = PAULI_Z
+        else:
+            if even:
+                syn_to_west = PAULI_Z
+                syn_to_east = PAULI_Z
+            else:
+                syn_to_west = PAULI_X
+                syn_to_east = PAULI_X
+    else:
+        raise Exception("error_decode_unit - transfer_predecoder: block_type {} is currently not supported".format(config.block_type))
+    return role, possible_dir, first_aqmeas_flag, syn_to_west, syn_to_east
+
+
 class edu_cell:
     def __init__(self, config, aqrow, aqcol):
         self.config = config
@@ -989,6 +1947,7 @@ class edu_cell:
         self.input_aqmeas_valid = None
         self.input_aqmeas = None
         self.input_pchinfo = None
+        self.input_pchinfo_version = None
         self.input_curr_rowidx = None
         self.input_myrowidx = None
         self.input_token = None #
@@ -1050,50 +2009,14 @@ class edu_cell:
         self.first_aqmeas = True 
         self.last_measerr_flag = 0 
         self.last_aqmeas_flip_reg = 0 
+        self.predecoder_version = None # pchinfo_version of the predecoder outputs
         self.aqmeas_buf = [{"valid": False, "val": 0}, {"valid": False, "val": 0}] 
 
         # Init constant reg
         self.init_location_reg(aqrow, aqcol) 
 
     def init_location_reg(self, aqrow, aqcol):
-        # even 
-        if (aqrow + aqcol) % 2 == 0:
-            even = True
-        else:
-            even = False
-        # west
-        if (aqcol % (self.config.num_uccol*2) == 0):
-            west = True
-        else:
-            west = False
-        # north
-        if (aqrow % (self.config.num_ucrow*2)) == 0: 
-            north = True
-        else:
-            north = False
-        # east
-        if (aqcol % (self.config.num_uccol*2) == (self.config.num_uccol*2-1)):
-            east = True
-        else:
-            east = False
-        # south
-        if (aqrow  % (self.config.num_ucrow*2) == (self.config.num_ucrow*2-1)):
-            south = True
-        else:
-            south = False
-        
-        # north_2
-        if (aqrow % (self.config.num_ucrow*2)) == 1: 
-            north_2 = True
-        else:
-            north_2 = False
-        # south_2
-        if (aqrow  % (self.config.num_ucrow*2) == (self.config.num_ucrow*2-1-1)):
-            south_2 = True
-        else:
-            south_2 = False
-        
-        self.location_reg = [even, west, north, east, south, north_2, south_2]
+        self.location_reg = get_location_reg(self.config, aqrow, aqcol)
         return
 
 
@@ -1109,559 +2032,11 @@ class edu_cell:
         return
 
     def transfer_predecoder(self):
-        (even, west, north, east, south, north_2, south_2) = self.location_reg
-        pchtype = self.input_pchinfo['pchtype']
-        facebd = self.input_pchinfo['facebd']
-        (facebd_w, facebd_n, facebd_e, facebd_s) = facebd
-        ## role, possible_dir, first_aqmeas_flag
-        if self.config.block_type == "Distillation":
-            if pchtype == 'zt':
-                # default first_aqmeas_flag
-                self.first_aqmeas_flag = False
-                
-                if north and west: # NW
-                    self.role = 'inactive'
-                    self.possible_dir = (False, False, False, False, False, False)
-                elif north and not east: # N
-                    if even:
-                        self.role = 'active'
-                    else:
-                        self.role = 'boundary'
-                    self.possible_dir = (False, False, True, True, False, False)
-                elif north and east: # NE
-                    self.role = 'boundary'
-                    if facebd_e == 'mp':
-                        self.possible_dir = (False, False, True, True, False, False)
-                    else:
-                        self.possible_dir = (False, False, True, False, False, False)
-                elif west and not south: # W
-                    if even:
-                        self.role = 'active'
-                    else:
-                        self.role = 'boundary'
-                    self.possible_dir = (False, True, False, True, False, False)
-                elif east and not south: # E
-                    if facebd_e == 'mp':
-                        if even:
-                            self.first_aqmeas_flag = True
-                        else:
-                            self.first_aqmeas_flag = False
-                        self.role = 'active'
-                        self.possible_dir = (True, True, True, True, False, False)
-                    else:
-                        if even:
-                            self.role = 'boundary'
-                        else:
-                            self.role = 'active'
-                        self.possible_dir = (True, False, True, False, False, False)
-                elif west and south: # SW
-                    self.role = 'boundary'
-                    self.possible_dir = (False, True, False, True, False, False)
-                elif south and not east: # S
-                    self.role = 'active'
-                    self.possible_dir = (True, True, True, True, False, False)
-                elif south and east: # SE
-                    if facebd_e == 'mp':
-                        self.first_aqmeas_flag = True
-                        self.role = 'active'
-                        self.possible_dir = (True, True, True, False, False, True)
-                    else:
-                        self.role = 'boundary'
-                        self.possible_dir = (True, False, True, False, False, False)
-                else: # C
-                    self.role = 'active'
-                    self.possible_dir = (True, True, True, True, False, False)
-            elif pchtype == 'zb':
-                # default first_aqmeas_flag
-                self.first_aqmeas_flag = False
-                
-                if north and west: # NW
-                    self.role = 'boundary'
-                    self.possible_dir = (False, True, False, True, False, False)
-                elif north and not east: # N
-                    self.role = 'active'
-                    self.possible_dir = (True, True, True, True, False, False)
-                elif north and east: # NE
-                    if facebd_e == 'pp':
-                        self.first_aqmeas_flag = True
-                        self.role = 'active'
-                        self.possible_dir = (True, False, True, True, True, False)
-                    else:
-                        self.role = 'boundary'
-                        self.possible_dir = (True, False, True, False, False, False)
-                elif west and not south: # W
-                    if even:
-                        self.role = 'boundary'
-                    else:
-                        self.role = 'active'
-                    self.possible_dir = (False, True, False, True, False, False)
-                elif east and not south: # E
-                    if facebd_e == 'pp':
-                        if even:
-                            self.first_aqmeas_flag = False
-                        else:
-                            self.first_aqmeas_flag = True
-                        self.role = 'active'
-                        self.possible_dir = (True, True, True, True, False, False)
-                    else:
-                        if even:
-                            self.role = 'active'
-                        else:
-                            self.role = 'boundary'
-                        self.possible_dir = (True, False, True, False, False, False)
-                elif west and south: # SW
-                    self.role = 'inactive'
-                    self.possible_dir = (False, False, False, False, False, False)
-                elif south and not east: # S
-                    if even:
-                        self.role = 'boundary'
-                    else:
-                        self.role = 'active'
-                        
-                    self.possible_dir = (True, True, False, False, False, False)
-                elif south and east: # SE
-                    self.role = 'boundary'
-                    if facebd_e == 'pp':
-                        self.possible_dir = (True, True, False, False, False, False)
-                    else:
-                        self.possible_dir = (True, False, False, False, False, False)
-                else: # C
-                    self.role = 'active'
-                    self.possible_dir = (True, True, True, True, False, False)
-            elif pchtype == 'mt':
-                # default first_aqmeas_flag
-                if facebd_w == 'mp':
-                    self.first_aqmeas_flag = True
-                else:
-                    self.first_aqmeas_flag = False
-                    
-                if north and west: # NW
-                    if facebd_w == 'mp':
-                        self.role = 'active'
-                    else:
-                        self.role = 'boundary'
-                    self.possible_dir = (False, False, True, True, False, False)
-                elif north and not east: # N
-                    if even:
-                        self.role = 'active'
-                    else:
-                        self.role = 'boundary'
-                        self.first_aqmeas_flag = False
-                    self.possible_dir = (False, False, True, True, False, False)
-                elif north and east: # NE
-                    self.role = 'boundary'
-                    self.possible_dir = (False, False, True, False, False, False)
-                    self.first_aqmeas_flag = False
-                elif west and not south: # W
-                    if facebd_w == 'mp':
-                        self.role = 'active'
-                        self.possible_dir = (True, True, True, True, False, False)
-                    else:
-                        if even: 
-                            self.role = 'boundary'
-                        else:
-                            self.role = 'active'
-                        self.possible_dir = (False, True, False, True, False, False)
-                elif east and not south: # E
-                    if even:
-                        self.role = 'active'
-                    else:
-                        self.role = 'boundary'
-                        self.first_aqmeas_flag = False
-                    self.possible_dir = (True, False, True, False, False, False)
-                elif west and south: # SW
-                    self.role = 'active'
-                    if facebd_w == 'mp':
-                        self.possible_dir = (True, True, False, False, False, True)
-                    else:
-                        self.possible_dir = (False, True, False, False, False, True)
-                elif south and not east: # S
-                    self.role = 'active'
-                    self.possible_dir = (True, True, False, False, False, True)
-                elif south and east: # SE
-                    if facebd_w == 'mp':
-                        self.role = 'active'
-                        self.possible_dir = (True, False, False, False, False, True)
-                    else:
-                        self.role = 'boundary'
-                        self.possible_dir = (True, False, False, False, False, False)
-                else: # C
-                    self.role = 'active'
-                    self.possible_dir = (True, True, True, True, False, False)
-            elif pchtype == 'mb':
-                # default first_aqmeas_flag
-                self.first_aqmeas_flag = False
-                
-                if north and west: # NW
-                    if facebd_n == 'lp' and facebd_w == 'pp':
-                        self.first_aqmeas_flag = True
-                        self.role = 'active'
-                        self.possible_dir = (False, False, True, True, True, False)
-                    elif facebd_n == 'lp':
-                        self.role = 'active'
-                        self.possible_dir = (False, False, False, True, True, False)
-                    else:
-                        self.role = 'boundary'
-                        self.possible_dir = (False, False, False, True, False, False)
-                elif north and not east: # N
-                    if even:
-                        if facebd_n == 'lp' and facebd_w == 'pp':
-                            self.first_aqmeas_flag = True
-                        
-                    if facebd_n == 'lp':
-                        self.role = 'active'
-                        self.possible_dir = (False, False, True, True, True, False)
-                    else:
-                        if even:
-                            self.role = 'boundary'
-                        else:
-                            self.role = 'active'
-                        self.possible_dir = (False, False, True, True, False, False)
-                elif north and east: # NE
-                    if facebd_n == 'lp' and facebd_w == 'pp':
-                        self.first_aqmeas_flag = True
-
-                    if facebd_e == 'pp':
-                        self.role = 'active'
-                        self.possible_dir = (False, False, True, True, True, False)
-                    else:
-                        self.role = 'boundary'
-                        self.possible_dir = (False, False, True, False, False, False)
-                elif west and not south: # W
-                    if even:
-                        pass
-                    else:
-                        if facebd_n == 'lp' and facebd_w == 'pp':
-                            self.first_aqmeas_flag = True
-                    
-                    if facebd_w == 'pp':
-                        self.role = 'active'
-                        self.possible_dir = (True, True, True, True, False, False)
-                    else:
-                        if even:
-                            self.role = 'active'
-                        else:
-                            self.role = 'boundary'
-                        self.possible_dir = (False, True, False, True, False, False)
-                elif east and not south: # E
-                    if even:
-                        pass
-                    else:
-                        if facebd_n == 'lp' and facebd_w == 'pp':
-                            self.first_aqmeas_flag = True
-                            
-                    if facebd_e == 'pp':
-                        self.role = 'active'
-                        self.possible_dir = (True, True, True, True, False, False)
-                    else:
-                        if even:
-                            self.role = 'active'
-                        else:
-                            self.role = 'boundary'
-                        self.possible_dir = (True, False, True, False, False, False)
-                elif west and south: # SW
-                    if facebd_n == 'lp' and facebd_w == 'pp':
-                        self.first_aqmeas_flag = True
-
-                    if facebd_w == 'pp':
-                        self.role = 'active'
-                        self.possible_dir = (True, True, False, False, False, False)
-                    else:
-                        self.role = 'boundary'
-                        self.possible_dir = (False, True, False, False, False, False)
-                elif south and not east: # S
-                    if even:
-                        self.role = 'boundary'
-                    else:
-                        self.role = 'active'
-                    self.possible_dir = (True, True, False, False, False, False)
-                elif south and east: # SE
-                    self.role = 'boundary'
-                    if facebd_w == 'pp':
-                        self.possible_dir = (True, True, False, False, False, False)
-                    else:
-                        self.possible_dir = (True, False, False, False, False, False)
-                else: # C
-                    self.role = 'active'
-                    self.possible_dir = (True, True, True, True, False, False)
-            elif pchtype == 'm':
-                # default first_aqmeas_flag
-                self.first_aqmeas_flag = False
-                
-                if north and west: # NW
-                    self.role = 'boundary'
-                    if facebd_n == 'pp':
-                        self.possible_dir = (False, True, False, True, False, False)
-                    else:
-                        self.possible_dir = (False, False, False, True, False, False)
-                elif north and not east: # N
-                    if facebd_n == 'pp':
-                        if even:
-                            pass
-                        else:
-                            self.first_aqmeas_flag = True
-                        
-                    if facebd_n == 'pp':
-                        self.role = 'active'
-                        self.possible_dir = (True, True, True, True, False, False)
-                    else:
-                        if even:
-                            self.role = 'active'
-                        else:
-                            self.role = 'boundary'
-                        self.possible_dir = (False, False, True, True, False, False)
-                elif north and east: # NE
-                    if facebd_n == 'pp':
-                        self.first_aqmeas_flag = True
-                            
-                    if facebd_n == 'pp':
-                        self.role = 'active'
-                        self.possible_dir = (True, False, True, False, False, False)
-                    else:
-                        self.role = 'boundary'
-                        self.possible_dir = (False, False, True, False, False, False)
-                elif west and not south: # W
-                    if even:
-                        self.role = 'boundary'
-                    else:
-                        self.role = 'active'
-                    self.possible_dir = (False, True, False, True, False, False)
-                elif east and not south: # E
-                    if even:
-                        self.role = 'boundary'
-                    else:
-                        self.role = 'active'
-                    self.possible_dir = (True, False, True, False, False, False)
-                elif west and south: # SW
-                    if facebd_s == 'pp':
-                        self.first_aqmeas_flag = True
-                            
-                    if facebd_s == 'pp':
-                        self.role = 'active'
-                        self.possible_dir = (False, True, False, True, False, False)
-                    else:
-                        self.role = 'boundary'
-                        self.possible_dir = (False, True, False, False, False, False)
-                elif south and not east: # S
-                    if facebd_s == 'pp':
-                        if even:
-                            pass
-                        else:
-                            self.first_aqmeas_flag = True
-                        
-                    if facebd_s == 'pp':
-                        self.role = 'active'
-                        self.possible_dir = (True, True, True, True, False, False)
-                    else:
-                        if even:
-                            self.role = 'active'
-                        else:
-                            self.role = 'boundary'
-                        self.possible_dir = (True, True, False, False, False, False)
-                elif south and east: # SE
-                    self.role = 'boundary'
-                    if facebd_s == 'pp':
-                        self.possible_dir = (True, False, True, False, False, False)
-                    else:
-                        self.possible_dir = (True, False, False, False, False, False)
-                else: # C
-                    self.role = 'active'
-                    self.possible_dir = (True, True, True, True, False, False)
-            elif pchtype == 'x' or pchtype == 'z':
-                # default first_aqmeas_flag
-                self.first_aqmeas_flag = False
-                
-                if north and west: # NW
-                    self.role = 'boundary'
-                    self.possible_dir = (False, False, True, True, False, False)
-                elif north and not east: # N
-                    if even:
-                        self.role = 'boundary'
-                    else:
-                        self.role = 'active'
-                    self.possible_dir = (False, False, True, True, False, False)
-                elif north and east: # NE
-                    self.role = 'boundary'
-                    self.possible_dir = (False, False, True, False, False, False)
-                elif west and not south: # W
-                    if facebd_w == 'pp':
-                        if even:
-                            pass
-                        else:
-                            self.first_aqmeas_flag = True
-                            
-                    if facebd_w == 'pp':
-                        self.role = 'active'
-                        self.possible_dir = (True, True, True, True, False, False)
-                    else:
-                        if even:
-                            self.role = 'active'
-                        else:
-                            self.role = 'boundary'
-                        self.possible_dir = (False, True, False, True, False, False)
-                elif east and not south: # E
-                    if even:
-                        self.role = 'active'
-                    else:
-                        self.role = 'boundary'
-                    self.possible_dir = (True, False, True, False, False, False)
-                elif west and south: # SW
-                    if facebd_w == 'pp':
-                        self.first_aqmeas_flag = True
-                        
-                    if facebd_w == 'pp':
-                        self.role = 'active'
-                        self.possible_dir = (True, True, False, False, False, False)
-                    else:
-                        self.role = 'boundary'
-                        self.possible_dir = (False, True, False, False, False, False)
-                elif south and not east: # S
-                    if even:
-                        self.role = 'boundary'
-                    else:
-                        self.role = 'active'
-                    self.possible_dir = (True, True, False, False, False, False)
-                elif south and east: # SE
-                    self.role = 'boundary'
-                    self.possible_dir = (True, False, False, False, False, False)
-                else: # C
-                    self.role = 'active'
-                    self.possible_dir = (True, True, True, True, False, False)
-            elif 'a' in pchtype:
-                # default first_aqmeas_flag
-                self.first_aqmeas_flag = False
-                if north and west: # NW
-                    self.role = 'boundary'
-                    if facebd_n == 'pp':
-                        self.possible_dir = (False, True, True, True, False, False)
-                    else:
-                        self.possible_dir = (False, False, True, True, False, False)
-                elif north and not east: # N
-                                                
-                    if facebd_n == 'pp':
-                        self.role = 'active'
-                        self.possible_dir = (True, True, True, True, False, False)
-                        self.first_aqmeas_flag = True
-                    else:
-                        if even:
-                            self.role = 'boundary'
-                        else:
-                            self.role = 'active'
-                            self.first_aqmeas_flag = True
-                        self.possible_dir = (False, False, True, True, False, False)
-                elif north and east: # NE
-                    if facebd_n == 'pp' and facebd_e == 'pp':
-                        self.role = 'active'
-                        self.possible_dir = (True, False, True, True, False, False)
-                        self.first_aqmeas_flag = True
-                    elif facebd_n == 'pp':
-                        self.role = 'active'
-                        self.possible_dir = (True, False, True, False, False, False)
-                        self.first_aqmeas_flag = True
-                    elif facebd_e == 'pp':
-                        self.role = 'active'
-                        self.possible_dir = (False, False, True, True, False, False)
-                        self.first_aqmeas_flag = True
-                    else:
-                        self.role = 'inactive'
-                        self.possible_dir = (False, False, False, False, False, False)
-                elif west and not south: # W
-                    self.role = 'active'
-                    self.possible_dir = (True, True, True, True, False, False)
-                    self.first_aqmeas_flag = True
-                elif east and not south: # E
-                    if facebd_e == 'pp':
-                        self.role = 'active'
-                        self.possible_dir = (True, True, True, True, False, False)
-                        self.first_aqmeas_flag = True
-                    else:
-                        if even:
-                            self.role = 'boundary'
-                        else:
-                            self.role = 'active'
-                            self.first_aqmeas_flag = True
-                        self.possible_dir = (True, False, True, False, False, False)
-                elif west and south: # SW
-                    self.role = 'active'
-                    self.possible_dir = (True, True, False, True, False, False)
-                    self.first_aqmeas_flag = True
-                elif south and not east: # S
-                    if facebd_s == 'pp':
-                        self.role = 'active'
-                        self.possible_dir = (True, True, True, True, False, False)
-                        self.first_aqmeas_flag = True
-                    else:
-                        if even:
-                            self.role = 'boundary'
-                        else:
-                            self.role = 'active'
-                            self.first_aqmeas_flag = True
-                        self.possible_dir = (True, True, False, False, False, False)
-                elif south and east: # SE
-                    self.role = 'boundary'
-                    if facebd_s == 'pp' and facebd_e == 'pp':
-                        self.possible_dir = (True, True, True, False, False, False)
-                    elif facebd_s == 'pp':
-                        self.possible_dir = (True, False, True, False, False, False)
-                    elif facebd_e == 'pp':
-                        self.possible_dir = (True, True, False, False, False, False)
-                    else:
-                        self.possible_dir = (True, False, False, False, False, False)
-                else: # C
-                    self.role = 'active'
-                    self.possible_dir = (True, True, True, True, False, False)
-                    self.first_aqmeas_flag = True
-            else:
-                self.role = 'inactive'
-                self.possible_dir = (False, False, False, False, False, False)
-                self.first_aqmeas_flag = False
-            # syn_to_west/east
-            if pchtype == 'zt':
-                if east and (not north) and (not south):
-                    if facebd_e == 'mp':
-                        if even:
-                            self.syn_to_west = 'z'
-                            self.syn_to_east = 'x'
-                        else:
-                            self.syn_to_west = 'x'
-                            self.syn_to_east = 'z'
-                    else:
-                        if even:
-                            self.syn_to_west = 'z'
-                            self.syn_to_east = 'i'
-                        else:
-                            self.syn_to_west = 'x'
-                            self.syn_to_east = 'i'
-                elif east and south:
-                    if facebd_e == 'mp':
-                        self.syn_to_west = 'z'
-                        self.syn_to_east = 'x'
-                    else:
-                        self.syn_to_west = 'z'
-                        self.syn_to_east = 'i'
-                else:
-                    if even:
-                        self.syn_to_west = 'z'
-                        self.syn_to_east = 'z'
-                    else:
-                        self.syn_to_west = 'x'
-                        self.syn_to_east = 'x'
-            elif pchtype == 'mt':
-                if even:
-                    self.syn_to_west = 'x'
-                    self.syn_to_east = 'x'
-                else:
-                    self.syn_to_west = 'z'
-                    self.syn_to_east = 'z'
-            else:
-                if even:
-                    self.syn_to_west = 'z'
-                    self.syn_to_east = 'z'
-                else:
-                    self.syn_to_west = 'x'
-                    self.syn_to_east = 'x'
-        else:
-            raise Exception("error_decode_unit - transfer_predecoder: block_type {} is currently not supported".format(self.config.block_type))
+        # predecoder outputs only change with the layout
+        if self.input_pchinfo_version is not None and self.input_pchinfo_version == self.predecoder_version:
+            return
+        self.predecoder_version = self.input_pchinfo_version
+        self.role, self.possible_dir, self.first_aqmeas_flag, self.syn_to_west, self.syn_to_east = predecode_cell(self.config, self.location_reg, self.input_pchinfo)
         return
 
     def transfer_esmval(self):
@@ -1795,33 +2170,33 @@ class edu_cell:
         #
         if self.syndrome_taken and self.spike_taken:
             if self.state in ['source', 'boundary']: # output_local_errormatch
-                syndrome_out = 'i'
+                syndrome_out = PAULI_I
             elif 'w' in self.syndir_reg:
                 syndrome_out = self.syn_to_west
             elif 'e' in self.syndir_reg:
                 syndrome_out = self.syn_to_east
             elif self.syndir_reg in ['n', 's']: # don't care
-                syndrome_out = 'z'
+                syndrome_out = PAULI_Z
             else:
-                syndrome_out = 'i'
+                syndrome_out = PAULI_I
         else:
-            syndrome_out = 'i'
+            syndrome_out = PAULI_I
 
         ##  
         if self.syndir_reg == 'nw':
-            self.output_syndrome = [syndrome_out, 'i', 'i', 'i', 'i', 'i']
+            self.output_syndrome = [syndrome_out, PAULI_I, PAULI_I, PAULI_I, PAULI_I, PAULI_I]
         elif self.syndir_reg == 'ne':
-            self.output_syndrome = ['i', syndrome_out, 'i', 'i', 'i', 'i']
+            self.output_syndrome = [PAULI_I, syndrome_out, PAULI_I, PAULI_I, PAULI_I, PAULI_I]
         elif self.syndir_reg == 'sw':
-            self.output_syndrome = ['i', 'i', syndrome_out, 'i', 'i', 'i']
+            self.output_syndrome = [PAULI_I, PAULI_I, syndrome_out, PAULI_I, PAULI_I, PAULI_I]
         elif self.syndir_reg == 'se':
-            self.output_syndrome = ['i', 'i', 'i', syndrome_out, 'i', 'i']
+            self.output_syndrome = [PAULI_I, PAULI_I, PAULI_I, syndrome_out, PAULI_I, PAULI_I]
         elif self.syndir_reg == 'n':
-            self.output_syndrome = ['i', 'i', 'i', 'i', syndrome_out, 'i']
+            self.output_syndrome = [PAULI_I, PAULI_I, PAULI_I, PAULI_I, syndrome_out, PAULI_I]
         elif self.syndir_reg == 's':
-            self.output_syndrome = ['i', 'i', 'i', 'i', 'i', syndrome_out]
+            self.output_syndrome = [PAULI_I, PAULI_I, PAULI_I, PAULI_I, PAULI_I, syndrome_out]
         else:
-            self.output_syndrome = ['i', 'i', 'i', 'i', 'i', 'i']
+            self.output_syndrome = [PAULI_I, PAULI_I, PAULI_I, PAULI_I, PAULI_I, PAULI_I]
 
         return
 
@@ -1882,7 +2257,7 @@ class edu_cell:
             self.syndrome_taken = True
         elif not self.syndrome_taken:
             for syndrome in self.input_syndrome:
-                if syndrome != 'i':
+                if syndrome != PAULI_I:
                     self.syndrome_taken = True
         # prev_aqmeas_reg
         if self.input_pop_aqmeasbuf and self.aqmeasbuf_valid: 
@@ -1998,3 +2373,914 @@ class edu_cell:
         elif self.input_set_first_aqmeas and self.first_aqmeas_flag:
             self.first_aqmeas = True
         return
+
+###########################################################
+
+
+def get_neighbor_port(out_port):
+    # Input ports (nw, ne, sw, se, n, s) of every educell from the facing output ports of its neighbors
+    ## out_port: (..., num_aqrow, num_aqcol, 6), leading axes (e.g., windows of edu_batch) are kept
+    in_port = np.zeros_like(out_port)
+    in_port[..., 1:, 1:, DIR_NW] = out_port[..., :-1, :-1, DIR_SE]
+    in_port[..., 1:, :-1, DIR_NE] = out_port[..., :-1, 1:, DIR_SW]
+    in_port[..., :-1, 1:, DIR_SW] = out_port[..., 1:, :-1, DIR_NE]
+    in_port[..., :-1, :-1, DIR_SE] = out_port[..., 1:, 1:, DIR_NW]
+    in_port[..., 1:, :, DIR_N] = out_port[..., :-1, :, DIR_S]
+    in_port[..., :-1, :, DIR_S] = out_port[..., 1:, :, DIR_N]
+    return in_port
+
+
+def mux(sel, in_1, in_0):
+    # np.where(sel, in_1, in_0) of int8 wires by bitwise ops (np.where is slow on scattered sel)
+    ## sel: bool array, in_1/in_0: int8 arrays or small int constants
+    sel = sel.view(np.int8)
+    if isinstance(in_1, int) and in_1 == 0:
+        return in_0 & (sel-1)
+    if isinstance(in_0, int) and in_0 == 0:
+        return in_1 & -sel
+    return in_0 ^ ((in_1 ^ in_0) & -sel)
+
+
+def get_neighbor_in(out_dir):
+    # Input ports (nw, ne, sw, se, n, s) of every educell: whether the facing neighbor outputs to it
+    ## out_dir: (..., num_aqrow, num_aqcol) output port of every educell (DIR_I: no output), one plane per input port
+    in_port = [np.zeros(out_dir.shape, dtype=bool) for _ in DIR_PORT]
+    in_port[DIR_NW][..., 1:, 1:] = (out_dir[..., :-1, :-1] == DIR_SE)
+    in_port[DIR_NE][..., 1:, :-1] = (out_dir[..., :-1, 1:] == DIR_SW)
+    in_port[DIR_SW][..., :-1, 1:] = (out_dir[..., 1:, :-1] == DIR_NE)
+    in_port[DIR_SE][..., :-1, :-1] = (out_dir[..., 1:, 1:] == DIR_NW)
+    in_port[DIR_N][..., 1:, :] = (out_dir[..., :-1, :] == DIR_S)
+    in_port[DIR_S][..., :-1, :] = (out_dir[..., 1:, :] == DIR_N)
+    return in_port
+
+
+def get_aqmeas_int(aqmeas_array, shape):
+    # int(aqmeas) of every educell, 0 if it is not a number (e.g., '-')
+    if aqmeas_array is None:
+        return np.zeros(shape, dtype=int)
+    aqmeas_array = np.asarray(aqmeas_array)
+    if aqmeas_array.dtype.kind in 'biuf':
+        return aqmeas_array.astype(int)
+    aqmeas_int = np.zeros(shape, dtype=int)
+    digit = np.char.isdigit(aqmeas_array.astype(str))
+    aqmeas_int[digit] = aqmeas_array[digit].astype(int)
+    return aqmeas_int
+
+
+## (block_type, patch size, pchtype, facebd) -> predecoder outputs of the educells of a patch
+### every patch has the same local locations, so they only depend on its pchinfo
+_predecoder_block_cache = dict()
+
+def get_predecoder_block(config, pchinfo):
+    key = (config.block_type, config.num_ucrow, config.num_uccol, pchinfo['pchtype'], tuple(pchinfo['facebd']))
+    if key not in _predecoder_block_cache:
+        shape = (config.num_ucrow*2, config.num_uccol*2)
+        role = np.zeros(shape, dtype=int)
+        possible_dir = np.zeros(shape+(6,), dtype=bool)
+        first_aqmeas_flag = np.zeros(shape, dtype=bool)
+        syn_to_west = np.zeros(shape, dtype=int)
+        syn_to_east = np.zeros(shape, dtype=int)
+        for (i, j) in np.ndindex(shape):
+            cell_role, cell_possible_dir, cell_first_aqmeas_flag, cell_syn_to_west, cell_syn_to_east = \
+                    predecode_cell(config, get_location_reg(config, i, j), pchinfo)
+            role[i][j] = ROLE_LIST.index(cell_role)
+            possible_dir[i][j] = cell_possible_dir
+            first_aqmeas_flag[i][j] = cell_first_aqmeas_flag
+            syn_to_west[i][j] = cell_syn_to_west
+            syn_to_east[i][j] = cell_syn_to_east
+        _predecoder_block_cache[key] = (role, possible_dir, first_aqmeas_flag, syn_to_west, syn_to_east)
+    return _predecoder_block_cache[key]
+
+
+class edu_cell_vector:
+    # edu_cell of every ancilla as arrays over the (num_aqrow, num_aqcol) grid
+    ## wires and registers keep the names of edu_cell; strings are encoded as CELL_*, ROLE_* and DIR_*
+    def __init__(self, config):
+        self.config = config
+        self.shape = (self.config.num_aqrow, self.config.num_aqcol)
+        # Wires
+        ## Input wires (scalars are shared by every educell)
+        self.input_last_aqmeas_flip = None
+        self.input_set_first_aqmeas = None 
+        self.input_shift_token = None
+        self.input_global_tokenmatch = None
+        self.input_global_errormatch = None
+        self.input_global_measmatch = None
+        self.input_wr_zeroesm = None
+        self.input_rst_cellstate = None
+        self.input_token_finish = None
+        self.input_set_measerr_flag = None
+        self.input_set_last_measerr_flag = None
+        self.input_pop_aqmeasbuf = None
+        self.input_apply_aqmeas_flip = None
+        self.input_aqmeas_valid = None
+        self.input_aqmeas_array = None
+        self.input_pchinfo = None # pchinfo of every patch, None if pchinfo_buf is empty
+        self.input_pchinfo_version = None
+        self.input_curr_rowidx = None
+        self.input_myrowidx = None
+        self.input_token = None
+        self.input_flag = None
+        self.input_spike = None # (nw, ne, sw, se, n, s)
+        self.input_syndrome = None # (nw, ne, sw, se, n, s)
+        ## Intermediate wires
+        ## from active
+        self.active_win = None
+        ## from predecoder
+        self.role = None
+        self.possible_dir = None
+        self.syn_to_west = None
+        self.syn_to_east = None
+        self.first_aqmeas_flag = None
+        ## from esmval
+        self.aqmeasbuf_valid = None
+        self.aqmeasbuf_val = None
+        self.esm_val = None
+        ## from decoder
+        self.next_state = None
+        self.spike_dir = None
+        ## from syndir
+        self.syndir = None
+        ## from spikegen
+        self.output_spike = None
+        ## from syndromegen
+        self.output_syndrome = None
+        ## Output wires
+        self.output_token = None
+        self.output_flag = None
+        self.output_esmhead_exist = None
+        self.output_local_tokenmatch = None
+        self.output_local_errormatch = None
+        self.output_local_measmatch = None
+        self.output_eigen = None
+
+        # Registers
+        ## State register
+        self.state = np.full(self.shape, CELL_READY, dtype=int)
+        ## Input register
+        self.token_reg = np.zeros(self.shape, dtype=int)
+        self.flag_token = np.zeros(self.shape, dtype=int)
+        self.spike_taken = np.zeros(self.shape, dtype=bool)
+        self.syndrome_taken = np.zeros(self.shape, dtype=bool)
+        ## Internal register
+        self.prev_aqmeas_reg = np.zeros(self.shape+(2,), dtype=int)
+        self.esm_reg = np.zeros(self.shape+(self.config.aqmeas_th,), dtype=int)
+        self.esm_delay_reg = self.get_init_esm_delay_reg()
+        self.bd_delay_reg = np.zeros(self.shape+(self.config.bd_delay,), dtype=int)
+        self.spikedir_reg = np.full(self.shape, DIR_I, dtype=int)
+        self.syndir_reg = np.full(self.shape, DIR_I, dtype=int)
+        self.measerr_flag = np.zeros(self.shape, dtype=int)
+        self.first_aqmeas = np.ones(self.shape, dtype=bool)
+        self.last_measerr_flag = np.zeros(self.shape, dtype=int)
+        self.last_aqmeas_flip_reg = np.zeros(self.shape, dtype=int)
+        self.predecoder_version = None # pchinfo_version of the predecoder outputs
+        ## aqmeas_buf: every educell is written and popped at once, so valid is shared
+        self.aqmeas_buf_valid = [False, False]
+        self.aqmeas_buf_val = np.zeros((2,)+self.shape, dtype=int)
+
+    def get_init_esm_delay_reg(self):
+        esm_delay_reg = []
+        for i in range(self.config.aqmeas_th):
+            if i == 0:
+                esm_delay_reg.append(None)
+            else:
+                esm_delay_reg.append(np.zeros(self.shape+(i,), dtype=int))
+        return esm_delay_reg
+
+    def get_esm_delay_head(self):
+        # (num_aqrow, num_aqcol, aqmeas_th-1): head of esm_delay_reg[1:]
+        if self.config.aqmeas_th == 1:
+            return np.zeros(self.shape+(0,), dtype=int)
+        return np.stack([reg[:, :, 0] for reg in self.esm_delay_reg[1:]], axis=-1)
+
+
+    def transfer(self):
+        self.transfer_predecoder()
+        self.transfer_esmval()
+        self.transfer_active()
+        self.transfer_output()
+        self.transfer_spikegen()
+        self.transfer_syndir()
+        self.transfer_syndromegen()
+        return
+
+    def transfer_predecoder(self):
+        # predecode_cell of every patch, tiled over the grid: only when the layout changes
+        if self.input_pchinfo_version is not None and self.input_pchinfo_version == self.predecoder_version:
+            return
+        self.predecoder_version = self.input_pchinfo_version
+        num_pch = self.config.num_pchrow * self.config.num_pchcol
+        if self.input_pchinfo is None:
+            pchinfo_list = [EMPTY_PCHINFO] * num_pch
+        else:
+            pchinfo_list = self.input_pchinfo[:num_pch]
+        block_list = [get_predecoder_block(self.config, pchinfo) for pchinfo in pchinfo_list]
+        tile_list = []
+        for k in range(5):
+            block = np.array([blocks[k] for blocks in block_list])
+            block = block.reshape((self.config.num_pchrow, self.config.num_pchcol)+block.shape[1:])
+            tile_list.append(block.swapaxes(1, 2).reshape(self.shape+block.shape[4:]))
+        self.role, self.possible_dir, self.first_aqmeas_flag, self.syn_to_west, self.syn_to_east = tile_list
+        return
+
+    def transfer_esmval(self):
+        self.aqmeasbuf_valid = self.aqmeas_buf_valid[0]
+        self.aqmeasbuf_val = self.aqmeas_buf_val[0]
+
+        if self.input_wr_zeroesm or not self.aqmeasbuf_valid:
+            self.esm_val = np.zeros(self.shape, dtype=int)
+        else:
+            esm_val = self.aqmeasbuf_val ^ self.prev_aqmeas_reg[:, :, 0] ^ self.measerr_flag
+            self.esm_val = np.where((~self.first_aqmeas) & (self.role == ROLE_ACTIVE), esm_val, 0)
+        return
+
+    def transfer_decoder(self):
+        ## next_state
+        if self.input_rst_cellstate:
+            self.next_state = np.full(self.shape, CELL_READY, dtype=int)
+        else:
+            esm_exist = self.esm_reg.any(axis=-1)
+            active_state = np.where(self.output_local_tokenmatch, CELL_SYNK, np.where(esm_exist, CELL_SOURCE, CELL_TRANSMIT))
+            self.next_state = np.where(self.role == ROLE_ACTIVE, active_state, 
+                                       np.where(self.role == ROLE_BOUNDARY, CELL_BOUNDARY, CELL_INACTIVE))
+
+        ## spike_dir: expected_dir if possible, else n/s, else none
+        expected_dir = np.where(self.input_myrowidx < self.input_curr_rowidx, DIR_SE, 
+                                np.where(self.input_myrowidx > self.input_curr_rowidx, DIR_NW, 
+                                         np.where(self.flag_token == 1, DIR_NE, DIR_SW)))
+        ns_dir = np.where((expected_dir == DIR_NW) | (expected_dir == DIR_NE), DIR_N, DIR_S)
+        expected_ok = np.take_along_axis(self.possible_dir, expected_dir[:, :, None], axis=-1)[:, :, 0]
+        ns_ok = np.take_along_axis(self.possible_dir, ns_dir[:, :, None], axis=-1)[:, :, 0]
+        self.spike_dir = np.where(expected_ok, expected_dir, np.where(ns_ok, ns_dir, DIR_I))
+        return
+
+    def transfer_active(self):
+        # Active set: educells holding an esm, a delayed esm or boundary spike, or a taken spike/syndrome
+        ## the others output no spike, no syndrome and no local match, so spikegen, syndir, syndromegen 
+        ## and the local matches are only evaluated in the bounding window of the active set and its neighbors
+        ## active_win is None if the whole grid is quiet
+        active = self.esm_reg.any(axis=-1) | (self.bd_delay_reg[:, :, 0] != 0) | self.spike_taken | self.syndrome_taken
+        for reg in self.esm_delay_reg[1:]:
+            active |= reg.any(axis=-1)
+        row_list = np.flatnonzero(active.any(axis=1))
+        if len(row_list) == 0:
+            self.active_win = None
+        else:
+            col_list = np.flatnonzero(active.any(axis=0))
+            self.active_win = (slice(max(row_list[0]-1, 0), row_list[-1]+2), slice(max(col_list[0]-1, 0), col_list[-1]+2))
+        return
+
+    def transfer_spikegen(self):
+        self.output_spike = np.zeros(self.shape+(len(DIR_PORT),), dtype=int)
+        if self.active_win is None:
+            return
+        win = self.active_win
+        state = self.state[win]
+        ## spike_out
+        spike_esm = self.esm_reg[win][:, :, 0] | np.bitwise_or.reduce(self.get_esm_delay_head()[win], axis=-1, initial=0)
+        spike_bd = self.bd_delay_reg[win][:, :, 0]
+        spike_in = self.spike_taken[win].astype(int)
+        spike_out = np.select([state == CELL_SOURCE, state == CELL_BOUNDARY, state == CELL_TRANSMIT], 
+                              [spike_esm, spike_bd, spike_in], 0)
+        ##
+        self.output_spike[win] = (self.spikedir_reg[win][:, :, None] == DIR_PORT) * spike_out[:, :, None]
+        return
+
+    def transfer_syndir(self):
+        self.syndir = np.full(self.shape, DIR_I, dtype=int)
+        if self.input_spike is None or self.active_win is None:
+            return
+        win = self.active_win
+        # Set priority (Heuristic): the last port with a spike
+        spike_in = (self.input_spike[win] == 1)
+        last_port = (len(DIR_PORT)-1) - np.argmax(spike_in[:, :, ::-1], axis=-1)
+        self.syndir[win] = np.where(spike_in.any(axis=-1), last_port, DIR_I)
+        return
+
+    def transfer_syndromegen(self):
+        self.output_syndrome = np.zeros(self.shape+(len(DIR_PORT),), dtype=np.uint8)
+        if self.active_win is None:
+            return
+        win = self.active_win
+        state = self.state[win]
+        syndir_reg = self.syndir_reg[win]
+        source_or_boundary = (state == CELL_SOURCE) | (state == CELL_BOUNDARY) # output_local_errormatch
+        to_west = (syndir_reg == DIR_NW) | (syndir_reg == DIR_SW)
+        to_east = (syndir_reg == DIR_NE) | (syndir_reg == DIR_SE)
+        to_ns = (syndir_reg == DIR_N) | (syndir_reg == DIR_S) # don't care
+        syndrome_out = np.select([source_or_boundary, to_west, to_east, to_ns], 
+                                 [PAULI_I, self.syn_to_west[win], self.syn_to_east[win], PAULI_Z], PAULI_I)
+        syndrome_out = np.where(self.syndrome_taken[win] & self.spike_taken[win], syndrome_out, PAULI_I)
+        ##
+        self.output_syndrome[win] = (syndir_reg[:, :, None] == DIR_PORT) * syndrome_out[:, :, None]
+        return
+
+    def transfer_output(self):
+        # output_token
+        self.output_token = self.token_reg
+        self.output_flag = self.flag_token
+        # output_esmhead_exist
+        self.output_esmhead_exist = self.esm_reg[:, :, 0] != 0
+        # local matches: none out of the active window
+        self.output_local_tokenmatch = np.zeros(self.shape, dtype=bool)
+        self.output_local_errormatch = np.zeros(self.shape, dtype=bool)
+        self.output_local_measmatch = np.zeros(self.shape, dtype=bool)
+        if self.active_win is not None:
+            win = self.active_win
+            state = self.state[win]
+            # output_local_tokenmatch
+            self.output_local_tokenmatch[win] = (self.role[win] == ROLE_ACTIVE) & (self.output_token[win] == 1) & self.output_esmhead_exist[win]
+            # output_local_errormatch
+            self.output_local_errormatch[win] = ((state == CELL_SOURCE) | (state == CELL_BOUNDARY)) & self.syndrome_taken[win]
+            # output_local_measmatch
+            self.output_local_measmatch[win] = (state == CELL_SYNK) & (self.get_esm_delay_head()[win] == 1).any(axis=-1)
+        # output_eigen
+        self.output_eigen = self.last_measerr_flag ^ (self.prev_aqmeas_reg[:, :, 1] ^ self.prev_aqmeas_reg[:, :, 0])
+        return
+
+
+    def update(self):
+        # decoder: next_state and spike_dir are only latched on global_tokenmatch or rst_cellstate
+        ## its inputs are registers and the final inputs of the cycle, so it is evaluated here only on those cycles
+        if self.input_global_tokenmatch or self.input_rst_cellstate:
+            self.transfer_decoder()
+        spike_taken = self.spike_taken
+        esmhead = self.esm_reg[:, :, 0]
+        pop_aqmeasbuf = bool(self.input_pop_aqmeasbuf) and self.aqmeasbuf_valid
+        spike_in_exist = (self.input_spike != 0).any(axis=-1)
+        # token_reg
+        if self.input_token_finish:
+            self.token_reg = np.zeros(self.shape, dtype=int)
+        elif self.input_shift_token:
+            self.token_reg = np.array(self.input_token, dtype=int)
+        # flag_token
+        if self.input_token_finish:
+            self.flag_token = np.zeros(self.shape, dtype=int)
+        elif self.input_shift_token:
+            self.flag_token = np.where(self.flag_token == 0, self.input_flag, self.flag_token)
+        # spike_taken 
+        if self.input_rst_cellstate:
+            self.spike_taken = np.zeros(self.shape, dtype=bool)
+        else:
+            self.spike_taken = (self.state == CELL_SOURCE) | self.spike_taken | spike_in_exist
+        # syndrome_taken
+        if self.input_rst_cellstate:
+            self.syndrome_taken = np.zeros(self.shape, dtype=bool)
+        else:
+            self.syndrome_taken = (self.state == CELL_SYNK) | self.syndrome_taken | (self.input_syndrome != PAULI_I).any(axis=-1)
+        # prev_aqmeas_reg
+        if pop_aqmeasbuf:
+            prev_aqmeas = np.where(self.first_aqmeas, 0, self.prev_aqmeas_reg[:, :, 1])
+            self.prev_aqmeas_reg = np.stack([prev_aqmeas, self.aqmeasbuf_val], axis=-1)
+        if self.input_apply_aqmeas_flip:
+            self.prev_aqmeas_reg = self.prev_aqmeas_reg.copy()
+            self.prev_aqmeas_reg[:, :, 0] ^= (self.last_aqmeas_flip_reg == 1)
+
+        # aqmeas_buf
+        if self.input_aqmeas_valid or self.input_pop_aqmeasbuf:
+            ## tail -> head
+            ## new -> tail
+            if self.input_aqmeas_valid:
+                self.aqmeas_buf_valid = [self.aqmeas_buf_valid[1], True]
+                self.aqmeas_buf_val = np.stack([self.aqmeas_buf_val[1], get_aqmeas_int(self.input_aqmeas_array, self.shape)])
+            else:
+                self.aqmeas_buf_valid = [self.aqmeas_buf_valid[1], False]
+                self.aqmeas_buf_val = np.stack([self.aqmeas_buf_val[1], np.zeros(self.shape, dtype=int)])
+
+        # last_aqmeas_flip_reg
+        if self.input_apply_aqmeas_flip:
+            self.last_aqmeas_flip_reg = np.where(self.input_last_aqmeas_flip == 1, 1, 0)
+        else:
+            self.last_aqmeas_flip_reg = np.where(self.input_last_aqmeas_flip == 1, 1, self.last_aqmeas_flip_reg)
+                
+        # esm_reg 
+        if pop_aqmeasbuf or self.input_wr_zeroesm:
+            self.esm_reg = np.concatenate([self.esm_reg[:, :, 1:], self.esm_val[:, :, None]], axis=-1)
+        else:
+            esm_reg = self.esm_reg.copy()
+            token_clear = (self.role != ROLE_ACTIVE) & (self.output_token != 0) & self.output_esmhead_exist
+            esm_reg[token_clear, 0] = 0
+            if self.input_global_errormatch:
+                esm_reg[(~token_clear) & (self.state == CELL_SYNK), 0] = 0
+                ## the first nonzero esm of the matched source
+                esm_one = (self.esm_reg == 1)
+                match = (~token_clear) & (self.state == CELL_SOURCE) & self.output_local_errormatch & esm_one.any(axis=-1)
+                esm_reg[match, np.argmax(esm_one, axis=-1)[match]] = 0
+            elif self.input_global_measmatch:
+                synk = (~token_clear) & (self.state == CELL_SYNK)
+                esm_reg[synk, 0] = 0
+                ## the first delayed esm at the head of its delay reg
+                delay_one = (self.get_esm_delay_head() == 1)
+                match = synk & delay_one.any(axis=-1)
+                esm_reg[match, np.argmax(delay_one, axis=-1)[match]+1] = 0
+            self.esm_reg = esm_reg
+        # esm_delay_reg
+        if self.input_rst_cellstate:
+            self.esm_delay_reg = self.get_init_esm_delay_reg()
+        else:
+            shift = ((self.state == CELL_SOURCE) | (self.state == CELL_SYNK))[:, :, None]
+            for i in range(1, self.config.aqmeas_th):
+                reg = self.esm_delay_reg[i]
+                self.esm_delay_reg[i] = np.where(shift, np.concatenate([reg[:, :, 1:], self.esm_reg[:, :, i:i+1]], axis=-1), reg)
+        # boundary_delay_reg
+        if self.input_rst_cellstate:
+            self.bd_delay_reg = np.zeros(self.shape+(self.config.bd_delay,), dtype=int)
+        else:
+            shift = (self.state == CELL_BOUNDARY)[:, :, None]
+            bd_delay_reg = np.concatenate([self.bd_delay_reg[:, :, 1:], np.ones(self.shape+(1,), dtype=int)], axis=-1)
+            self.bd_delay_reg = np.where(shift, bd_delay_reg, self.bd_delay_reg)
+
+        # state
+        if self.input_global_tokenmatch or self.input_rst_cellstate:
+            self.state = self.next_state
+        # spikedir_reg
+        if self.input_rst_cellstate:
+            self.spikedir_reg = np.full(self.shape, DIR_I, dtype=int)
+        elif self.input_global_tokenmatch:
+            self.spikedir_reg = self.spike_dir
+        # syndir_reg
+        if self.input_rst_cellstate:
+            self.syndir_reg = np.full(self.shape, DIR_I, dtype=int)
+        else:
+            self.syndir_reg = np.where((~spike_taken) & spike_in_exist, self.syndir, self.syndir_reg)
+        # measerr_flag
+        if self.input_set_measerr_flag:
+            self.measerr_flag = np.where(esmhead == 1, 1, self.measerr_flag)
+        elif pop_aqmeasbuf:
+            self.measerr_flag = np.zeros(self.shape, dtype=int)
+        # last_measerr_flag
+        if self.input_set_last_measerr_flag:
+            self.last_measerr_flag = np.where(esmhead == 1, 1, self.last_measerr_flag)
+        elif pop_aqmeasbuf:
+            self.last_measerr_flag = np.zeros(self.shape, dtype=int)
+        # first_aqmeas
+        if pop_aqmeasbuf:
+            self.first_aqmeas = np.zeros(self.shape, dtype=bool)
+        elif self.input_set_first_aqmeas:
+            self.first_aqmeas = self.first_aqmeas | self.first_aqmeas_flag
+        return
+
+
+class edu_batch:
+    # error_decode_unit (vector engine) of a batch of independent windows, stepped in lockstep
+    ## registers of the EDU and of edu_cell_vector with a leading window axis; EDU scalars are (num_window,) arrays
+    ## registers with a short last axis of edu_cell_vector (e.g., esm_reg) are lists of (num_window, num_aqrow, num_aqcol) planes
+    ## every window starts from the registers of the EDU it is copied from and runs on its layout:
+    ##   no pchinfo, dq measurement or TCU input (pchinfo_buf is not popped, opcode_reg is kept)
+    ## transfer evaluates every wire once, in dependency order: the educell outputs read by the token setup and 
+    ## the control only depend on registers, so one pass matches the two passes of error_decode_unit.transfer
+    def __init__(self, edu, num_window):
+        if edu.engine != "vector":
+            raise Exception("error_decode_unit - edu_batch: {} engine is not supported".format(edu.engine))
+        if edu.pchinfo_buf.empty:
+            raise Exception("error_decode_unit - edu_batch: no layout in pchinfo_buf")
+        self.config = edu.config
+        self.uarch = edu.unit_stat.uarch
+        self.shape = (self.config.num_aqrow, self.config.num_aqcol)
+        self.num_diag = self.config.num_aqrow+self.config.num_aqcol-1
+        educells = edu.educell_vector
+        # Constants
+        ## layout: predecoder outputs of the pchinfo at the head of pchinfo_buf
+        educells.input_pchinfo = edu.pchinfo_buf.buffer[0]
+        educells.input_pchinfo_version = edu.pchinfo_version
+        educells.transfer_predecoder()
+        self.role = educells.role
+        self.possible_dir = educells.possible_dir
+        self.first_aqmeas_flag = educells.first_aqmeas_flag
+        self.syn_to_west = educells.syn_to_west.astype(np.int8)
+        self.syn_to_east = educells.syn_to_east.astype(np.int8)
+        ## token setup: educells in the order of the anti-diagonal rows, and the first educell of each row
+        self.diag_row = edu.diag_row
+        self.diag_col = edu.diag_col
+        self.diag_order = np.lexsort((self.diag_col.ravel(), self.diag_row.ravel()))
+        self.diag_start = np.searchsorted(self.diag_row.ravel()[self.diag_order], np.arange(self.num_diag))
+        self.diag_col_sorted = self.diag_col.ravel()[self.diag_order].astype(np.int8)
+        self.rr_out_idx = edu.rr_out_idx
+        self.rr_first_mask = edu.rr_first_mask
+        self.myrowidx_array = edu.myrowidx_array
+        self.grid_row, self.grid_col = np.indices(self.shape)
+
+        def tile(val, dtype=None):
+            return np.repeat(np.asarray(val, dtype=dtype)[None], num_window, axis=0)
+        def tile_plane(val, dtype=None):
+            val = np.asarray(val)
+            return [tile(val[..., k], dtype) for k in range(val.shape[-1])]
+        # Registers
+        ## window index in the batch & not finished (stats are only recorded for live windows)
+        self.window_idx = np.arange(num_window)
+        self.live = np.ones(num_window, dtype=bool)
+        ## EDU
+        self.state = tile(EDU_STATE_LIST.index(edu.state))
+        self.set_first_aqmeas = tile(edu.set_first_aqmeas, bool)
+        self.first_token = tile(edu.first_token, bool)
+        self.timeout_th = tile(edu.timeout_th, int)
+        self.timeout_counter = tile(edu.timeout_counter, int)
+        self.aqmeas_counter = tile(edu.aqmeas_counter, int)
+        self.round_counter = tile(edu.round_counter, int)
+        self.curr_rowidx_reg = tile(edu.curr_rowidx_reg, int)
+        self.last_token_reg = tile(edu.last_token_reg, int)
+        self.error_array_reg = tile(edu.error_array_reg, np.int8)
+        self.output_valid = tile(edu.output_valid, bool)
+        self.batch_attr = ["window_idx", "live", "state", "set_first_aqmeas", "first_token", "timeout_th", "timeout_counter", 
+                           "aqmeas_counter", "round_counter", "curr_rowidx_reg", "last_token_reg", "error_array_reg", "output_valid"]
+        if "fast" in self.uarch:
+            self.token_exist_rows_0_reg = tile(edu.token_exist_rows_0_reg, bool)
+            self.token_col_rows_0_reg = tile(edu.token_col_rows_0_reg, int)
+            self.token_valid_0_reg = tile(edu.token_valid_0_reg, bool)
+            self.token_exist_rows_1_reg = tile(edu.token_exist_rows_1_reg, bool)
+            self.token_exist_1_reg = tile(edu.token_exist_1_reg, bool)
+            self.token_row_1_reg = tile(edu.token_row_1_reg, int)
+            self.token_col_rows_1_reg = tile(edu.token_col_rows_1_reg, int)
+            self.token_valid_1_reg = tile(edu.token_valid_1_reg, bool)
+            self.token_match_reg = tile(edu.token_match_reg, bool)
+            self.batch_attr += ["token_exist_rows_0_reg", "token_col_rows_0_reg", "token_valid_0_reg", 
+                                "token_exist_rows_1_reg", "token_exist_1_reg", "token_row_1_reg", "token_col_rows_1_reg", 
+                                "token_valid_1_reg", "token_match_reg"]
+        ## edu_cell_vector
+        self.cell_state = tile(educells.state, np.int8)
+        self.token_reg = tile(educells.token_reg, np.int8)
+        self.flag_token = tile(educells.flag_token, np.int8)
+        self.spike_taken = tile(educells.spike_taken, bool)
+        self.syndrome_taken = tile(educells.syndrome_taken, bool)
+        self.prev_aqmeas_reg = tile_plane(educells.prev_aqmeas_reg, np.int8)
+        self.esm_reg = tile_plane(educells.esm_reg, np.int8)
+        self.esm_delay_reg = [None] + [tile_plane(reg, np.int8) for reg in educells.esm_delay_reg[1:]]
+        self.bd_delay_reg = tile_plane(educells.bd_delay_reg, np.int8)
+        self.spikedir_reg = tile(educells.spikedir_reg, np.int8)
+        self.syndir_reg = tile(educells.syndir_reg, np.int8)
+        self.measerr_flag = tile(educells.measerr_flag, np.int8)
+        self.first_aqmeas = tile(educells.first_aqmeas, bool)
+        self.last_measerr_flag = tile(educells.last_measerr_flag, np.int8)
+        self.last_aqmeas_flip_reg = tile(educells.last_aqmeas_flip_reg, np.int8)
+        self.aqmeas_buf_valid = tile(educells.aqmeas_buf_valid, bool)
+        self.aqmeas_buf_val = [tile(val, np.int8) for val in educells.aqmeas_buf_val]
+        self.batch_attr += ["cell_state", "token_reg", "flag_token", "spike_taken", "syndrome_taken", "prev_aqmeas_reg", "esm_reg", 
+                            "esm_delay_reg", "bd_delay_reg", "spikedir_reg", "syndir_reg", "measerr_flag", "first_aqmeas", 
+                            "last_measerr_flag", "last_aqmeas_flip_reg", "aqmeas_buf_valid", "aqmeas_buf_val"]
+        ## stat counters (EDU_CYCLE_RESULT_KEY order) & rows recorded at layer_finish: (window_idx, counters)
+        self.cycle_count = tile([edu.num_propagation, edu.num_token_setup, edu.num_error_match, edu.num_layer_retry, 
+                                 edu.cyc_edu_running, edu.cyc_token_setup], int)
+        self.cycle_rows = []
+        self.batch_attr += ["cycle_count"]
+        # Input wires (from qxu)
+        self.input_aqmeas_valid = np.zeros(num_window, dtype=bool)
+        self.input_aqmeas_array = np.zeros((num_window,)+self.shape, dtype=np.int8)
+        self.batch_attr += ["input_aqmeas_valid", "input_aqmeas_array"]
+
+    def select(self, idx):
+        # keep the windows idx of the batch (e.g., drop the finished ones)
+        def select_val(val):
+            if val is None:
+                return None
+            if isinstance(val, list):
+                return [select_val(plane) for plane in val]
+            return val[idx]
+        for name in self.batch_attr:
+            setattr(self, name, select_val(getattr(self, name)))
+        return
+
+    def get_cycle_result(self, num_window):
+        # edu_cycle_result of every window (window_idx), in cycle order
+        cycle_result_list = [{key: [] for key in EDU_CYCLE_RESULT_KEY} for _ in range(num_window)]
+        for window_idx, cycle_count in self.cycle_rows:
+            for w, row in zip(window_idx.tolist(), cycle_count.tolist()):
+                for key, val in zip(EDU_CYCLE_RESULT_KEY, row):
+                    cycle_result_list[w][key].append(val)
+        return cycle_result_list
+
+
+    def transfer(self):
+        self.transfer_educell()
+        self.transfer_token_setup()
+        self.transfer_control()
+        self.transfer_esmval()
+        return
+
+    def transfer_educell(self):
+        # educell outputs (no active window: quiet educells output zeros anyway)
+        state = self.cell_state
+        esm_head = self.esm_reg[0]
+        self.esmhead = (esm_head != 0)
+        self.delay_head = [reg[0] for reg in self.esm_delay_reg[1:]]
+        self.delay_one = [head == 1 for head in self.delay_head]
+        source = (state == CELL_SOURCE)
+        boundary = (state == CELL_BOUNDARY)
+        source_or_boundary = source | boundary
+        ## local matches
+        self.local_tokenmatch = (self.role == ROLE_ACTIVE) & (self.token_reg == 1) & self.esmhead
+        self.local_errormatch = source_or_boundary & self.syndrome_taken
+        self.local_measmatch = (state == CELL_SYNK) & np.logical_or.reduce([np.zeros(state.shape, dtype=bool)]+self.delay_one)
+        ## spikegen -> spike port of the neighbors -> syndir (the last port with a spike)
+        spike_esm = esm_head
+        for head in self.delay_head:
+            spike_esm = spike_esm | head
+        spike_out = (source & (spike_esm != 0)) | (boundary & (self.bd_delay_reg[0] != 0)) | ((state == CELL_TRANSMIT) & self.spike_taken)
+        spike_in = get_neighbor_in(mux(spike_out, self.spikedir_reg, DIR_I))
+        self.spike_in_exist = np.logical_or.reduce(spike_in)
+        self.syndir = np.full(state.shape, DIR_I, dtype=np.int8)
+        for port in range(len(DIR_PORT)):
+            self.syndir = mux(spike_in[port], port, self.syndir)
+        ## syndromegen -> syndrome port of the neighbors
+        syndir_reg = self.syndir_reg
+        to_west = (syndir_reg == DIR_NW) | (syndir_reg == DIR_SW)
+        to_east = (syndir_reg == DIR_NE) | (syndir_reg == DIR_SE)
+        to_ns = (syndir_reg == DIR_N) | (syndir_reg == DIR_S) # don't care
+        syndrome_out = mux(to_west, self.syn_to_west, mux(to_east, self.syn_to_east, mux(to_ns, PAULI_Z, PAULI_I)))
+        syndrome_out = mux(self.syndrome_taken & self.spike_taken & ~source_or_boundary, syndrome_out, PAULI_I)
+        syndrome_dir = mux(syndrome_out != PAULI_I, syndir_reg, DIR_I)
+        self.syndrome_in_exist = np.logical_or.reduce(get_neighbor_in(syndrome_dir))
+
+        # global wires
+        if self.uarch == "fast":
+            self.global_tokenmatch = self.token_match_reg
+        else:
+            self.global_tokenmatch = (self.state == EDU_TOKEN_ALLOCATE) & self.local_tokenmatch.any(axis=(1, 2))
+        self.global_errormatch = self.local_errormatch.any(axis=(1, 2))
+        self.global_measmatch = self.local_measmatch.any(axis=(1, 2))
+        self.esmhead_exist = self.esmhead.any(axis=(1, 2))
+        ## next_error_array: syndromes into the data qubit from its NW, NE, SW and SE educells
+        def syndrome_port(port):
+            return mux(syndrome_dir == port, syndrome_out, PAULI_I)
+        self.next_error_array = self.error_array_reg ^ syndrome_port(DIR_NW)
+        self.next_error_array[:, 1:, 1:] ^= syndrome_port(DIR_SE)[:, :-1, :-1]
+        self.next_error_array[:, 1:, :] ^= syndrome_port(DIR_SW)[:, :-1, :]
+        self.next_error_array[:, :, 1:] ^= syndrome_port(DIR_NE)[:, :, :-1]
+        return
+
+    def transfer_token_setup(self):
+        num_window = len(self.state)
+        if "fast" in self.uarch: #PE
+            ## 0: first esmhead without flag in each row (smallest column, num_aqrow if none)
+            token_cand = (self.esmhead & (self.flag_token == 0)).reshape(num_window, -1)[:, self.diag_order]
+            cand_col = mux(token_cand, self.diag_col_sorted, self.config.num_aqrow)
+            token_col_rows = np.minimum.reduceat(cand_col, self.diag_start, axis=1)
+            self.token_exist_rows_0 = (token_col_rows < self.config.num_aqrow)
+            self.token_col_rows_0 = mux(self.token_exist_rows_0, token_col_rows, 0)
+            ## 1: first row with a token
+            self.token_exist_1 = self.token_exist_rows_0_reg.any(axis=1)
+            self.token_row_1 = np.where(self.token_exist_1, np.argmax(self.token_exist_rows_0_reg, axis=1), 0)
+            self.token_exist_rows_1 = (np.arange(self.num_diag) == self.token_row_1[:, None]) & self.token_exist_1[:, None]
+            self.token_col_rows_1 = self.token_col_rows_0_reg
+            ## 2 & out: token at the column of its row, flags up to it
+            token_exist = self.token_valid_1_reg[:, None, None] & self.token_exist_rows_1_reg[:, self.diag_row]
+            token_col = self.token_col_rows_1_reg[:, self.diag_row]
+            self.token_set_array = (token_exist & (self.diag_col == token_col)).astype(np.int8)
+            self.flag_set_array = (token_exist & (self.diag_col <= token_col)).astype(np.int8)
+            self.token_match = self.token_valid_1_reg & self.token_exist_1_reg
+            self.last_token = (self.token_valid_1_reg & ~self.token_exist_1_reg).astype(int)
+            self.next_rowidx = np.where(self.token_match, self.token_row_1_reg, 0)
+        else: # RR
+            output_token = self.token_reg
+            row_tokens_out = output_token[:, self.rr_out_idx[0], self.rr_out_idx[1]]
+            ### from the SW educell, or from the previous row for the first educells
+            self.token_set_array = np.zeros((num_window,)+self.shape, dtype=np.int8)
+            self.token_set_array[:, :-1, 1:] = output_token[:, 1:, :-1]
+            prev_row_token = np.concatenate([self.first_token[:, None].astype(np.int8), row_tokens_out[:, :-1]], axis=1)
+            self.token_set_array[:, self.rr_first_mask] = prev_row_token[:, self.diag_row[self.rr_first_mask]]
+            self.flag_set_array = self.token_set_array
+            self.last_token = output_token[:, -1, -1].astype(int)
+            row_token = (row_tokens_out == 1)
+            self.next_rowidx = np.where(row_token.any(axis=1), np.argmax(row_token, axis=1)+1, self.curr_rowidx_reg)
+        return
+
+    def transfer_control(self):
+        code_dist = self.config.code_dist
+        aqmeas_th = self.config.aqmeas_th
+        timeout_limit = self.config.timeout_limit
+        state = self.state
+        ready_or_waiting = (state == EDU_READY) | (state == EDU_WAITING)
+        token_allocate = (state == EDU_TOKEN_ALLOCATE)
+        error_pairing = (state == EDU_ERROR_PAIRING)
+        # token_finish, layer_retry (in and out of the last rounds alike), layer_finish
+        self.token_finish = token_allocate & ((self.first_token & ~self.esmhead_exist) | (self.last_token_reg == 1))
+        self.layer_retry = self.token_finish & self.esmhead_exist & (timeout_limit > self.timeout_th)
+        self.layer_finish = self.token_finish & ~self.layer_retry
+        # next_state
+        finish_state = np.where(self.round_counter < code_dist-aqmeas_th, EDU_WAITING, 
+                                np.where(self.round_counter == code_dist-1, EDU_READY, EDU_TOKEN_ALLOCATE))
+        pairing_done = (self.timeout_counter == self.timeout_th) | self.global_errormatch | self.global_measmatch
+        self.next_state = np.select([ready_or_waiting & (self.aqmeas_counter == aqmeas_th), ready_or_waiting, 
+                                     token_allocate & self.global_tokenmatch, token_allocate & self.layer_finish, token_allocate, 
+                                     error_pairing & pairing_done, error_pairing], 
+                                    [EDU_TOKEN_ALLOCATE, state, 
+                                     EDU_ERROR_PAIRING, finish_state, EDU_TOKEN_ALLOCATE, 
+                                     EDU_TOKEN_ALLOCATE, EDU_ERROR_PAIRING], state)
+        next_state = self.next_state
+        # control wires
+        self.rst_first_token = token_allocate
+        self.shift_token = token_allocate
+        self.wr_zeroesm = self.layer_finish & (next_state == EDU_TOKEN_ALLOCATE)
+        self.esm_finish = self.layer_finish & (next_state == EDU_READY)
+        self.up_timeout = error_pairing
+        self.rst_timeout = error_pairing & (next_state != EDU_ERROR_PAIRING)
+        self.rst_cellstate = error_pairing & (next_state == EDU_TOKEN_ALLOCATE)
+        self.next_valid = token_allocate & (next_state == EDU_READY)
+        last_rounds = (self.round_counter >= code_dist-(aqmeas_th-1)) & (self.round_counter < code_dist)
+        self.set_measerr_flag = self.token_finish & self.esmhead_exist & last_rounds & (timeout_limit <= self.timeout_th)
+        self.set_last_measerr_flag = self.set_measerr_flag & (self.round_counter == code_dist-1)
+        self.pop_aqmeasbuf = ready_or_waiting
+        self.apply_aqmeas_flip = (next_state == EDU_READY)
+        self.rst_token_pipe = token_allocate & (self.global_tokenmatch | self.token_finish)
+        return
+
+    def transfer_esmval(self):
+        self.aqmeasbuf_valid = self.aqmeas_buf_valid[:, 0]
+        self.aqmeasbuf_val = self.aqmeas_buf_val[0]
+        esm_val = self.aqmeasbuf_val ^ self.prev_aqmeas_reg[0] ^ self.measerr_flag
+        esm_on = (~self.first_aqmeas) & (self.role == ROLE_ACTIVE) & (self.aqmeasbuf_valid & ~self.wr_zeroesm)[:, None, None]
+        self.esm_val = mux(esm_on, esm_val, 0)
+        return
+
+
+    def update(self):
+        self.update_stats()
+        # educells first: they read the EDU registers of the cycle (e.g., curr_rowidx_reg)
+        self.update_educell()
+        self.update_registers()
+        return
+
+    def update_stats(self):
+        state = self.state
+        match = self.global_errormatch | self.global_measmatch
+        cycle_count = self.cycle_count
+        cycle_count[:, 0] += (state == EDU_ERROR_PAIRING) & ~match
+        cycle_count[:, 1] += (state == EDU_TOKEN_ALLOCATE) & (self.next_state == EDU_ERROR_PAIRING)
+        cycle_count[:, 2] += match
+        cycle_count[:, 3] += self.layer_retry
+        cycle_count[:, 4] += (state != EDU_READY) & (state != EDU_WAITING)
+        cycle_count[:, 5] += (state == EDU_TOKEN_ALLOCATE)
+        ## record & reset
+        if self.layer_finish.any():
+            record = self.layer_finish & self.live
+            if record.any():
+                self.cycle_rows.append((self.window_idx[record], cycle_count[record]))
+            cycle_count[self.layer_finish] = 0
+        return
+
+    def update_educell(self):
+        def expand(wire):
+            return wire[:, None, None]
+        def update_rows(reg, idx, val):
+            # reg with the windows idx set to val (reg is not written: it may be shared with a wire)
+            reg = reg.copy()
+            reg[idx] = val
+            return reg
+        state = self.cell_state
+        esm_reg = self.esm_reg
+        rst_cellstate = expand(self.rst_cellstate)
+        token_finish = expand(self.token_finish)
+        shift_token = expand(self.shift_token)
+        pop_aqmeasbuf = self.pop_aqmeasbuf & self.aqmeasbuf_valid
+        # decoder: next_state and spike_dir, latched on global_tokenmatch or rst_cellstate (only those windows)
+        idx = np.flatnonzero(self.global_tokenmatch | self.rst_cellstate)
+        if len(idx):
+            esm_exist = np.logical_or.reduce([plane[idx] != 0 for plane in esm_reg])
+            active_state = mux(self.local_tokenmatch[idx], CELL_SYNK, mux(esm_exist, CELL_SOURCE, CELL_TRANSMIT))
+            decoder_state = mux(self.role == ROLE_ACTIVE, active_state, 
+                                mux(self.role == ROLE_BOUNDARY, CELL_BOUNDARY, CELL_INACTIVE))
+            curr_rowidx = expand(self.curr_rowidx_reg[idx])
+            expected_dir = mux(self.myrowidx_array < curr_rowidx, DIR_SE, 
+                               mux(self.myrowidx_array > curr_rowidx, DIR_NW, 
+                                   mux(self.flag_token[idx] == 1, DIR_NE, DIR_SW)))
+            ns_dir = mux((expected_dir == DIR_NW) | (expected_dir == DIR_NE), DIR_N, DIR_S)
+            expected_ok = self.possible_dir[self.grid_row, self.grid_col, expected_dir]
+            ns_ok = self.possible_dir[self.grid_row, self.grid_col, ns_dir]
+            spike_dir = mux(expected_ok, expected_dir, mux(ns_ok, ns_dir, DIR_I))
+            rst = rst_cellstate[idx]
+            self.cell_state = update_rows(state, idx, mux(rst, CELL_READY, decoder_state))
+            self.spikedir_reg = update_rows(self.spikedir_reg, idx, mux(rst, DIR_I, spike_dir))
+        # token_reg & flag_token
+        token_clear = (self.role != ROLE_ACTIVE) & (self.token_reg != 0) & self.esmhead
+        self.token_reg = mux(token_finish, 0, mux(shift_token, self.token_set_array, self.token_reg))
+        flag_token = mux(self.flag_token == 0, self.flag_set_array, self.flag_token)
+        self.flag_token = mux(token_finish, 0, mux(shift_token, flag_token, self.flag_token))
+        # spike_taken & syndrome_taken
+        spike_taken = self.spike_taken
+        self.spike_taken = ~rst_cellstate & ((state == CELL_SOURCE) | spike_taken | self.spike_in_exist)
+        self.syndrome_taken = ~rst_cellstate & ((state == CELL_SYNK) | self.syndrome_taken | self.syndrome_in_exist)
+        # aq measurement registers: only the windows writing, popping, flipping or flagging them
+        idx = np.flatnonzero(self.input_aqmeas_valid | self.pop_aqmeasbuf | self.apply_aqmeas_flip 
+                             | self.set_measerr_flag | self.set_first_aqmeas)
+        if len(idx):
+            pop = expand(pop_aqmeasbuf[idx])
+            first_aqmeas = self.first_aqmeas[idx]
+            ## prev_aqmeas_reg
+            prev_aqmeas_reg = [plane[idx] for plane in self.prev_aqmeas_reg]
+            prev_aqmeas_0 = mux(pop, mux(first_aqmeas, 0, prev_aqmeas_reg[1]), prev_aqmeas_reg[0])
+            prev_aqmeas_0 ^= (expand(self.apply_aqmeas_flip[idx]) & (self.last_aqmeas_flip_reg[idx] == 1)).astype(np.int8)
+            prev_aqmeas_1 = mux(pop, self.aqmeasbuf_val[idx], prev_aqmeas_reg[1])
+            self.prev_aqmeas_reg = [update_rows(self.prev_aqmeas_reg[0], idx, prev_aqmeas_0), 
+                                    update_rows(self.prev_aqmeas_reg[1], idx, prev_aqmeas_1)]
+            ## aqmeas_buf: tail -> head, new -> tail
+            input_valid = self.input_aqmeas_valid[idx]
+            shift_buf = input_valid | self.pop_aqmeasbuf[idx]
+            buf_valid = self.aqmeas_buf_valid[idx]
+            buf_val = [plane[idx] for plane in self.aqmeas_buf_val]
+            new_val = mux(expand(input_valid), self.input_aqmeas_array[idx], 0)
+            self.aqmeas_buf_valid = update_rows(self.aqmeas_buf_valid, idx, 
+                                                np.where(shift_buf[:, None], np.stack([buf_valid[:, 1], input_valid], axis=1), buf_valid))
+            self.aqmeas_buf_val = [update_rows(self.aqmeas_buf_val[0], idx, mux(expand(shift_buf), buf_val[1], buf_val[0])), 
+                                   update_rows(self.aqmeas_buf_val[1], idx, mux(expand(shift_buf), new_val, buf_val[1]))]
+            ## last_aqmeas_flip_reg: no dq measurement in the window
+            self.last_aqmeas_flip_reg = update_rows(self.last_aqmeas_flip_reg, idx, 
+                                                    mux(expand(self.apply_aqmeas_flip[idx]), 0, self.last_aqmeas_flip_reg[idx]))
+            ## measerr_flag & last_measerr_flag
+            measerr = (esm_reg[0][idx] == 1)
+            set_measerr_flag = expand(self.set_measerr_flag[idx])
+            set_last_measerr_flag = expand(self.set_last_measerr_flag[idx])
+            self.measerr_flag = update_rows(self.measerr_flag, idx, 
+                                            mux(set_measerr_flag & measerr, 1, 
+                                                mux(pop & ~set_measerr_flag, 0, self.measerr_flag[idx])))
+            self.last_measerr_flag = update_rows(self.last_measerr_flag, idx, 
+                                                 mux(set_last_measerr_flag & measerr, 1, 
+                                                     mux(pop & ~set_last_measerr_flag, 0, self.last_measerr_flag[idx])))
+            ## first_aqmeas
+            set_first_aqmeas = expand(self.set_first_aqmeas[idx])
+            self.first_aqmeas = update_rows(self.first_aqmeas, idx, 
+                                            ~pop & (first_aqmeas | (set_first_aqmeas & self.first_aqmeas_flag)))
+        # esm_reg
+        global_errormatch = expand(self.global_errormatch)
+        global_measmatch = expand(self.global_measmatch & ~self.global_errormatch)
+        synk = (~token_clear) & (state == CELL_SYNK)
+        esm_clear = [token_clear | (synk & (global_errormatch | global_measmatch))] + [None]*(len(esm_reg)-1)
+        ## the first nonzero esm of the matched source
+        if self.global_errormatch.any():
+            match = global_errormatch & (~token_clear) & (state == CELL_SOURCE) & self.local_errormatch
+            for k, plane in enumerate(esm_reg):
+                clear = match & (plane == 1)
+                esm_clear[k] = clear if esm_clear[k] is None else (esm_clear[k] | clear)
+                match = match & ~clear
+        ## the first delayed esm at the head of its delay reg
+        if global_measmatch.any():
+            match = global_measmatch & synk
+            for k, delay_one in enumerate(self.delay_one):
+                clear = match & delay_one
+                esm_clear[k+1] = clear if esm_clear[k+1] is None else (esm_clear[k+1] | clear)
+                match = match & ~clear
+        self.esm_reg = [plane if clear is None or not clear.any() else mux(clear, 0, plane) 
+                        for plane, clear in zip(esm_reg, esm_clear)]
+        ## shift (instead of the clears): only the windows popping aqmeas_buf or writing a zero esm
+        idx = np.flatnonzero(pop_aqmeasbuf | self.wr_zeroesm)
+        if len(idx):
+            self.esm_reg = [update_rows(plane, idx, shift_plane[idx]) for plane, shift_plane in zip(self.esm_reg, esm_reg[1:]+[self.esm_val])]
+        # esm_delay_reg: shifts in the new esm_reg
+        shift = (state == CELL_SOURCE) | (state == CELL_SYNK)
+        for i in range(1, self.config.aqmeas_th):
+            reg = self.esm_delay_reg[i]
+            self.esm_delay_reg[i] = [mux(rst_cellstate, 0, mux(shift, shift_plane, plane)) 
+                                     for plane, shift_plane in zip(reg, reg[1:]+[self.esm_reg[i]])]
+        # bd_delay_reg
+        shift = (state == CELL_BOUNDARY)
+        self.bd_delay_reg = [mux(rst_cellstate, 0, mux(shift, shift_plane, plane)) 
+                             for plane, shift_plane in zip(self.bd_delay_reg, self.bd_delay_reg[1:]+[1])]
+        # syndir_reg
+        syndir_reg = mux((~spike_taken) & self.spike_in_exist, self.syndir, self.syndir_reg)
+        self.syndir_reg = mux(rst_cellstate, DIR_I, syndir_reg)
+        return
+
+    def update_registers(self):
+        code_dist = self.config.code_dist
+        # pipelining
+        if "fast" in self.uarch:
+            rst = self.rst_token_pipe
+            shift = self.shift_token & ~rst
+            def shift_reg(reg, val, rst_val):
+                rst_sel = rst.reshape(rst.shape+(1,)*(reg.ndim-1))
+                shift_sel = shift.reshape(shift.shape+(1,)*(reg.ndim-1))
+                return np.where(rst_sel, rst_val, np.where(shift_sel, val, reg))
+            ## out
+            self.token_match_reg = shift_reg(self.token_match_reg, self.token_match, False)
+            ## 1
+            self.token_exist_rows_1_reg = shift_reg(self.token_exist_rows_1_reg, self.token_exist_rows_1, False)
+            self.token_exist_1_reg = shift_reg(self.token_exist_1_reg, self.token_exist_1, False)
+            self.token_row_1_reg = shift_reg(self.token_row_1_reg, self.token_row_1, 0)
+            self.token_col_rows_1_reg = shift_reg(self.token_col_rows_1_reg, self.token_col_rows_1, 0)
+            self.token_valid_1_reg = shift_reg(self.token_valid_1_reg, self.token_valid_0_reg, False)
+            ## 0
+            self.token_exist_rows_0_reg = shift_reg(self.token_exist_rows_0_reg, self.token_exist_rows_0, False)
+            self.token_col_rows_0_reg = shift_reg(self.token_col_rows_0_reg, self.token_col_rows_0, 0)
+            self.token_valid_0_reg = shift_reg(self.token_valid_0_reg, True, False)
+        # state
+        self.state = self.next_state
+        # set_first_aqmeas
+        last_layer = self.layer_finish & (self.round_counter == code_dist-1)
+        self.set_first_aqmeas = np.where(self.input_aqmeas_valid, False, self.set_first_aqmeas | last_layer)
+        # first_token
+        self.first_token = np.where(self.token_finish, True, self.first_token & ~self.rst_first_token)
+        # timeout_th & timeout_counter
+        self.timeout_th = np.where(self.layer_finish, 2, np.where(self.layer_retry, self.timeout_th+2, self.timeout_th))
+        self.timeout_counter = np.where(self.rst_timeout, 0, np.where(self.up_timeout, self.timeout_counter+1, self.timeout_counter))
+        # aqmeas_counter
+        self.aqmeas_counter = np.where(self.aqmeasbuf_valid & self.pop_aqmeasbuf, self.aqmeas_counter+1, 
+                                       np.where(self.layer_finish, self.aqmeas_counter-1, self.aqmeas_counter))
+        # round_counter
+        self.round_counter = np.where(self.esm_finish, 0, np.where(self.layer_finish, self.round_counter+1, self.round_counter))
+        # curr_rowidx_reg & last_token_reg
+        self.curr_rowidx_reg = np.where(self.token_finish, 0, np.where(self.shift_token, self.next_rowidx, self.curr_rowidx_reg))
+        self.last_token_reg = np.where(self.token_finish, 0, np.where(self.shift_token, self.last_token, self.last_token_reg))
+        # error_array_reg
+        error_array_reg = mux(self.output_valid[:, None, None], PAULI_I, self.error_array_reg)
+        self.error_array_reg = mux(self.global_errormatch[:, None, None], self.next_error_array, error_array_reg)
+        # output_valid
+        self.output_valid = self.next_valid
+        return
@@ -108,11 +108,11 @@ class logical_measurement_unit:
         self.pf_ready = False
         self.dqmeas_array_reg = np.zeros((self.config.num_pchrow, self.config.num_pchcol, self.config.num_ucrow, self.config.num_uccol, int(self.config.num_qb_per_uc/2)), dtype=int)
         self.aqmeas_array_reg = np.zeros((self.config.num_pchrow, self.config.num_pchcol, self.config.num_ucrow, self.config.num_uccol, int(self.config.num_qb_per_uc/2)), dtype=int)
-        self.pf_array_reg = np.full((self.config.num_pchrow, self.config.num_pchcol, self.config.num_ucrow, self.config.num_uccol, int(self.config.num_qb_per_uc/2)), 'i',dtype='U8')
+        self.pf_array_reg = np.full((self.config.num_pchrow, self.config.num_pchcol, self.config.num_ucrow, self.config.num_uccol, int(self.config.num_qb_per_uc/2)), PAULI_I, dtype=np.uint8)
         ## Internal registers
         self.dqmeas_array_ing = np.zeros((self.config.num_pchrow, self.config.num_pchcol, self.config.num_ucrow, self.config.num_uccol, int(self.config.num_qb_per_uc/2)), dtype=int)
         self.aqmeas_array_ing = np.zeros((self.config.num_pchrow, self.config.num_pchcol, self.config.num_ucrow, self.config.num_uccol, int(self.config.num_qb_per_uc/2)), dtype=int)
-        self.pf_array_ing = np.full((self.config.num_pchrow, self.config.num_pchcol, self.config.num_ucrow, self.config.num_uccol, int(self.config.num_qb_per_uc/2)), 'i',dtype='U8')
+        self.pf_array_ing = np.full((self.config.num_pchrow, self.config.num_pchcol, self.config.num_ucrow, self.config.num_uccol, int(self.config.num_qb_per_uc/2)), PAULI_I, dtype=np.uint8)
         #
         self.sel_initmeas_wr = 0
         self.sel_initmeas_rd = 0
@@ -230,8 +230,8 @@ class logical_measurement_unit:
                         self.lqsign_valid_idx = 0
 
                     # lqsign_temp_list
-                    dqmeas_array_pch = copy.deepcopy(self.dqmeas_array_ing[pchrow][pchcol])
-                    pf_array_pch = copy.deepcopy(self.pf_array_ing[pchrow][pchcol])
+                    dqmeas_array_pch = self.dqmeas_array_ing[pchrow][pchcol]
+                    pf_array_pch = self.pf_array_ing[pchrow][pchcol]
 
                     self.lqsignZ_temp_list = [0]*self.config.num_lq
                     self.lqsignX_temp_list = [0]*self.config.num_lq
@@ -247,13 +247,13 @@ class logical_measurement_unit:
                                 if ucrow == 0:
                                     if qbidx == 2:
                                         dqmeas_product ^= dqmeas
-                                        pf_product ^= int(pf=='z' or pf=='y')
+                                        pf_product ^= int(pf==PAULI_Z or pf==PAULI_Y)
                                     else:
                                         pass
                                 else:
                                     if qbidx in [0, 2]:
                                         dqmeas_product ^= dqmeas
-                                        pf_product ^= int(pf=='z' or pf=='y')
+                                        pf_product ^= int(pf==PAULI_Z or pf==PAULI_Y)
                                     else:
                                         pass
                             else:
@@ -269,7 +269,7 @@ class logical_measurement_unit:
                         qbidx = 1
                         dqmeas = dqmeas_array_pch[ucrow][uccol][qbidx]
                         pf = pf_array_pch[ucrow][uccol][qbidx]
-                        sign_product = dqmeas ^ int(pf=='z' or pf=='y')
+                        sign_product = dqmeas ^ int(pf==PAULI_Z or pf==PAULI_Y)
                         self.lqsignX_temp_list[lqidx] = sign_product
 
                     elif pchtype == 'x':
@@ -279,7 +279,7 @@ class logical_measurement_unit:
                         qbidx = 2
                         dqmeas = dqmeas_array_pch[ucrow][uccol][qbidx]
                         pf = pf_array_pch[ucrow][uccol][qbidx]
-                        sign_product = dqmeas ^ int(pf=='z' or pf=='y')
+                        sign_product = dqmeas ^ int(pf==PAULI_Z or pf==PAULI_Y)
                         self.lqsignX_temp_list[lqidx] = sign_product
                     elif 'a' in pchtype:
                         # ancilla patches can affect several logical qubits in three different ways
@@ -303,7 +303,7 @@ class logical_measurement_unit:
                             and (uccol == 0) \
                             and (qbidx == 2):
                                 dqmeas_product_point ^= dqmeas
-                                pf_product_point ^= int(pf=='z' or pf=='y')
+                                pf_product_point ^= int(pf==PAULI_Z or pf==PAULI_Y)
                             else:
                                 pass
                             
@@ -312,13 +312,13 @@ class logical_measurement_unit:
                                 if ucrow == self.config.num_ucrow-1:
                                     if qbidx in [1, 2, 3]:
                                         dqmeas_product_vert ^= dqmeas
-                                        pf_product_vert ^= int(pf=='z' or pf=='y')
+                                        pf_product_vert ^= int(pf==PAULI_Z or pf==PAULI_Y)
                                     else:
                                         pass
                                 else:
                                     if qbidx in [1, 3]:
                                         dqmeas_product_vert ^= dqmeas
-                                        pf_product_vert ^= int(pf=='z' or pf=='y')
+                                        pf_product_vert ^= int(pf==PAULI_Z or pf==PAULI_Y)
                                     else:
                                         pass
                             else:
@@ -328,7 +328,7 @@ class logical_measurement_unit:
                             if ucrow == self.config.num_ucrow-1:
                                 if qbidx in [2, 3]:
                                     dqmeas_product_horz ^= dqmeas
-                                    pf_product_horz ^= int(pf=='z' or pf=='y')
+                                    pf_product_horz ^= int(pf==PAULI_Z or pf==PAULI_Y)
                                 else:
                                     pass
                             else:
@@ -518,9 +518,9 @@ class logical_measurement_unit:
                                                   int(self.config.num_qb_per_uc)), '-', dtype='U1')
                 if self.sel_meas[i]['valid']:
                     pchrow, pchcol = divmod(self.pchinfo['data']['pchidx'], self.config.num_pchcol)
-                    dqmeas_array_pch = copy.deepcopy(self.dqmeas_array_ing[pchrow][pchcol]) 
-                    aqmeas_array_pch = copy.deepcopy(self.aqmeas_array_ing[pchrow][pchcol])
-                    pf_array_pch = copy.deepcopy(self.pf_array_ing[pchrow][pchcol])
+                    dqmeas_array_pch = self.dqmeas_array_ing[pchrow][pchcol]
+                    aqmeas_array_pch = self.aqmeas_array_ing[pchrow][pchcol]
+                    pf_array_pch = self.pf_array_ing[pchrow][pchcol]
                     ##
                     meas_product = 0
                     pf_product = 0
@@ -545,19 +545,19 @@ class logical_measurement_unit:
                                 if (uc_east and uc_north):
                                     if qbidx == 3:
                                         meas_product ^= dqmeas
-                                        pf_product ^= int(pf=='z' or pf=='y')
+                                        pf_product ^= int(pf==PAULI_Z or pf==PAULI_Y)
 
                                         debug_sel_meas_array[pchrow][pchcol][ucrow][uccol][qbidx] = dqmeas
                                 elif (uc_east):
                                     if qbidx in [1,3]:
                                         meas_product ^= dqmeas
-                                        pf_product ^= int(pf=='z' or pf=='y')
+                                        pf_product ^= int(pf==PAULI_Z or pf==PAULI_Y)
                                         debug_sel_meas_array[pchrow][pchcol][ucrow][uccol][qbidx] = dqmeas
                             elif (sel_loc == 'ne'): # zb & LQM_X
                                 if (uc_east and uc_north):
                                     if qbidx == 1:
                                         meas_product ^= dqmeas
-                                        pf_product ^= int(pf=='z' or pf=='y')
+                                        pf_product ^= int(pf==PAULI_Z or pf==PAULI_Y)
                                         debug_sel_meas_array[pchrow][pchcol][ucrow][uccol][qbidx] = dqmeas
                             elif (sel_loc == 's'): 
                                 # mb & LQM_X, x & LQM_X - sel_xz: x
@@ -566,17 +566,17 @@ class logical_measurement_unit:
                                     if qbidx == 3:
                                         meas_product ^= dqmeas
                                         if sel_xz == 'x':
-                                            pf_product ^= int(pf=='z' or pf=='y')
+                                            pf_product ^= int(pf==PAULI_Z or pf==PAULI_Y)
                                         else:
-                                            pf_product ^= int(pf=='x' or pf=='y')
+                                            pf_product ^= int(pf==PAULI_X or pf==PAULI_Y)
                                         debug_sel_meas_array[pchrow][pchcol][ucrow][uccol][qbidx] = dqmeas
                                 elif (uc_south):
                                     if qbidx in [2,3]:
                                         meas_product ^= dqmeas
                                         if sel_xz == 'x':
-                                            pf_product ^= int(pf=='z' or pf=='y')
+                                            pf_product ^= int(pf==PAULI_Z or pf==PAULI_Y)
                                         else:
-                                            pf_product ^= int(pf=='x' or pf=='y')
+                                            pf_product ^= int(pf==PAULI_X or pf==PAULI_Y)
                                         debug_sel_meas_array[pchrow][pchcol][ucrow][uccol][qbidx] = dqmeas
                             elif (sel_loc == 'w'): 
                                 # mt & LQM_Z, mb & LQM_Z, x & LQM_Z - sel_xz: z
@@ -585,17 +585,17 @@ class logical_measurement_unit:
                                     if qbidx == 3:
                                         meas_product ^= dqmeas
                                         if sel_xz == 'x':
-                                            pf_product ^= int(pf=='z' or pf=='y')
+                                            pf_product ^= int(pf==PAULI_Z or pf==PAULI_Y)
                                         else:
-                                            pf_product ^= int(pf=='x' or pf=='y')
+                                            pf_product ^= int(pf==PAULI_X or pf==PAULI_Y)
                                         debug_sel_meas_array[pchrow][pchcol][ucrow][uccol][qbidx] = dqmeas
                                 elif (uc_west):
                                     if qbidx in [1,3]:
                                         meas_product ^= dqmeas
                                         if sel_xz == 'x':
-                                            pf_product ^= int(pf=='z' or pf=='y')
+                                            pf_product ^= int(pf==PAULI_Z or pf==PAULI_Y)
                                         else:
-                                            pf_product ^= int(pf=='x' or pf=='y')
+                                            pf_product ^= int(pf==PAULI_X or pf==PAULI_Y)
                                         debug_sel_meas_array[pchrow][pchcol][ucrow][uccol][qbidx] = dqmeas
                             elif (sel_loc == 'ex-e'): # zb & LQM_Y/Z
                                 # dqmeas
@@ -611,16 +611,16 @@ class logical_measurement_unit:
                                 if (uc_east and uc_north):
                                     if qbidx == 1:
                                         if sel_xz == 'x': # LQM_Y
-                                            pf_product ^= int(pf=='x' or pf=='z')
+                                            pf_product ^= int(pf==PAULI_X or pf==PAULI_Z)
                                         else: # 'z' - LQM_Z
-                                            pf_product ^= int(pf=='x' or pf=='y')
+                                            pf_product ^= int(pf==PAULI_X or pf==PAULI_Y)
                                     elif qbidx == 3:
-                                        pf_product ^= int(pf=='x' or pf=='y')
+                                        pf_product ^= int(pf==PAULI_X or pf==PAULI_Y)
                                     else:
                                         pass
                                 elif (uc_east):
                                     if qbidx in [1,3]:
-                                        pf_product ^= int(pf=='x' or pf=='y')
+                                        pf_product ^= int(pf==PAULI_X or pf==PAULI_Y)
                                     else:
                                         pass
                                 else:
@@ -629,17 +629,17 @@ class logical_measurement_unit:
                                 if (uc_west and uc_north):
                                     if qbidx == 3:
                                         meas_product ^= dqmeas
-                                        pf_product ^= int(pf=='x' or pf=='y')
+                                        pf_product ^= int(pf==PAULI_X or pf==PAULI_Y)
                                         debug_sel_meas_array[pchrow][pchcol][ucrow][uccol][qbidx] = dqmeas
                                 elif (uc_west):
                                     if qbidx in [1,3]:
                                         meas_product ^= dqmeas
-                                        pf_product ^= int(pf=='x' or pf=='y')
+                                        pf_product ^= int(pf==PAULI_X or pf==PAULI_Y)
                                         debug_sel_meas_array[pchrow][pchcol][ucrow][uccol][qbidx] = dqmeas
                                 elif (uc_south):
                                     if qbidx in [2,3]:
                                         meas_product ^= dqmeas
-                                        pf_product ^= int(pf=='x' or pf=='y')
+                                        pf_product ^= int(pf==PAULI_X or pf==PAULI_Y)
                                         debug_sel_meas_array[pchrow][pchcol][ucrow][uccol][qbidx] = dqmeas
                             elif (sel_loc == 'i'): 
                                 # zt & LQM_Z
@@ -658,9 +658,9 @@ class logical_measurement_unit:
                                         pass
                                     # pf_product
                                     if (uc_east and uc_north) and qbidx == 3:
-                                        pf_product ^= int(pf == 'z' or pf == 'y')
+                                        pf_product ^= int(pf == PAULI_Z or pf == PAULI_Y)
                                     elif uc_east and qbidx in [1, 3]:
-                                        pf_product ^= int(pf == 'z' or pf == 'y')
+                                        pf_product ^= int(pf == PAULI_Z or pf == PAULI_Y)
                                     else:
                                         pass
                                 else: # mb [1]
@@ -675,11 +675,11 @@ class logical_measurement_unit:
                                         pass
                                     # pf_product
                                     if (uc_east and uc_north) and qbidx == 1:
-                                        pf_product ^= int(pf=='z' or pf=='x')
+                                        pf_product ^= int(pf==PAULI_Z or pf==PAULI_X)
                                     elif (uc_east and uc_north) and qbidx == 3:
-                                        pf_product ^= int(pf=='x' or pf=='y')
+                                        pf_product ^= int(pf==PAULI_X or pf==PAULI_Y)
                                     elif uc_east and qbidx in [1, 3]:
-                                        pf_product ^= int(pf=='x' or pf=='y')
+                                        pf_product ^= int(pf==PAULI_X or pf==PAULI_Y)
                                     else:
                                         pass
                                 else:
@@ -694,9 +694,9 @@ class logical_measurement_unit:
                                         pass
                                     # pf_product
                                     if (uc_west and uc_north) and qbidx == 3:
-                                        pf_product ^= int(pf == 'x' or pf == 'y')
+                                        pf_product ^= int(pf == PAULI_X or pf == PAULI_Y)
                                     elif uc_west and qbidx in [1, 3]:
-                                        pf_product ^= int(pf == 'x' or pf == 'y')
+                                        pf_product ^= int(pf == PAULI_X or pf == PAULI_Y)
                                     else:
                                         pass
                                 elif sel_xz == 'z' and not reverse: # x, mb
@@ -708,9 +708,9 @@ class logical_measurement_unit:
                                         pass
                                     # pf_product
                                     if (uc_west and uc_north) and qbidx == 3:
-                                        pf_product ^= int(pf == 'x' or pf == 'y')
+                                        pf_product ^= int(pf == PAULI_X or pf == PAULI_Y)
                                     elif uc_west and qbidx in [1, 3]:
-                                        pf_product ^= int(pf == 'x' or pf == 'y')
+                                        pf_product ^= int(pf == PAULI_X or pf == PAULI_Y)
                                     else:
                                         pass
                                 else: 
@@ -728,9 +728,9 @@ class logical_measurement_unit:
                                         pass
                                     # pf_product
                                     if (uc_west and uc_north) and qbidx == 3:
-                                        pf_product ^= int(pf == 'x' or pf == 'y')
+                                        pf_product ^= int(pf == PAULI_X or pf == PAULI_Y)
                                     elif uc_west and qbidx in [1, 3]:
-                                        pf_product ^= int(pf == 'x' or pf == 'y')
+                                        pf_product ^= int(pf == PAULI_X or pf == PAULI_Y)
                                     else:
                                         pass
                                 elif sel_xz == 'z' and not reverse: # mb
@@ -745,9 +745,9 @@ class logical_measurement_unit:
                                         pass
                                     # pf_product
                                     if (uc_west and uc_north) and qbidx == 3:
-                                        pf_product ^= int(pf == 'x' or pf == 'y')
+                                        pf_product ^= int(pf == PAULI_X or pf == PAULI_Y)
                                     elif uc_west and qbidx in [1, 3]:
-                                        pf_product ^= int(pf == 'x' or pf == 'y')
+                                        pf_product ^= int(pf == PAULI_X or pf == PAULI_Y)
                                     else:
                                         pass
                             elif sel_loc == 's_inv':
@@ -763,9 +763,9 @@ class logical_measurement_unit:
                                         pass
                                     # pf_product
                                     if (uc_west and uc_south) and qbidx == 3:
-                                        pf_product ^= int(pf=='x' or pf=='y')
+                                        pf_product ^= int(pf==PAULI_X or pf==PAULI_Y)
                                     elif uc_south and qbidx in [2, 3]:
-                                        pf_product ^= int(pf=='x' or pf=='y')
+                                        pf_product ^= int(pf==PAULI_X or pf==PAULI_Y)
                                     else:
                                         pass
                                 else:
@@ -780,9 +780,9 @@ class logical_measurement_unit:
                                         pass
                                     # pf_product
                                     if (uc_west and uc_south) and qbidx == 3:
-                                        pf_product ^= int(pf=='x' or pf=='y')
+                                        pf_product ^= int(pf==PAULI_X or pf==PAULI_Y)
                                     elif uc_south and qbidx in [2, 3]:
-                                        pf_product ^= int(pf=='x' or pf=='y')
+                                        pf_product ^= int(pf==PAULI_X or pf==PAULI_Y)
                                     else:
                                         pass
                                 else:
@@ -1180,10 +1180,11 @@ class logical_measurement_unit:
             self.sel_initmeas_rd ^= 1
 
         # array_ing
+        ## EDU/QXU/PFU emit a new array per output and no one writes them: kept by reference
         if self.new_array_ing: 
-            self.aqmeas_array_ing = copy.deepcopy(self.aqmeas_array_reg)
-            self.dqmeas_array_ing = copy.deepcopy(self.dqmeas_array_reg)
-            self.pf_array_ing = copy.deepcopy(self.pf_array_reg)
+            self.aqmeas_array_ing = self.aqmeas_array_reg
+            self.dqmeas_array_ing = self.dqmeas_array_reg
+            self.pf_array_ing = self.pf_array_reg
             self.aqmeas_ready = False
             self.dqmeas_ready = False
             self.pf_ready = False
@@ -1191,18 +1192,18 @@ class logical_measurement_unit:
         # input registers
         if self.input_aqmeas_valid:
             self.aqmeas_ready = True
-            self.aqmeas_array_reg = copy.deepcopy(self.input_aqmeas_array)
+            self.aqmeas_array_reg = self.input_aqmeas_array
         else:
             pass
         if self.input_dqmeas_valid and \
            self.measop in [self.config.LQM_X_opcode, self.config.LQM_Y_opcode, self.config.LQM_Z_opcode, self.config.MEAS_INTMD_opcode]:
             self.dqmeas_ready = True
-            self.dqmeas_array_reg = copy.deepcopy(self.input_dqmeas_array)
+            self.dqmeas_array_reg = self.input_dqmeas_array
         else:
             pass
         if self.input_pf_valid:
             self.pf_ready = True
-            self.pf_array_reg = copy.deepcopy(self.input_pf_array)
+            self.pf_array_reg = self.input_pf_array
         else:
             pass
 
@@ -1258,7 +1259,7 @@ class logical_measurement_unit:
                 print("lmu.aqmeas_patch_ing: ")
                 debug_patch(self.config, self.aqmeas_array_ing[pchrow][pchcol], 'aq')
             print("lmu.pf_patch_ing: ")
-            debug_patch(self.config, self.pf_array_ing[pchrow][pchcol])
+            debug_patch(self.config, self.pf_array_ing[pchrow][pchcol], arr_enc='pauli')
             print("lmu.dqmeas_patch_ing: ")
             debug_patch(self.config, self.dqmeas_array_ing[pchrow][pchcol])
         return
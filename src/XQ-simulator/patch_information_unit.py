@@ -72,8 +72,9 @@ class patch_information_unit:
         # Random access memory
         self.pchinfo_static_ram = [dict()] * self.config.num_pch
         self.init_pchinfo_static()
-        self.facebd_ram = [['i', 'i', 'i', 'i']] * self.config.num_pch
-        self.cornerbd_ram = [['i', 'i', 'i', 'i']] * self.config.num_pch
+        ## facebd/cornerbd entries are tuples: output_pchinfo shares them by reference
+        self.facebd_ram = [('i', 'i', 'i', 'i')] * self.config.num_pch
+        self.cornerbd_ram = [('i', 'i', 'i', 'i')] * self.config.num_pch
 
     def init_pchinfo_static(self):
         if self.config.block_type == "Distillation":
@@ -379,7 +380,9 @@ class patch_information_unit:
                     pchmreg = [mreg, 0]
                     break
 
-        self.output_pchinfo = copy.deepcopy(rd_pchstat)
+        # new record every transfer: pchstat (str fields) and facebd/cornerbd (tuples) are never written in place,
+        # so PSU/PFU/LMU/EDU keep it by reference
+        self.output_pchinfo = dict(rd_pchstat)
         self.output_pchinfo["facebd"] = rd_facebd
         self.output_pchinfo["cornerbd"] = rd_cornerbd
         self.output_pchinfo["pchidx"] = self.pchidx_reg
@@ -587,12 +590,12 @@ class patch_information_unit:
                         #awe/aw/ae/ac/i
                         facebd = ['i', 'i', 'i', 'i']
                         cornerbd = ['i', 'i', 'i', 'i']
-                    self.facebd_ram[pchidx] = facebd
-                    self.cornerbd_ram[pchidx] = cornerbd
+                    self.facebd_ram[pchidx] = tuple(facebd)
+                    self.cornerbd_ram[pchidx] = tuple(cornerbd)
             # write for MERGE
             elif self.is_writing_reg:
-                self.facebd_ram[self.pchidx_reg] = self.wr_facebd
-                self.cornerbd_ram[self.pchidx_reg] = self.wr_cornerbd
+                self.facebd_ram[self.pchidx_reg] = tuple(self.wr_facebd)
+                self.cornerbd_ram[self.pchidx_reg] = tuple(self.wr_cornerbd)
             else:
                 pass
         else:
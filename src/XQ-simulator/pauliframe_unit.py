@@ -13,6 +13,18 @@ import numpy as np
 import copy
 from math import *
 
+# Pauli frame update by a cwd: PF_CWD_TABLE[cwd][curr_pf] -> new_pf
+PF_CWD_TABLE = np.zeros((CWD_BASE_MASK+1, len(PAULI_CODE)), dtype=np.uint8)
+for curr_pf, (h_pf, sdag_h_pf) in {
+        PAULI_I: (PAULI_I, PAULI_I),
+        PAULI_X: (PAULI_Z, PAULI_Y),
+        PAULI_Z: (PAULI_X, PAULI_X),
+        PAULI_Y: (PAULI_Y, PAULI_Z)}.items():
+    PF_CWD_TABLE[CWD_CODE['']][curr_pf] = curr_pf # 'i'
+    PF_CWD_TABLE[CWD_CODE['h']][curr_pf] = h_pf
+    PF_CWD_TABLE[CWD_CODE['cx']][curr_pf] = PAULI_I
+    PF_CWD_TABLE[CWD_CODE['sdag_h']][curr_pf] = sdag_h_pf
+
 class pauliframe_unit:
     def __init__ (self, unit_stat, config):
         # 
@@ -69,7 +81,7 @@ class pauliframe_unit:
         ## Input register
         self.tcu_opcode_reg = "1"*self.config.opcode_bw
         # Per-cell register
-        self.pfarray_reg = np.full((self.config.num_pchrow, self.config.num_pchcol, self.config.num_ucrow, self.config.num_uccol, int(self.config.num_qb_per_uc/2)), 'i',dtype='U8')
+        self.pfarray_reg = np.full((self.config.num_pchrow, self.config.num_pchcol, self.config.num_ucrow, self.config.num_uccol, int(self.config.num_qb_per_uc/2)), PAULI_I, dtype=np.uint8)
         ## State
         self.state = "ready"
         ## 
@@ -330,135 +342,56 @@ class pauliframe_unit:
         else:
             pass # all zeros
 
-        # cwd 
+        # cwd ('i' is an empty cwd)
         if self.cwd_opcode in [
                 self.config.LQI_opcode, 
                 self.config.INIT_INTMD_opcode]:
-            cwd = 'cx'
+            cwd = CWD_CODE['cx']
         elif self.cwd_opcode in [
                 self.config.LQM_X_opcode,
                 self.config.MEAS_INTMD_opcode]: 
-            cwd = 'h'
+            cwd = CWD_CODE['h']
         elif self.cwd_opcode == self.config.LQM_Z_opcode:
-            cwd = 'i'
+            cwd = CWD_CODE['']
         elif self.cwd_opcode == self.config.LQM_Y_opcode:
-            cwd = 'sdag_h'
+            cwd = CWD_CODE['sdag_h']
         else:
-            cwd = 'i'
+            cwd = CWD_CODE['']
 
         # cwd_patch
-        self.cwd_patch = np.empty((self.config.num_ucrow, self.config.num_uccol, int(self.config.num_qb_per_uc/2)), dtype=object)
-        for (i, j, k), mask in np.ndenumerate(mask_patch):
-            if mask:
-                self.cwd_patch[i][j][k] = cwd
-            else:
-                self.cwd_patch[i][j][k] = 'i'
+        self.cwd_patch = np.where(mask_patch, cwd, CWD_CODE['']).astype(np.uint8)
 
         return
 
     def transfer_cwdarray(self): # demux
-        self.cwd_array = np.full((self.config.num_pchrow, self.config.num_pchcol, self.config.num_ucrow, self.config.num_uccol, int(self.config.num_qb_per_uc/2)), 'i', dtype='U8')
+        self.cwd_array = np.full((self.config.num_pchrow, self.config.num_pchcol, self.config.num_ucrow, self.config.num_uccol, int(self.config.num_qb_per_uc/2)), CWD_CODE[''], dtype=np.uint8)
 
         if self.pchinfo_valid: 
             # pchidx
             pchrow, pchcol = divmod(self.pchinfo['data']['pchidx'], self.config.num_pchcol)
             # set
-            for (i, j, k), cwd in np.ndenumerate(self.cwd_patch):
-                self.cwd_array[pchrow][pchcol][i][j][k] = cwd
+            self.cwd_array[pchrow][pchcol] = self.cwd_patch
         else:
             pass # all 'i'
         return
     
     def transfer_new_pfarray(self):
-        self.new_pfarray = np.full((self.config.num_pchrow, self.config.num_pchcol, self.config.num_ucrow, self.config.num_uccol, int(self.config.num_qb_per_uc/2)), 'i', dtype='U8')
-
-        for (i, j, k, l, m), curr_pf in np.ndenumerate(self.pfarray_reg):
-            # cwd & error
-            cwd = self.cwd_array[i][j][k][l][m]
+        # to_pf 
+        if (self.sel_cwd_err == 1):
+            # error: product of Paulis = XOR of the codes
             if self.input_error_valid:
-                error = self.input_error_array[i][j][k][l][m]
-            else:
-                error = 'i'
-            # to_pf 
-            if (self.sel_cwd_err == 1):
-                to_pf = error
+                self.new_pfarray = self.pfarray_reg ^ self.input_error_array
             else:
-                to_pf = cwd
-
-            # new_pf 
-            if to_pf == 'i':
-                new_pf = curr_pf
-            elif to_pf == 'x':
-                if curr_pf == 'i':
-                    new_pf = 'x'
-                elif curr_pf == 'x':
-                    new_pf = 'i'
-                elif curr_pf == 'z':
-                    new_pf = 'y'
-                elif curr_pf == 'y':
-                    new_pf = 'z'
-                else:
-                    new_pf = 'i'
-            elif to_pf == 'z':
-                if curr_pf == 'i':
-                    new_pf = 'z'
-                elif curr_pf == 'x':
-                    new_pf = 'y'
-                elif curr_pf == 'z':
-                    new_pf = 'i'
-                elif curr_pf == 'y':
-                    new_pf = 'x'
-                else:
-                    new_pf = 'i'
-            elif to_pf == 'y':
-                if curr_pf == 'i':
-                    new_pf = 'y'
-                elif curr_pf == 'x':
-                    new_pf = 'z'
-                elif curr_pf == 'z':
-                    new_pf = 'x'
-                elif curr_pf == 'y':
-                    new_pf = 'i'
-                else:
-                    new_pf = 'i'
-            elif to_pf == 'h':
-                if curr_pf == 'i':
-                    new_pf = 'i'
-                elif curr_pf == 'x':
-                    new_pf = 'z'
-                elif curr_pf == 'z':
-                    new_pf = 'x'
-                elif curr_pf == 'y':
-                    new_pf = 'y'
-                else:
-                    new_pf = 'i'
-            elif to_pf == 'cx':
-                new_pf = 'i'
-            elif to_pf == 'sdag_h':
-                if curr_pf == 'i':
-                    new_pf = 'i'
-                elif curr_pf == 'x':
-                    new_pf = 'y'
-                elif curr_pf == 'z':
-                    new_pf = 'x'
-                elif curr_pf == 'y':
-                    new_pf = 'z'
-                else:
-                    new_pf = 'i'
-            else:
-                print("Invalid to_pf in PFU: ", to_pf)
-                sys.exit()
-
-            # set
-            self.new_pfarray[i][j][k][l][m] = new_pf
+                self.new_pfarray = self.pfarray_reg.copy()
+        else:
+            # cwd
+            self.new_pfarray = PF_CWD_TABLE[self.cwd_array, self.pfarray_reg]
         return
     
 
     def transfer_output(self):
         # pfarray
-        self.output_pfarray = np.full((self.config.num_pchrow, self.config.num_pchcol, self.config.num_ucrow, self.config.num_uccol, int(self.config.num_qb_per_uc/2)), 'i', dtype='U8')
-        for (i, j, k, l, m), curr_pf in np.ndenumerate(self.pfarray_reg):
-            self.output_pfarray[i][j][k][l][m] = curr_pf
+        self.output_pfarray = self.pfarray_reg.copy()
         # valid
         self.output_valid = self.valid_reg
 
@@ -480,9 +413,7 @@ class pauliframe_unit:
 
         ## pfarray_reg
         if self.pf_wren:
-            for (i, j, k, l, m), _ in np.ndenumerate(self.pfarray_reg):
-                new_pf = self.new_pfarray[i][j][k][l][m]
-                self.pfarray_reg[i][j][k][l][m] = new_pf
+            self.pfarray_reg[...] = self.new_pfarray
         
         ## state 
         self.state = self.next_state
@@ -495,7 +426,7 @@ class pauliframe_unit:
         # Add variables to check in the debugging mode
         if self.output_valid:
             print("pfu_fin.output_pfarray:")
-            debug_array(self.config, self.output_pfarray)
+            debug_array(self.config, self.output_pfarray, arr_enc='pauli')
         return
 
     def save_internal_value (self):
@@ -66,7 +66,7 @@ class physical_schedule_unit:
         # Registers
         ## Output registers
         self.output_valid = False
-        self.output_cwdarray = np.full((self.config.num_pchrow, self.config.num_pchcol, self.config.num_ucrow, self.config.num_uccol, self.config.num_qb_per_uc), "", dtype='U8')
+        self.output_cwdarray = np.full((self.config.num_pchrow, self.config.num_pchcol, self.config.num_ucrow, self.config.num_uccol, self.config.num_qb_per_uc), CWD_CODE[''], dtype=np.uint8)
         self.output_timing = 0
         self.output_opcode = '1'*self.config.opcode_bw
 
@@ -87,9 +87,9 @@ class physical_schedule_unit:
             self.pchinfo_list_reg.append({'data': None, 'valid': False})
         self.qb_counter_reg = [i for i in range(self.config.num_qbctrl)]
         self.uc_counter_reg = [i for i in range(self.config.num_ucc)]
-        self.cwd_reg =  None
-        self.cwdsp_reg = None
-        self.cwdsp2_reg = None
+        self.cwd_reg = CWD_CODE['']
+        self.cwdsp_reg = CWD_CODE['']
+        self.cwdsp2_reg = CWD_CODE['']
         self.timing_reg = 0
         self.opcode_reg = '1'*self.config.opcode_bw
         self.valid_reg = False
@@ -105,16 +105,87 @@ class physical_schedule_unit:
         # pchinfo_srmem
         self.pchinfo_srmem = srmem.srmem_double("pchinfo_srmem_psu", self.config.num_pcu, ceil(self.config.num_pch/self.config.num_pcu))
 
-        # maskgen_array
-        self.maskgen_array = np.empty((self.config.num_pcu, self.config.num_ucc, self.config.num_qbctrl), dtype=object)
-        # targetgen_array 
-        # NOTE: target_generator is not a physical hardware but a conceptual one
-        self.targetgen_array = np.empty((self.config.num_pcu, self.config.num_ucc, self.config.num_qbctrl), dtype=object)
-        for (i, j, k), _ in np.ndenumerate(self.maskgen_array):
-            self.maskgen_array[i][j][k] = mask_generator(self.config)
-            self.targetgen_array[i][j][k] = target_generator(self.config)
+        # Simulation engine
+        self.engine = self.config.psu_engine
+        if self.engine == "vector":
+            # mask/target templates
+            self.init_template()
+        else:
+            # maskgen_array
+            self.maskgen_array = np.empty((self.config.num_pcu, self.config.num_ucc, self.config.num_qbctrl), dtype=object)
+            # targetgen_array 
+            # NOTE: target_generator is not a physical hardware but a conceptual one
+            self.targetgen_array = np.empty((self.config.num_pcu, self.config.num_ucc, self.config.num_qbctrl), dtype=object)
+            for (i, j, k), _ in np.ndenumerate(self.maskgen_array):
+                self.maskgen_array[i][j][k] = mask_generator(self.config)
+                self.targetgen_array[i][j][k] = target_generator(self.config)
         #
         self.init_stats()
+
+
+    def init_template(self):
+        # Intermediate wires of the vector engine
+        self.mask_gen = None
+        self.special_gen = None
+        self.special2_gen = None
+        self.target_gen = None
+        # ucloc per ucidx: (w, n, e, s, low, up, leftdiag, rightdiag)
+        self.ucloc_list = []
+        for ucidx in range(self.config.num_uc):
+            ucrow, uccol = divmod(ucidx, self.config.num_uccol)
+            is_west = (uccol == 0)
+            is_north = (ucrow == 0)
+            is_east = (uccol == (self.config.num_uccol-1))
+            is_south = (ucrow == (self.config.num_ucrow-1))
+            is_lowtri = ((ucrow+uccol) > self.config.num_ucrow)
+            is_uppertri = ((ucrow+uccol) < self.config.num_ucrow-1)
+            is_leftdiag = ((ucrow+uccol) == self.config.num_ucrow-1)
+            is_rightdiag = ((ucrow+uccol) == self.config.num_ucrow)
+            self.ucloc_list.append((is_west, is_north, is_east, is_south, is_lowtri, is_uppertri, is_leftdiag, is_rightdiag))
+        # Templates are filled on their first use by a single generator
+        ## mask_template: {(opcode, id, pchtype, facebd, cornerbd): (3, num_uc, num_qb_per_uc) of mask, special, special_2}
+        ## target_template: {(opcode, id): (num_qb_per_uc) of target}
+        self.mask_template = dict()
+        self.target_template = dict()
+        self.template_maskgen = mask_generator(self.config)
+        self.template_targetgen = target_generator(self.config)
+        return
+
+    def get_mask_template(self, opcode, pchtype, facebd, cornerbd):
+        key = (opcode, self.id_counter, pchtype, tuple(facebd), tuple(cornerbd))
+        if key not in self.mask_template:
+            template = np.zeros((3, self.config.num_uc, self.config.num_qb_per_uc), dtype=int)
+            maskgen = self.template_maskgen
+            maskgen.input_pchinfo_valid = True
+            maskgen.input_pchtype = pchtype
+            maskgen.input_facebd = facebd
+            maskgen.input_cornerbd = cornerbd
+            maskgen.input_opcode = opcode
+            maskgen.input_id = self.id_counter
+            for ucidx in range(self.config.num_uc):
+                maskgen.input_ucloc = self.ucloc_list[ucidx]
+                for qbidx in range(self.config.num_qb_per_uc):
+                    maskgen.input_qbidx = qbidx
+                    maskgen.transfer()
+                    template[0][ucidx][qbidx] = maskgen.output_mask
+                    template[1][ucidx][qbidx] = maskgen.output_special
+                    template[2][ucidx][qbidx] = maskgen.output_special_2
+            self.mask_template[key] = template
+        return self.mask_template[key]
+
+    def get_target_template(self):
+        key = (self.opcode_running, self.id_counter)
+        if key not in self.target_template:
+            template = np.full(self.config.num_qb_per_uc, np.nan)
+            targetgen = self.template_targetgen
+            targetgen.input_opcode = self.opcode_running
+            targetgen.input_id = self.id_counter
+            for qbidx in range(self.config.num_qb_per_uc):
+                targetgen.input_qbidx = qbidx
+                targetgen.transfer()
+                template[qbidx] = targetgen.output_target
+            self.target_template[key] = template
+        return self.target_template[key]
     
 
     def init_cwdNtime_srmem(self):
@@ -158,6 +229,11 @@ class physical_schedule_unit:
 
         self.cwdNtime_srmem["INVALID"] = []
         self.cwdNtime_srmem["INVALID"].append((0, None, None, None))
+
+        # cwds are stored in the uint8 encoding (None -> empty)
+        for key, cwdNtime_list in self.cwdNtime_srmem.items():
+            self.cwdNtime_srmem[key] = [(timing, encode_cwd(cwd), encode_cwd(cwdsp), encode_cwd(cwdsp_2)) \
+                    for (timing, cwd, cwdsp, cwdsp_2) in cwdNtime_list]
         return
 
 
@@ -170,8 +246,12 @@ class physical_schedule_unit:
         self.transfer_control()  
         self.transfer_opcode_buf()
         self.transfer_cwdNtime_srmem()
-        self.transfer_maskgen_array()
-        self.transfer_maskext_array()
+        if self.engine == "vector":
+            self.transfer_maskgen_vector()
+            self.transfer_maskext_vector()
+        else:
+            self.transfer_maskgen_array()
+            self.transfer_maskext_array()
         return
 
     def transfer_opcode_buf(self):
@@ -198,7 +278,7 @@ class physical_schedule_unit:
         # transfer
         self.pchinfo_srmem.transfer()
         # connect output
-        self.pchinfo_list = copy.deepcopy(self.pchinfo_srmem.output_data)
+        self.pchinfo_list = self.pchinfo_srmem.output_data
         self.pchinfo_full = self.pchinfo_srmem.output_wrfull
         self.pchinfo_valid = self.pchinfo_srmem.output_rdvalid
         self.pchinfo_nextready = self.pchinfo_srmem.output_nextready
@@ -379,6 +459,67 @@ class physical_schedule_unit:
                 pass
         return
 
+    def transfer_maskgen_vector(self):
+        # Same outputs as transfer_maskgen_array, gathered from the templates
+        shape = (self.config.num_pcu, self.config.num_ucc, self.config.num_qbctrl)
+        ## Out-of-range counters are never extracted; their generator outputs are left as zero
+        uc_idx = np.array(self.uc_counter)
+        qb_idx = np.array(self.qb_counter)
+        uc_valid = uc_idx < self.config.num_uc
+        qb_valid = qb_idx < self.config.num_qb_per_uc
+        uc_sel = np.where(uc_valid, uc_idx, 0)
+        qb_sel = np.where(qb_valid, qb_idx, 0)
+        in_range = np.logical_and.outer(uc_valid, qb_valid)
+
+        gen = np.zeros((3,) + shape, dtype=int)
+        for i in range(self.config.num_pcu):
+            if not self.pchinfo_list[i]['valid']:
+                continue
+            pchinfo = self.pchinfo_list[i]['data']
+            ## opcode
+            if self.opcode_running == self.config.LQM_X_opcode \
+            or self.opcode_running == self.config.LQM_Y_opcode \
+            or self.opcode_running == self.config.LQM_Z_opcode:
+                pchops = pchinfo['pchop']
+                opcode = format(int(pchops[0], 2) & int(pchops[1], 2), "b").zfill(self.config.opcode_bw)
+            else:
+                opcode = self.opcode_running
+            template = self.get_mask_template(opcode, pchinfo['pchtype'], pchinfo['facebd'], pchinfo['cornerbd'])
+            gen[:, i] = template[:, uc_sel][:, :, qb_sel] * in_range
+        self.mask_gen = gen[0]
+        self.special_gen = gen[1]
+        self.special2_gen = gen[2]
+
+        target = np.where(qb_valid, self.get_target_template()[qb_sel], np.nan)
+        self.target_gen = np.broadcast_to(target, shape).copy()
+        return
+
+    def transfer_maskext_vector(self):
+        # Same outputs as transfer_maskext_array, scattered per pcu
+        shape = (self.config.num_pchrow, self.config.num_pchcol, self.config.num_ucrow, self.config.num_uccol, self.config.num_qb_per_uc)
+        self.mask_array = np.zeros(shape, dtype=int)
+        self.special_array = np.zeros(shape, dtype=int)
+        self.special_2_array = np.zeros(shape, dtype=int)
+        self.target_array = np.full(shape, np.nan)
+
+        uc_idx = np.array(self.uc_counter_reg)
+        qb_idx = np.array(self.qb_counter_reg)
+        uc_valid = uc_idx < self.config.num_uc
+        qb_valid = qb_idx < self.config.num_qb_per_uc
+        ucrow, uccol = np.divmod(uc_idx[uc_valid], self.config.num_uccol)
+        qbidx = qb_idx[qb_valid]
+        sel = np.ix_(uc_valid, qb_valid)
+        for i in range(self.config.num_pcu):
+            if not self.pchinfo_list_reg[i]['valid']:
+                continue
+            pchrow, pchcol = divmod(self.pchinfo_list_reg[i]['data']['pchidx'], self.config.num_pchcol)
+            dst = (pchrow, pchcol, ucrow[:, None], uccol[:, None], qbidx[None, :])
+            self.mask_array[dst] = self.mask_gen_reg[i][sel]
+            self.special_array[dst] = self.special_gen_reg[i][sel]
+            self.special_2_array[dst] = self.special2_gen_reg[i][sel]
+            self.target_array[dst] = self.target_gen_reg[i][sel]
+        return
+
     def update(self, sim_cycle=0):
         self.update_stats(sim_cycle)
 
@@ -389,7 +530,10 @@ class physical_schedule_unit:
             return 
 
         self.update_cwdNtime_srmem()
-        self.update_output()
+        if self.engine == "vector":
+            self.update_output_vector()
+        else:
+            self.update_output()
         self.update_pipe()
         self.update_counters()
         self.state = self.next_state 
@@ -457,7 +601,7 @@ class physical_schedule_unit:
                 final_cwd = self.cwd_reg
 
             if not np.isnan(self.target_array[i][j][k][l][m]):
-                final_cwd += str(int(self.target_array[i][j][k][l][m]))
+                final_cwd |= (int(self.target_array[i][j][k][l][m]) + 1) << CWD_TARGET_SHIFT
             else:
                 pass
 
@@ -465,7 +609,7 @@ class physical_schedule_unit:
                 entry = final_cwd
             else:
                 if self.flush_output:
-                    entry = ''
+                    entry = CWD_CODE['']
                 else:
                     pass
             self.output_cwdarray[i][j][k][l][m] = entry
@@ -473,17 +617,43 @@ class physical_schedule_unit:
         return 
 
 
+    def update_output_vector(self):
+        # Same outputs as update_output, evaluated on the whole array
+        self.output_valid = self.valid_reg
+        self.output_timing = self.timing_reg
+        self.output_opcode = self.opcode_reg
+
+        # final cwd: special_2 > special > cwd, with the target in the upper bits
+        final_cwd = np.where(self.special_2_array == 1, self.cwdsp2_reg,
+                    np.where(self.special_array == 1, self.cwdsp_reg, self.cwd_reg)).astype(np.uint8)
+        has_target = ~np.isnan(self.target_array)
+        target_code = np.where(has_target, np.nan_to_num(self.target_array).astype(np.uint8) + 1, 0).astype(np.uint8)
+        final_cwd |= (target_code << CWD_TARGET_SHIFT)
+
+        if self.flush_output:
+            self.output_cwdarray = np.where(self.mask_array == 1, final_cwd, CWD_CODE['']).astype(np.uint8)
+        else:
+            self.output_cwdarray = np.where(self.mask_array == 1, final_cwd, self.output_cwdarray).astype(np.uint8)
+        return 
+
+
     def update_pipe(self):
         #
-        self.pchinfo_list_reg = copy.deepcopy(self.pchinfo_list)
-        #
-        for (i, j, k), maskgen in np.ndenumerate(self.maskgen_array): 
-            self.mask_gen_reg[i][j][k] = maskgen.output_mask
-            self.special_gen_reg[i][j][k] = maskgen.output_special
-            self.special2_gen_reg[i][j][k] = maskgen.output_special_2
+        self.pchinfo_list_reg = self.pchinfo_list
         #
-        for (i, j, k), targetgen in np.ndenumerate(self.targetgen_array): 
-            self.target_gen_reg[i][j][k] = targetgen.output_target
+        if self.engine == "vector":
+            self.mask_gen_reg = self.mask_gen
+            self.special_gen_reg = self.special_gen
+            self.special2_gen_reg = self.special2_gen
+            self.target_gen_reg = self.target_gen
+        else:
+            for (i, j, k), maskgen in np.ndenumerate(self.maskgen_array): 
+                self.mask_gen_reg[i][j][k] = maskgen.output_mask
+                self.special_gen_reg[i][j][k] = maskgen.output_special
+                self.special2_gen_reg[i][j][k] = maskgen.output_special_2
+            #
+            for (i, j, k), targetgen in np.ndenumerate(self.targetgen_array): 
+                self.target_gen_reg[i][j][k] = targetgen.output_target
 
         #
         if self.next_id:
@@ -507,7 +677,7 @@ class physical_schedule_unit:
             print("psu.output_timing: {}".format(self.output_timing))
             print("psu.output_opcode: {}".format(self.output_opcode))
             print("psu.output_cwdarray: ")
-            debug_array(self.config, self.output_cwdarray)
+            debug_array(self.config, self.output_cwdarray, arr_enc='cwd')
         return
 
     def init_stats(self):
@@ -537,12 +707,7 @@ class physical_schedule_unit:
             cycle = sim_cycle - self.unit_stat.data_transfer["TCU"]["last_cyc"]
             self.unit_stat.data_transfer["TCU"]["num_max"].append(self.config.num_pq_eff)
             #
-            num_scheduled_cwd = 0
-            for _, op in np.ndenumerate(self.output_cwdarray):
-                if len(op) != 0:
-                    num_scheduled_cwd += 1
-                else:
-                    pass
+            num_scheduled_cwd = int(np.count_nonzero(self.output_cwdarray))
             self.unit_stat.data_transfer["TCU"]["num_eff"].append(num_scheduled_cwd)
             #
             self.unit_stat.data_transfer["TCU"]["cycle"].append(cycle)
@@ -0,0 +1,127 @@
+import timeit
+
+'''
+# sim_profiler records the wall time & call count of the simulator hot path
+# 1) transfer()/update() of every unit
+# 2) stim/ray calls of QXU (qubit_plane_emulator & qc_compose_unit)
+# 3) simulated cycles per second over time
+# Methods are wrapped per instance only when profiling is enabled, so a disabled profiler costs nothing.
+'''
+
+# Unit methods to profile
+UNIT_METHOD_LIST = ["transfer", "update"]
+# QXU submodule methods to profile: (path from qtexec_unit, method)
+QXU_METHOD_LIST = [
+        ("emulator", "run"),
+        ("emulator", "commute_error_array"),
+        ("emulator", "extract_lq_probabilities"),
+        ("emulator.qc_compose_unit", "append_trace"),
+        ("emulator.qc_compose_unit", "apply_all_op"),
+        ("emulator.qc_compose_unit", "split_qc"),
+        ("emulator.qc_compose_unit", "peek_multi_logical_qubits")
+        ]
+# Default interval (cycles) of the cycle rate samples
+PROFILE_INTERVAL = 1000
+
+
+class sim_profiler:
+    def __init__(self, interval=None):
+        self.interval = interval if interval is not None else PROFILE_INTERVAL
+        # (unit name, method name) -> [num_call, wall time]
+        self.record = dict()
+        # (owner, method name, wrapper) for unwrap/wrap
+        self.wrapped_list = []
+        # cycle rate
+        self.start_time = None
+        self.start_cycle = None
+        self.next_sample_cycle = None
+        self.rate_list = []
+
+    # Instrumentation
+    def wrap_method(self, owner, method_name, unit_name, record_name):
+        method = getattr(owner, method_name)
+        entry = self.record.setdefault((unit_name, record_name), [0, 0.])
+        timer = timeit.default_timer
+
+        def profiled(*args, **kwargs):
+            start = timer()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                entry[0] += 1
+                entry[1] += timer() - start
+
+        setattr(owner, method_name, profiled)
+        self.wrapped_list.append((owner, method_name, profiled))
+        return
+
+    def wrap_unit(self, unit_name, unit):
+        for method_name in UNIT_METHOD_LIST:
+            # QXU has no transfer()
+            if hasattr(unit, method_name):
+                self.wrap_method(unit, method_name, unit_name, method_name)
+        if unit_name == "QXU":
+            for path, method_name in QXU_METHOD_LIST:
+                owner = unit
+                for attr in path.split("."):
+                    owner = getattr(owner, attr)
+                self.wrap_method(owner, method_name, unit_name, "{}.{}".format(path.split(".")[-1], method_name))
+        return
+
+    def unwrap(self):
+        # Restore the original methods (e.g., to pickle the units)
+        ## a method that was monkeypatched again after wrapping is left as is
+        for owner, method_name, profiled in self.wrapped_list:
+            if owner.__dict__.get(method_name) is profiled:
+                del owner.__dict__[method_name]
+        return
+
+    def rewrap(self):
+        for owner, method_name, profiled in self.wrapped_list:
+            if method_name not in owner.__dict__:
+                setattr(owner, method_name, profiled)
+        return
+
+    # Cycle rate
+    def start(self, cycle):
+        self.start_time = timeit.default_timer()
+        self.start_cycle = cycle
+        self.next_sample_cycle = cycle + self.interval
+        self.rate_list = [(0., cycle)]
+        return
+
+    def tick(self, cycle):
+        if cycle >= self.next_sample_cycle:
+            self.rate_list.append((timeit.default_timer() - self.start_time, cycle))
+            self.next_sample_cycle = cycle + self.interval
+        return
+
+    # Export
+    def get_unit_profile(self, unit_name):
+        unit_profile = dict()
+        for (name, record_name), (num_call, wall_time) in self.record.items():
+            if name == unit_name:
+                unit_profile[record_name] = {"calls": num_call, "seconds": round(wall_time, 6)}
+        return unit_profile
+
+    def get_profile(self, cycle):
+        elapsed = timeit.default_timer() - self.start_time if self.start_time is not None else 0.
+        num_cycle = cycle - self.start_cycle if self.start_cycle is not None else 0
+        cycle_rate = []
+        for (prev_time, prev_cycle), (curr_time, curr_cycle) in zip(self.rate_list, self.rate_list[1:] + [(elapsed, cycle)]):
+            if curr_time <= prev_time:
+                continue
+            cycle_rate.append({
+                "cycle": curr_cycle,
+                "elapsed_seconds": round(curr_time, 6),
+                "cycles_per_sec": round((curr_cycle - prev_cycle) / (curr_time - prev_time), 3)
+            })
+        unit_list = sorted({unit_name for unit_name, _ in self.record})
+        profile = {
+            "num_cycles": num_cycle,
+            "elapsed_seconds": round(elapsed, 6),
+            "cycles_per_sec": round(num_cycle / elapsed, 3) if elapsed > 0 else None,
+            "cycle_rate": cycle_rate,
+            "units": {unit_name: self.get_unit_profile(unit_name) for unit_name in unit_list}
+        }
+        return profile
@@ -0,0 +1,253 @@
+import os
+import weakref
+import importlib.util
+import multiprocessing as mp
+
+'''
+# qc_backend runs the stabilizer-rank worker tree (qc_supervisor -> qc_worker) of qc_compose_unit
+# 1) ray:     the supervisor and the workers are ray actors
+# 2) process: the supervisor runs in the simulator process; each worker is a persistent process
+# 3) inline:  the supervisor and the workers run in the simulator process
+# ray is optional: without it, the ray backend falls back to the process backend
+# Every backend follows the ray calling convention: handle.method.remote(*args) returns a future,
+# and backend.get(future or list of futures) returns the result(s)
+'''
+
+QC_BACKEND_LIST = ["ray", "process", "inline"]
+## Environment variable that overrides the configured backend
+QC_BACKEND_ENV = "XQSIM_QC_BACKEND"
+## The ray -> process fallback is reported once per process
+ray_fallback_logged = False
+
+
+def has_ray():
+    return importlib.util.find_spec("ray") is not None
+
+
+def get_backend_name(name=None):
+    global ray_fallback_logged
+    env_name = os.environ.get(QC_BACKEND_ENV)
+    if env_name:
+        name = env_name
+    if name is None:
+        name = "ray"
+    if name not in QC_BACKEND_LIST:
+        raise Exception("qc_backend - get_backend_name: Please first define {} backend".format(name))
+    if name == "ray" and not has_ray():
+        if not ray_fallback_logged:
+            print("qc_backend - get_backend_name: ray is not installed, falling back to the process backend", flush=True)
+            ray_fallback_logged = True
+        name = "process"
+    return name
+
+
+### Inline ###
+class inline_future:
+    __slots__ = ["value"]
+    def __init__(self, value):
+        self.value = value
+
+
+class inline_method:
+    def __init__(self, method):
+        self.method = method
+
+    def remote(self, *args, **kwargs):
+        return inline_future(self.method(*args, **kwargs))
+
+
+class inline_handle:
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return inline_method(getattr(self.obj, name))
+
+
+### Process ###
+def proc_actor_main(conn, cls, args):
+    # Serve method calls in order until the parent closes the pipe
+    obj = cls(*args)
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            break
+        if msg is None:
+            break
+        method_name, args, kwargs = msg
+        try:
+            res = (True, getattr(obj, method_name)(*args, **kwargs))
+        except Exception as e:
+            res = (False, "{}: {}".format(type(e).__name__, e))
+        conn.send(res)
+    conn.close()
+    return
+
+
+class proc_future:
+    __slots__ = ["handle", "done", "value", "__weakref__"]
+    def __init__(self, handle):
+        self.handle = handle
+        self.done = False
+        self.value = None
+
+
+class proc_method:
+    def __init__(self, handle, method_name):
+        self.handle = handle
+        self.method_name = method_name
+
+    def remote(self, *args, **kwargs):
+        return self.handle.call(self.method_name, args, kwargs)
+
+
+class proc_handle:
+    def __init__(self, cls, args):
+        # spawn: the simulator process may run other threads (e.g., the API server)
+        ctx = mp.get_context("spawn")
+        self.conn, child_conn = ctx.Pipe()
+        self.proc = ctx.Process(target=proc_actor_main, args=(child_conn, cls, args), daemon=True)
+        self.proc.start()
+        child_conn.close()
+        # Responses arrive in call order
+        self.num_call = 0
+        self.num_recv = 0
+        ## futures that may still be waited for; results of dropped futures are discarded
+        self.pending = weakref.WeakValueDictionary()
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return proc_method(self, name)
+
+    def call(self, method_name, args, kwargs):
+        # Drain finished calls so that fire-and-forget calls never fill the pipe
+        while self.conn.poll():
+            self.recv()
+        future = proc_future(self)
+        self.pending[self.num_call] = future
+        self.num_call += 1
+        self.conn.send((method_name, args, kwargs))
+        return future
+
+    def recv(self):
+        ok, value = self.conn.recv()
+        call_id = self.num_recv
+        self.num_recv += 1
+        if not ok:
+            raise Exception("qc_backend - proc_handle: {}".format(value))
+        future = self.pending.pop(call_id, None)
+        if future is not None:
+            future.value = value
+            future.done = True
+        return
+
+    def wait(self, future):
+        while not future.done:
+            self.recv()
+        return future.value
+
+    def __del__(self):
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+
+
+class qc_backend:
+    def __init__(self, name=None):
+        self.name = get_backend_name(name)
+        self.remote_cls = dict()
+
+    def spawn(self, cls, *args, remote=True):
+        # Create an actor; remote=False keeps it in this process for the process backend
+        if self.name == "ray":
+            import ray
+            if not ray.is_initialized():
+                ray.init()
+            if cls not in self.remote_cls:
+                self.remote_cls[cls] = ray.remote(cls)
+            return self.remote_cls[cls].remote(*args)
+        elif self.name == "process" and remote:
+            return proc_handle(cls, args)
+        else:
+            return inline_handle(cls(*args))
+
+    def get(self, future):
+        if isinstance(future, list):
+            return [self.get(f) for f in future]
+        if isinstance(future, inline_future):
+            return future.value
+        if isinstance(future, proc_future):
+            return future.handle.wait(future)
+        import ray
+        return ray.get(future)
+
+    # Checkpoint: only the backend name is kept; ray actor classes are created again on demand
+    def __getstate__(self):
+        return {"name": self.name}
+
+    def __setstate__(self, state):
+        self.name = state["name"]
+        self.remote_cls = dict()
+
+
+def is_qc_handle(obj):
+    # Handles are process-local; checkpoints save the actor state instead
+    if isinstance(obj, (inline_handle, proc_handle)):
+        return True
+    if type(obj).__name__ == "ActorHandle":
+        return True
+    return False
+
+
+### Benchmark ###
+# python qc_backend.py: ESM-like rounds (H, 4x CZ, H, measure every aq) on a 3x5-patch plane per backend
+## ray is skipped when it is not installed
+def run_benchmark(backend_name, code_dist, num_round):
+    import timeit
+    import qc_compose_unit
+    # the benchmarked backend wins over XQSIM_QC_BACKEND, also in the worker processes
+    env_name = os.environ.get(QC_BACKEND_ENV)
+    os.environ[QC_BACKEND_ENV] = backend_name
+    try:
+        start = timeit.default_timer()
+        qcu = qc_compose_unit.qc_compose_unit(code_dist, 3, 5, 0.001, False, backend_name)
+        # the first call waits for the actors to start
+        qcu.get_qc_state()
+        setup_time = timeit.default_timer() - start
+
+        num_row_aq, num_col_aq = qcu.aq_array.shape
+        aq_list = list(qcu.aq_array.flatten())
+        start = timeit.default_timer()
+        for _ in range(num_round):
+            for aq in aq_list:
+                qcu.append_op('h', aq)
+            for dr, dc in [(0, 0), (0, 1), (1, 0), (1, 1)]:
+                for row in range(num_row_aq):
+                    for col in range(num_col_aq):
+                        qcu.append_op('cz', qcu.aq_array[row][col], qcu.dq_array[row+dr][col+dc])
+            for aq in aq_list:
+                qcu.append_op('h', aq)
+            qcu.apply_all_op()
+            qcu.measure_many(aq_list)
+        round_time = (timeit.default_timer() - start) / num_round
+    finally:
+        if env_name is None:
+            del os.environ[QC_BACKEND_ENV]
+        else:
+            os.environ[QC_BACKEND_ENV] = env_name
+    return setup_time, round_time
+
+
+if __name__ == "__main__":
+    num_round = 5
+    for code_dist in [3, 5, 7]:
+        for backend_name in QC_BACKEND_LIST:
+            if backend_name == "ray" and not has_ray():
+                continue
+            setup_time, round_time = run_benchmark(backend_name, code_dist, num_round)
+            print("d={} {:8s}: setup {:.3f} sec, {:.4f} sec/round".format(code_dist, backend_name, setup_time, round_time), flush=True)
@@ -1,11 +1,18 @@
 import numpy as np
 import stim
-import ray
 import sys
+#
+from qc_backend import qc_backend
 
 SUPPORTED_OP_TYPES = {'h','cz','h_t','meas','x','i','h_s','sdag_h','cnot', 'cx', 'z', 'y', 'h_sdag_h'} # all cx was replaced to 'i' or 'x' at previous stage
 SUPPORTED_QB_TYPES = {'dq','aq'}
 SPLIT_PER_M = 5 # 3, 5
+## Adaptive shots of logical-state peeks: shots per block, failure probability of the per-outcome Bernstein bound (95%)
+SHOT_BLOCK = 128
+SHOT_CONF_DELTA = 0.05
+## Injected error gates
+ERROR_SQ_GATE = np.array(['x','y','z','i'])
+ERROR_DQ_GATE = np.array(['xx','xy','xz','xi','yx','yy','yz','yi','zx','zy','zz','zi','ix','iy','iz','ii'])
 
 UCL_SIZE = 2
 
@@ -100,15 +107,38 @@ def merge_prob(val_list, coeff):
 
     return result
 
-def merge_prob_multi(val_list, coeff, num_lq):
+def merge_prob_weight(val_list, weight):
+    # Branches of a qc_worker carry their accumulated coefficient (weight) explicitly
+    return float(np.dot(weight, val_list))
+
+def merge_prob_multi(val_list, coeff, num_lq, merge=merge_prob):
     prob_key = {format(k, '0'+str(num_lq)+'b') for k in range(2 ** num_lq)}
     merged_prob = {}
     for state in prob_key:
         cur_list = [val.get(state, 0) for val in val_list]
-        merged_prob[state] = merge_prob(cur_list, coeff)
+        merged_prob[state] = merge(cur_list, coeff)
 
     return merged_prob
 
+def bernstein_dev (weight, count, num_shots, delta):
+    # Empirical Bernstein half-width of each merged outcome probability, normalised by sum |weight|
+    ## per shot, outcome k adds X_k = sum_b weight[b] * [branch b gives k]; branches are sampled independently,
+    ## so Var(X_k) = sum_b weight[b]^2 p_bk (1 - p_bk) and X_k spans at most sum |weight|
+    ## the normalised bound does not grow with the number of branches (unlike sum_b |weight[b]| x per-branch interval)
+    scale = np.abs(weight).sum()
+    if num_shots < 2 or scale == 0:
+        return np.ones(count.shape[1])
+    prob = count / num_shots
+    var = (np.square(weight) @ (prob * (1 - prob))) * num_shots / (num_shots - 1) / scale**2
+    log_term = np.log(2 / delta)
+    return np.sqrt(2 * var * log_term / num_shots) + 7 * log_term / (3 * (num_shots - 1))
+
+def derive_seed (seed, num_seed):
+    # Independent child seeds of seed (all None if seed is None)
+    if seed is None:
+        return [None] * num_seed
+    return [int(child.generate_state(1, dtype=np.uint64)[0]) for child in np.random.SeedSequence(seed).spawn(num_seed)]
+
 def select_result (merged_prob):
     # parity = [0, 1]
     parity = [False, True]
@@ -121,82 +151,298 @@ def select_result (merged_prob):
     
     return np.random.choice(parity, size=1, p=probabilities)[0]
 
-@ray.remote
+def select_result_uniform (merged_prob, uniform):
+    # select_result with a pre-drawn uniform sample; 
+    # same arithmetic as np.random.choice, so the same RNG stream gives the same results
+    parity = [False, True]
+    if merged_prob < 0:
+        merged_prob = 0
+    elif merged_prob > 1:
+        merged_prob = 1
+
+    cdf = np.array([merged_prob, 1-merged_prob], dtype=np.float64).cumsum()
+    cdf /= cdf[-1]
+    
+    return parity[int(cdf.searchsorted(uniform, side='right'))]
+
+def change_basis (qc_list, lop_qb, target_lop):
+    # Rotate target_lop of a logical qubit onto Z; returns the qubits whose Z parity is the logical outcome
+    lop_qb_x = lop_qb[0]
+    lop_qb_z = lop_qb[1]
+    if target_lop == 'X': # 
+        [qc.h(*lop_qb_x) for qc in qc_list]
+        meas_qb = lop_qb_x
+    elif target_lop == 'Y':
+        lop_qb_y = list(set(lop_qb_x).intersection(lop_qb_z))
+        [qc.s_dag(*lop_qb_y) for qc in qc_list]
+        [qc.h(*lop_qb_x) for qc in qc_list]
+        meas_qb = list(dict.fromkeys(lop_qb_x + lop_qb_z))
+    elif target_lop == 'Z':
+        meas_qb = lop_qb_z
+    elif target_lop == 'HX': #
+        change_basis_qb = list(dict.fromkeys(lop_qb_x + lop_qb_z))
+        [qc.h(*change_basis_qb) for qc in qc_list]
+        [qc.h(*lop_qb_x) for qc in qc_list]
+        meas_qb = lop_qb_x
+    elif target_lop == 'HY':
+        lop_qb_y = list(set(lop_qb_x).intersection(lop_qb_z))
+        meas_qb = list(dict.fromkeys(lop_qb_x + lop_qb_z))
+        [qc.h(*meas_qb) for qc in qc_list]
+        
+        [qc.s_dag(*lop_qb_y) for qc in qc_list]
+        [qc.h(*lop_qb_x) for qc in qc_list]
+    return meas_qb
+
+def walsh_hadamard (val):
+    # Unnormalized fast Walsh-Hadamard transform: res[b] = sum_m (-1)^popcount(b & m) val[m]
+    res = np.array(val, dtype=np.float64)
+    h = 1
+    while h < len(res):
+        res = res.reshape(-1, 2, h)
+        res = np.stack([res[:, 0, :] + res[:, 1, :], res[:, 0, :] - res[:, 1, :]], axis=1).reshape(-1)
+        h *= 2
+    return res
+
+def sample_branch (weight_array, num_branch, rng):
+    # Sum-over-Cliffords sampling of at most num_branch branches (unbiased estimator of the full weighted sum)
+    ## 1) branches that would be drawn at least once in expectation are kept exactly
+    ## 2) the rest is resampled systematically with probability |weight|; each draw carries sign(weight) * |rest|_1 / num_rest
+    abs_weight = np.abs(weight_array)
+    exact = np.zeros(len(weight_array), dtype=bool)
+    while True:
+        num_rest = num_branch - exact.sum()
+        rest_l1 = abs_weight[~exact].sum()
+        new_exact = (~exact) & (abs_weight * num_rest >= rest_l1)
+        if not new_exact.any() or num_rest - new_exact.sum() <= 0:
+            break
+        exact |= new_exact
+    
+    cdf = np.cumsum(np.where(exact, 0, abs_weight)) / rest_l1
+    pos = (rng.random() + np.arange(num_rest)) / num_rest
+    sample_count = np.bincount(np.minimum(cdf.searchsorted(pos, side='right'), len(weight_array) - 1), minlength=len(weight_array))
+    
+    branch_idx_list = np.flatnonzero(exact | (sample_count > 0))
+    sampled_weight = np.sign(weight_array) * rest_l1 * sample_count / num_rest
+    weight_list = np.where(exact, weight_array, sampled_weight)[branch_idx_list]
+    return branch_idx_list, weight_list
+
+# Circuits are shipped to the qc_workers as stim text bytes (small and cheap to pickle)
+def encode_circuit (circ):
+    return str(circ).encode()
+
+def decode_circuit (circ_bytes):
+    return stim.Circuit(circ_bytes.decode())
+
 class qc_worker:
-    def __init__(self, coeff, initial_circuit, num_qb, qc_worker_id):
+    def __init__(self, coeff, initial_circuit, num_qb, qc_worker_id, branch_param, seed=None):
         (self.num_row_dq, self.num_col_dq, self.num_row_aq, self.num_col_aq) = num_qb
         self.qc_worker_id = qc_worker_id
+        # A seeded worker also seeds every stim simulator it creates, from its own RNG
+        self.seeded = seed is not None
+        self.rng = np.random.default_rng(seed)
         
-        self.qc_list = [stim.TableauSimulator()]
+        self.qc_list = [self.new_qc()]
         
         self.qc_list[0].do(initial_circuit)
             
         self.coeff = coeff
+        # Branch management
+        ## weight_list: accumulated coefficient of each branch
+        ## split_idx_list: which of the SPLIT_PER_M magic-state preparations the branch took at the latest split
+        self.weight_list = np.ones(1)
+        self.split_idx_list = [0]
+        ## max_branch: 0 is unlimited; prune_th: branches with |weight| < prune_th are dropped
+        (self.max_branch, self.prune_th) = branch_param
+        self.branch_stat = {"num_merged": 0, "num_pruned": 0, "num_sampled_split": 0}
+
+    def new_qc(self):
+        if self.seeded:
+            return stim.TableauSimulator(seed=int(self.rng.integers(2**63)))
+        return stim.TableauSimulator()
+
+    def copy_qc(self, qc):
+        if self.seeded:
+            return qc.copy(seed=int(self.rng.integers(2**63)))
+        return qc.copy()
 
     def split_qc(self):
-        self.qc_list = [qc if i == 0 else qc.copy() for qc in self.qc_list for i in range(SPLIT_PER_M)]
+        self.compact_qc()
+        # Candidate branches: (parent, split_idx) -> parent * SPLIT_PER_M + split_idx
+        weight_array = np.outer(self.weight_list, self.coeff).flatten()
+        if self.max_branch and len(weight_array) > self.max_branch:
+            branch_idx_list, self.weight_list = sample_branch(weight_array, self.max_branch, self.rng)
+            self.branch_stat["num_sampled_split"] += 1
+        else:
+            branch_idx_list = np.arange(len(weight_array))
+            self.weight_list = weight_array
+        
+        qc_list = []
+        prev_parent = None
+        for branch_idx in branch_idx_list:
+            parent = branch_idx // SPLIT_PER_M
+            qc = self.qc_list[parent]
+            # The first child reuses the parent's simulator
+            qc_list.append(qc if parent != prev_parent else self.copy_qc(qc))
+            prev_parent = parent
+        self.qc_list = qc_list
+        self.split_idx_list = [int(branch_idx % SPLIT_PER_M) for branch_idx in branch_idx_list]
+        return
+    
+    def compact_qc(self):
+        # Merge branches in the same stabilizer state, then drop the branches with small |weight|
+        if len(self.qc_list) > 1:
+            state_idx = dict()
+            qc_list = []
+            weight_list = []
+            for qc, weight in zip(self.qc_list, self.weight_list):
+                state = tuple(str(stabilizer) for stabilizer in qc.canonical_stabilizers())
+                if state in state_idx:
+                    weight_list[state_idx[state]] += weight
+                    self.branch_stat["num_merged"] += 1
+                else:
+                    state_idx[state] = len(qc_list)
+                    qc_list.append(qc)
+                    weight_list.append(weight)
+            self.qc_list = qc_list
+            self.weight_list = np.array(weight_list)
+        
+        weight_sum = self.weight_list.sum()
+        keep = (np.abs(self.weight_list) >= self.prune_th) & (self.weight_list != 0)
+        if not keep.all() and keep.any():
+            self.branch_stat["num_pruned"] += int(len(keep) - keep.sum())
+            self.qc_list = [qc for qc, k in zip(self.qc_list, keep) if k]
+            self.weight_list = self.weight_list[keep]
+            # Keep the total weight (normalization of the merged probabilities)
+            kept_sum = self.weight_list.sum()
+            if kept_sum != 0:
+                self.weight_list = self.weight_list * (weight_sum / kept_sum)
         return
     
-    def apply_qc(self, op_list):
-        for qc_idx, qc in enumerate(self.qc_list):
-            qc.do(op_list[qc_idx % SPLIT_PER_M])
+    def get_branch_stat(self):
+        # Memory: an inverse tableau holds 4 n x n bit tables
+        num_qb = max([len(qc.current_inverse_tableau()) for qc in self.qc_list])
+        branch_stat = dict(self.branch_stat)
+        branch_stat["num_branch"] = len(self.qc_list)
+        branch_stat["mem_bytes"] = len(self.qc_list) * (4 * num_qb * num_qb // 8)
+        return branch_stat
+    
+    def apply_qc(self, op_common, op_branch):
+        # One do() per branch: the branch prefix (if any) followed by the shared ops
+        common_circ = decode_circuit(op_common)
+        if op_branch is None:
+            for qc in self.qc_list:
+                qc.do(common_circ)
+        else:
+            branch_circ_list = [decode_circuit(branch) + common_circ for branch in op_branch]
+            for qc_idx, qc in enumerate(self.qc_list):
+                qc.do(branch_circ_list[self.split_idx_list[qc_idx]])
         return
     
     def get_prob(self, qb):
         num_qb = len(self.qc_list[0].current_inverse_tableau())
         target_paulistring = stim.PauliString("I"* qb + "Z" + "I"* (num_qb - qb - 1))
         prob_0_list = [(0.5 + 0.5*qc.peek_observable_expectation(target_paulistring)) for qc in self.qc_list]
-        merged_prob = merge_prob(prob_0_list, self.coeff)
+        merged_prob = merge_prob_weight(prob_0_list, self.weight_list)
         return merged_prob
     
-    def get_prob_multiqb(self, lop_qb_list, target_lop_list, num_shots):
-        prob_list = [dict() for _ in self.qc_list]
+    def measure_many(self, qb_list, uniform_list):
+        # Sequentially sample & project qb_list within this worker (only valid if it is the single worker)
+        result_list = []
+        for qb, uniform in zip(qb_list, uniform_list):
+            prob_0_list = [(0.5 + 0.5*qc.peek_z(qb)) for qc in self.qc_list]
+            merged_prob = merge_prob_weight(prob_0_list, self.weight_list)
+            selected_result = select_result_uniform(merged_prob, uniform)
+            self.project_qc(qb, selected_result)
+            result_list.append(selected_result)
+        return result_list
+
+    def sample_multiqb(self, lop_qb_list, target_lop_list, num_shots):
+        # Outcome counts of num_shots shots: count[branch][state] (state bits in the order of the logical qubits)
         num_lq = len(target_lop_list) - target_lop_list.count('I')
+        count = np.zeros((len(self.qc_list), 2 ** num_lq), dtype=np.int64)
+        branch_idx = np.arange(len(self.qc_list))
         
         for _ in range(num_shots):
-            qc_list_copy = [qc.copy() for qc in self.qc_list]
+            qc_list_copy = [self.copy_qc(qc) for qc in self.qc_list]
             
-            state_list = [''] * len(qc_list_copy)
+            state_list = np.zeros(len(qc_list_copy), dtype=np.int64)
             for lop_qb, target_lop in zip(lop_qb_list, target_lop_list):
                 if target_lop == 'I':
                     continue
                 
-                # Change basis
-                lop_qb_x = lop_qb[0]
-                lop_qb_z = lop_qb[1]
-                if target_lop == 'X': # 
-                    [qc.h(*lop_qb_x) for qc in qc_list_copy]
-                    meas_qb = lop_qb_x
-                elif target_lop == 'Y':
-                    lop_qb_y = list(set(lop_qb_x).intersection(lop_qb_z))
-                    [qc.s_dag(*lop_qb_y) for qc in qc_list_copy]
-                    [qc.h(*lop_qb_x) for qc in qc_list_copy]
-                    meas_qb = list(dict.fromkeys(lop_qb_x + lop_qb_z))
-                elif target_lop == 'Z':
-                    meas_qb = lop_qb_z
-                elif target_lop == 'HX': #
-                    change_basis_qb = list(dict.fromkeys(lop_qb_x + lop_qb_z))
-                    [qc.h(*change_basis_qb) for qc in qc_list_copy]
-                    [qc.h(*lop_qb_x) for qc in qc_list_copy]
-                    meas_qb = lop_qb_x
-                elif target_lop == 'HY':
-                    lop_qb_y = list(set(lop_qb_x).intersection(lop_qb_z))
-                    meas_qb = list(dict.fromkeys(lop_qb_x + lop_qb_z))
-                    [qc.h(*meas_qb) for qc in qc_list_copy]
-                    
-                    [qc.s_dag(*lop_qb_y) for qc in qc_list_copy]
-                    [qc.h(*lop_qb_x) for qc in qc_list_copy]
+                meas_qb = change_basis(qc_list_copy, lop_qb, target_lop)
                 meas_result = [qc.measure_many(*meas_qb) for qc in qc_list_copy]
-                lo_meas_result = [str(meas.count(True) % 2) for meas in meas_result]
-                state_list = [s + l for (s,l) in zip(state_list, lo_meas_result)]
+                lo_meas_result = [meas.count(True) % 2 for meas in meas_result]
+                state_list = (state_list << 1) | lo_meas_result
             
-            for prob, state in zip(prob_list, state_list):
-                try:
-                    prob[state] += (1 / num_shots)
-                except:
-                    prob[state] = (1 / num_shots)
-                
-        merged_prob = merge_prob_multi(prob_list, self.coeff, num_lq)
+            count[branch_idx, state_list] += 1
+        
+        return count
+
+    def merge_count(self, count, num_shots):
+        num_lq = int(np.log2(count.shape[1]))
+        prob = self.weight_list @ (count / num_shots)
+        return {format(k, '0'+str(num_lq)+'b'): float(prob[k]) for k in range(2 ** num_lq)}
+
+    def get_prob_multiqb(self, lop_qb_list, target_lop_list, num_shots):
+        count = self.sample_multiqb(lop_qb_list, target_lop_list, num_shots)
+        merged_prob = self.merge_count(count, num_shots)
+        
+        return merged_prob
+
+    def get_prob_multiqb_adaptive(self, lop_qb_list, target_lop_list, max_shots, shot_tol):
+        # Run shots in blocks until every merged outcome probability is within shot_tol (relative to sum |weight|)
+        ## bound: empirical Bernstein half-width of the weighted sum (bernstein_dev); max_shots caps the shots otherwise
+        count = None
+        num_shots = 0
+        while num_shots < max_shots:
+            num_block = min(SHOT_BLOCK, max_shots - num_shots)
+            block_count = self.sample_multiqb(lop_qb_list, target_lop_list, num_block)
+            count = block_count if count is None else count + block_count
+            num_shots += num_block
+            
+            dev = bernstein_dev(self.weight_list, count, num_shots, SHOT_CONF_DELTA)
+            if dev.max() <= shot_tol:
+                break
+        merged_prob = self.merge_count(count, num_shots)
+        
+        return merged_prob, num_shots
+
+    def get_prob_multiqb_exact(self, lop_qb_list, target_lop_list):
+        # Exact distribution: expectation values of every parity of the logical operators + Walsh-Hadamard inversion
+        ## valid if the logical operators act on disjoint qubits (true for every patch layout of qtexec_unit)
+        qc_list_copy = [self.copy_qc(qc) for qc in self.qc_list]
+        
+        meas_qb_list = []
+        for lop_qb, target_lop in zip(lop_qb_list, target_lop_list):
+            if target_lop == 'I':
+                continue
+            meas_qb_list.append(change_basis(qc_list_copy, lop_qb, target_lop))
+        num_lq = len(meas_qb_list)
+        
+        # The tableau only grows to the qubits touched so far
+        num_qb = max([len(qc.current_inverse_tableau()) for qc in qc_list_copy] + [int(qb) + 1 for meas_qb in meas_qb_list for qb in meas_qb])
+        [qc.set_num_qubits(num_qb) for qc in qc_list_copy]
+        lop_z_list = []
+        for meas_qb in meas_qb_list:
+            lop_z = stim.PauliString(num_qb)
+            for qb in meas_qb:
+                lop_z[int(qb)] = 'Z'
+            lop_z_list.append(lop_z)
+        
+        # parity_list[m]: product of the logical operators whose bits are set in m (MSB: first logical qubit)
+        parity_list = [stim.PauliString(num_qb)]
+        for m in range(1, 2 ** num_lq):
+            low_bit = m & (-m)
+            parity_list.append(parity_list[m ^ low_bit] * lop_z_list[num_lq - low_bit.bit_length()])
+        
+        prob_list = []
+        for qc in qc_list_copy:
+            expectation = np.array([qc.peek_observable_expectation(parity) for parity in parity_list], dtype=np.float64)
+            prob = walsh_hadamard(expectation) / (2 ** num_lq)
+            prob_list.append({format(k, '0'+str(num_lq)+'b'): prob[k] for k in range(2 ** num_lq)})
+        
+        merged_prob = merge_prob_multi(prob_list, self.weight_list, num_lq, merge_prob_weight)
         
         return merged_prob
     
@@ -211,12 +457,34 @@ class qc_worker:
                 else:
                     qc.do(kickback)
         return
+
+    def get_state(self):
+        # Checkpoint: the stabilizer state of each branch is fully described by its inverse tableau
+        return {"qc_list": [qc.current_inverse_tableau() for qc in self.qc_list], "coeff": self.coeff, 
+                "weight_list": self.weight_list, "split_idx_list": self.split_idx_list, 
+                "rng_state": self.rng.bit_generator.state, "branch_stat": dict(self.branch_stat)}
+
+    def set_state(self, state):
+        self.qc_list = []
+        self.rng.bit_generator.state = state["rng_state"]
+        for tableau in state["qc_list"]:
+            qc = self.new_qc()
+            qc.set_inverse_tableau(tableau)
+            self.qc_list.append(qc)
+        self.coeff = state["coeff"]
+        self.weight_list = state["weight_list"]
+        self.split_idx_list = state["split_idx_list"]
+        self.branch_stat = dict(state["branch_stat"])
+        return
     
     
-@ray.remote
 class qc_supervisor:
-    def __init__(self, initial_num_split, initial_fresh_m_idx, num_qb): # num_threads == 5 ** initial_num_split
+    def __init__(self, initial_num_split, initial_fresh_m_idx, num_qb, backend_name, branch_param, seed=None): # num_threads == 5 ** initial_num_split
         (self.num_row_dq, self.num_col_dq, self.num_row_aq, self.num_col_aq) = num_qb
+        self.backend = qc_backend(backend_name)
+        # RNG of the measurement results (separate from the error injection RNG of the simulator)
+        sup_seed, worker_seed = derive_seed(seed, 2)
+        self.rng = np.random.RandomState(None if sup_seed is None else sup_seed % (2**32))
         
         num_qc_worker = pow(SPLIT_PER_M, initial_num_split)
         op_list = [stim.Circuit() for _ in range(num_qc_worker)]
@@ -283,35 +551,81 @@ class qc_supervisor:
         else:
             raise Exception("SPLIT_PER_M other than 3, 5 are currently not supported")
 
-        self.qc_worker_list = [qc_worker.remote(self.coeff, circ, num_qb, op_list.index(circ)) for circ in op_list]
+        worker_seed_list = derive_seed(worker_seed, len(op_list))
+        self.qc_worker_list = [self.backend.spawn(qc_worker, self.coeff, circ, num_qb, op_list.index(circ), branch_param, worker_seed_list[op_list.index(circ)]) 
+                               for circ in op_list]
         
     def split_qc(self):
         [qc_wk.split_qc.remote() for qc_wk in self.qc_worker_list]
         return
     
-    def apply_qc(self, op_list):
-        [qc_wk.apply_qc.remote(op_list) for qc_wk in self.qc_worker_list]
+    def apply_qc(self, op_common, op_branch):
+        [qc_wk.apply_qc.remote(op_common, op_branch) for qc_wk in self.qc_worker_list]
         return
     
     def get_prob(self, qb):
-        prob_0_list = ray.get([qc_wk.get_prob.remote(qb) for qc_wk in self.qc_worker_list])
+        prob_0_list = self.backend.get([qc_wk.get_prob.remote(qb) for qc_wk in self.qc_worker_list])
         merged_prob = merge_prob(prob_0_list, self.coeff)
-        selected_result = select_result(merged_prob)
+        selected_result = select_result_uniform(merged_prob, self.rng.random_sample())
         return merged_prob, selected_result
 
-    def get_prob_multiqb(self, lop_qb_list, target_lop_list, num_shots):
-        prob_list = ray.get([qc_wk.get_prob_multiqb.remote(lop_qb_list, target_lop_list, num_shots) for qc_wk in self.qc_worker_list])
+    def measure_many(self, qb_list):
+        # Measure qb_list in order; equivalent to get_prob + project_qc per qubit
+        ## uniform samples are drawn here as select_result would do
+        uniform_list = self.rng.random_sample(len(qb_list))
+        if len(self.qc_worker_list) == 1:
+            # one round-trip for the whole list
+            return self.backend.get(self.qc_worker_list[0].measure_many.remote(qb_list, uniform_list))
+        # merged probabilities need every worker per qubit
+        result_list = []
+        for qb, uniform in zip(qb_list, uniform_list):
+            prob_0_list = self.backend.get([qc_wk.get_prob.remote(qb) for qc_wk in self.qc_worker_list])
+            merged_prob = merge_prob(prob_0_list, self.coeff)
+            selected_result = select_result_uniform(merged_prob, uniform)
+            self.project_qc(qb, selected_result)
+            result_list.append(selected_result)
+        return result_list
+
+    def get_prob_multiqb(self, lop_qb_list, target_lop_list, num_shots, exact=False, shot_tol=None):
+        # Returns (merged_prob, shots actually used); exact mode uses no shots
+        if exact:
+            prob_list = self.backend.get([qc_wk.get_prob_multiqb_exact.remote(lop_qb_list, target_lop_list) for qc_wk in self.qc_worker_list])
+            num_shots = 0
+        elif shot_tol is not None:
+            res_list = self.backend.get([qc_wk.get_prob_multiqb_adaptive.remote(lop_qb_list, target_lop_list, num_shots, shot_tol) for qc_wk in self.qc_worker_list])
+            prob_list = [prob for prob, _ in res_list]
+            num_shots = max(shots for _, shots in res_list)
+        else:
+            prob_list = self.backend.get([qc_wk.get_prob_multiqb.remote(lop_qb_list, target_lop_list, num_shots) for qc_wk in self.qc_worker_list])
         num_lq = len(target_lop_list) - target_lop_list.count('I')
         merged_prob = merge_prob_multi(prob_list, self.coeff, num_lq)
-        return merged_prob
+        return merged_prob, num_shots
 
     def project_qc(self, qb, target_value):
         [qc_wk.project_qc.remote(qb, target_value) for qc_wk in self.qc_worker_list]
         return
+
+    def get_branch_stat(self):
+        worker_stat_list = self.backend.get([qc_wk.get_branch_stat.remote() for qc_wk in self.qc_worker_list])
+        return {key: sum(stat[key] for stat in worker_stat_list) for key in worker_stat_list[0]}
+
+    def get_state(self):
+        # Checkpoint: worker states + the RNG of the measurement results
+        worker_state_list = self.backend.get([qc_wk.get_state.remote() for qc_wk in self.qc_worker_list])
+        return {"worker_state_list": worker_state_list, "coeff": self.coeff, "rng_state": self.rng.get_state()}
+
+    def set_state(self, state):
+        if len(state["worker_state_list"]) != len(self.qc_worker_list):
+            raise Exception("qc_supervisor - set_state: the number of qc_workers does not match")
+        self.backend.get([qc_wk.set_state.remote(wk_state) for qc_wk, wk_state in zip(self.qc_worker_list, state["worker_state_list"])])
+        self.coeff = state["coeff"]
+        self.rng.set_state(state["rng_state"])
+        return
     
 class qc_compose_unit:
-    def __init__ (self, code_distance, num_row_patch, num_col_patch, physical_error_rate, emulate_mode):
+    def __init__ (self, code_distance, num_row_patch, num_col_patch, physical_error_rate, emulate_mode, backend_name=None, seed=None, branch_param=(0, 0.0)):
         self.emulate_mode = emulate_mode
+        self.backend = qc_backend(backend_name)
         self.initial_num_split = 0
         self.physical_error_rate = physical_error_rate
         self.code_distance = code_distance
@@ -332,19 +646,35 @@ class qc_compose_unit:
         # list of arrays that track injected errors
         self.error_trace_dq = []
         self.error_trace_aq = []
+        # Error injection
+        ## seed (None: system entropy) determines every RNG of the unit: error injection, measurement results, and branch sampling
+        error_seed, qc_seed = derive_seed(seed, 2)
+        self.rng = np.random.default_rng(error_seed)
+        self.error_sq_prob = [self.physical_error_rate / 3] *3 + [1 - self.physical_error_rate]
+        self.error_dq_prob = [self.physical_error_rate / 15] *15 + [1 - self.physical_error_rate]
+        ## (key, (mask_dq, mask_aq)) of the last inject_no_error_mask
+        self.no_error_mask = (None, None)
 
-        self.op_list = [stim.Circuit() for _ in range(SPLIT_PER_M)]
+        # Ops of the current round
+        ## op_common: ops shared by every branch, recorded once
+        ## op_branch: per-branch magic-state preparation (None if the round has none)
+        self.op_common = stim.Circuit()
+        self.op_branch = None
         
         self.fresh_m_idx = num_row_dq*num_col_dq + num_row_aq*num_col_aq
         self.num_fresh_m = 2*self.initial_num_split
         self.num_split = self.initial_num_split
+        ## Statistics of the stabilizer-rank branches; branch_param = (max_branch, prune_th), see qc_worker
+        self.branch_stat = {"num_split": self.num_split, "num_branch": 1, "max_num_branch": 1, "mem_bytes": 0, "max_mem_bytes": 0, 
+                            "num_merged": 0, "num_pruned": 0, "num_sampled_split": 0}
         
+        # The supervisor only coordinates the workers; the process backend keeps it in this process
         if self.emulate_mode:
-            self.qc_sup = qc_supervisor.remote(0, self.fresh_m_idx, 
-                (self.num_row_dq, self.num_col_dq, self.num_row_aq, self.num_col_aq))
+            self.qc_sup = self.backend.spawn(qc_supervisor, 0, self.fresh_m_idx, 
+                (self.num_row_dq, self.num_col_dq, self.num_row_aq, self.num_col_aq), self.backend.name, branch_param, qc_seed, remote=False)
         else:
-            self.qc_sup = qc_supervisor.remote(self.initial_num_split, self.fresh_m_idx, 
-                (self.num_row_dq, self.num_col_dq, self.num_row_aq, self.num_col_aq))
+            self.qc_sup = self.backend.spawn(qc_supervisor, self.initial_num_split, self.fresh_m_idx, 
+                (self.num_row_dq, self.num_col_dq, self.num_row_aq, self.num_col_aq), self.backend.name, branch_param, qc_seed, remote=False)
         return
 
     def get_qubit(self, patch_idx, ucl_idx, qb_type, qb_idx):
@@ -382,10 +712,29 @@ class qc_compose_unit:
         self.qc_sup.split_qc.remote()
         
         self.num_split += 1
+        self.update_branch_stat()
+        return
+
+    def update_branch_stat(self):
+        # Branches only change at a split
+        self.branch_stat.update(self.backend.get(self.qc_sup.get_branch_stat.remote()))
+        self.branch_stat["num_split"] = self.num_split
+        self.branch_stat["max_num_branch"] = max(self.branch_stat["max_num_branch"], self.branch_stat["num_branch"])
+        self.branch_stat["max_mem_bytes"] = max(self.branch_stat["max_mem_bytes"], self.branch_stat["mem_bytes"])
         return
 
     def get_qc(self):
         return self.qc_sup
+
+    def measure_many(self, qb_list):
+        return self.backend.get(self.qc_sup.measure_many.remote(qb_list))
+
+    def get_qc_state(self):
+        return self.backend.get(self.qc_sup.get_state.remote())
+
+    def set_qc_state(self, state):
+        self.backend.get(self.qc_sup.set_state.remote(state))
+        return
     
     def get_lop_qb (self, target_pchidx, pchtype):
         pchrow, pchcol = target_pchidx
@@ -433,83 +782,96 @@ class qc_compose_unit:
         
         return qb_lop_x, qb_lop_z
 
-    def peek_multi_logical_qubits(self, target_lop_list, target_pchidx_list, pchtype_list, num_shots):
-        if num_shots <= 0:
-            return dict()
+    def peek_multi_logical_qubits(self, target_lop_list, target_pchidx_list, pchtype_list, num_shots, exact=False, shot_tol=None):
+        # exact: no shot sampling (num_shots is ignored)
+        # shot_tol: adaptive mode; num_shots is the maximum
+        ## returns (prob, shots actually used)
+        if num_shots <= 0 and not exact:
+            return dict(), 0
         
         lop_qb_list = [self.get_lop_qb(target_pchidx, pchtype) for target_pchidx, pchtype in zip(target_pchidx_list, pchtype_list)]
         
-        prob = ray.get(self.qc_sup.get_prob_multiqb.remote(lop_qb_list, target_lop_list, num_shots))
+        prob, num_shots = self.backend.get(self.qc_sup.get_prob_multiqb.remote(lop_qb_list, target_lop_list, num_shots, exact, shot_tol))
         
-        return prob  
+        return prob, num_shots
     
     def append_op (self, op, q1 = None, q2 = None):
         if op == 'cz':
-            for circuit_op in self.op_list:
-                circuit_op.append_operation('CZ', [q1, q2])
+            self.op_common.append_operation('CZ', [q1, q2])
         elif op == 'h':
-            for circuit_op in self.op_list:
-                circuit_op.append_operation('H', [q1])
+            self.op_common.append_operation('H', [q1])
         elif op == 'h_t':
+            branch_op_list = [stim.Circuit() for _ in range(SPLIT_PER_M)]
             if SPLIT_PER_M == 3:
-                self.op_list[0].append_operation('H', [q1])
-                self.op_list[1].append_operation('H', [q1])
-                self.op_list[2].append_operation('H', [q1])
+                branch_op_list[0].append_operation('H', [q1])
+                branch_op_list[1].append_operation('H', [q1])
+                branch_op_list[2].append_operation('H', [q1])
                 
-                self.op_list[1].append_operation('S', [q1])
-                self.op_list[2].append_operation('S_DAG', [q1])
+                branch_op_list[1].append_operation('S', [q1])
+                branch_op_list[2].append_operation('S_DAG', [q1])
+                self.append_branch_op(branch_op_list)
             elif SPLIT_PER_M == 5:
-                self.op_list[0].append_operation('H', [q1])
-                self.op_list[0].append_operation('CNOT', [q1,q2])
+                branch_op_list[0].append_operation('H', [q1])
+                branch_op_list[0].append_operation('CNOT', [q1,q2])
                 
-                self.op_list[1].append_operation('H', [q1])
-                self.op_list[1].append_operation('H', [q2])
-                self.op_list[1].append_operation('CZ', [q1,q2])
+                branch_op_list[1].append_operation('H', [q1])
+                branch_op_list[1].append_operation('H', [q2])
+                branch_op_list[1].append_operation('CZ', [q1,q2])
                 
-                self.op_list[2].append_operation('H', [q1])
-                self.op_list[2].append_operation('H', [q2])
-                self.op_list[2].append_operation('CZ', [q1,q2])
-                self.op_list[2].append_operation('X', [q1])
-                self.op_list[2].append_operation('X', [q2])
+                branch_op_list[2].append_operation('H', [q1])
+                branch_op_list[2].append_operation('H', [q2])
+                branch_op_list[2].append_operation('CZ', [q1,q2])
+                branch_op_list[2].append_operation('X', [q1])
+                branch_op_list[2].append_operation('X', [q2])
                 
-                self.op_list[3].append_operation('H', [q1])
-                self.op_list[3].append_operation('H', [q2])
+                branch_op_list[3].append_operation('H', [q1])
+                branch_op_list[3].append_operation('H', [q2])
+                self.append_branch_op(branch_op_list)
                 
-                for circuit_op in self.op_list:
-                    circuit_op.append_operation('S_DAG', [q1])
-                    circuit_op.append_operation('S_DAG', [q2])
-                    circuit_op.append_operation('H', [q1])
-                    circuit_op.append_operation('H', [q2])
+                self.op_common.append_operation('S_DAG', [q1])
+                self.op_common.append_operation('S_DAG', [q2])
+                self.op_common.append_operation('H', [q1])
+                self.op_common.append_operation('H', [q2])
         elif op == 's':
-            for circuit_op in self.op_list:
-                circuit_op.append_operation('S', [q1])
+            self.op_common.append_operation('S', [q1])
         elif op == 'sdg':
-            for circuit_op in self.op_list:
-                circuit_op.append_operation('S_DAG', [q1])
+            self.op_common.append_operation('S_DAG', [q1])
         elif op == 'x':
-            for circuit_op in self.op_list:
-                circuit_op.append_operation('X', [q1])
+            self.op_common.append_operation('X', [q1])
         elif op == 'y':
-            for circuit_op in self.op_list:
-                circuit_op.append_operation('Y', [q1])
+            self.op_common.append_operation('Y', [q1])
         elif op == 'z':
-            for circuit_op in self.op_list:
-                circuit_op.append_operation('Z', [q1])
+            self.op_common.append_operation('Z', [q1])
         elif op == 'i':
             pass
         elif op == 'swap':
-            for circuit_op in self.op_list:
-                circuit_op.append_operation('SWAP', [q1, q2])
+            self.op_common.append_operation('SWAP', [q1, q2])
         else:
             raise Exception("Operation {} is not supported".format(op))
         
         return
     
+    def append_branch_op (self, branch_op_list):
+        # Keep the op order: the shared ops so far move in front of the branch-specific ops
+        ## (h_t right after apply_all_op leaves op_common empty, so this is normally a no-op)
+        if self.op_branch is None:
+            self.op_branch = [stim.Circuit() for _ in range(SPLIT_PER_M)]
+        for branch_op, new_op in zip(self.op_branch, branch_op_list):
+            branch_op += self.op_common
+            branch_op += new_op
+        self.op_common = stim.Circuit()
+        return
+    
     def apply_all_op (self):
-        circ_id = ray.put(self.op_list)
-        self.qc_sup.apply_qc.remote(circ_id)
+        # Nothing to ship (e.g., emulate mode)
+        if self.op_branch is None and len(self.op_common) == 0:
+            return
+        op_common = encode_circuit(self.op_common)
+        op_branch = None if self.op_branch is None else [encode_circuit(branch_op) for branch_op in self.op_branch]
+        self.qc_sup.apply_qc.remote(op_common, op_branch)
         
-        self.op_list = [stim.Circuit() for _ in range(SPLIT_PER_M)]
+        self.op_common = stim.Circuit()
+        self.op_branch = None
         return
 
     
@@ -532,6 +894,11 @@ class qc_compose_unit:
 
             ops_per_time_step = op_trace[i]
             error_map_dq, error_map_aq = self.init_error_map()
+            # Sample the errors of the whole time step: one draw for 1q ops and one for 2q ops
+            num_dq_op = sum([(op.op_type == 'cz' or op.op_type == 'cnot') for op in ops_per_time_step])
+            error_sq_list, error_dq_list = self.sample_error_gate(len(ops_per_time_step) - num_dq_op, num_dq_op, inject_no_error)
+            sq_cnt = 0
+            dq_cnt = 0
             for op in ops_per_time_step:
                 # Build gates except measurement
                 op_type = op.op_type
@@ -600,23 +967,22 @@ class qc_compose_unit:
                         pass # Add if needed
 
                 # Select error gate
-                selected_error_gate = self.select_gate_error_gate(op_type, inject_no_error)
+                if op_type == 'cz' or op_type == 'cnot':
+                    selected_error_gate = error_dq_list[dq_cnt]
+                    dq_cnt += 1
+                else:
+                    selected_error_gate = error_sq_list[sq_cnt]
+                    sq_cnt += 1
                     
                 # Remove errors that occur in masked qubits
-                if len(selected_error_gate) == 1:
-                    if any([all([idx1 == idx2 for (idx1, idx2) in zip(q1_idx, no_error_mask_idx)]) for no_error_mask_idx in inject_no_error_mask]):
+                if (selected_error_gate == 'i') or (selected_error_gate == 'ii') or (not inject_no_error_mask):
+                    pass
+                elif len(selected_error_gate) == 1:
+                    if self.is_no_error_qb(inject_no_error_mask, q1_idx):
                         selected_error_gate = 'i'
-                elif len(selected_error_gate) == 2:
-                    if any([all([idx1 == idx2 for (idx1, idx2) in zip(q1_idx, no_error_mask_idx)]) for no_error_mask_idx in inject_no_error_mask]):
-                        selected_error_gate_0 = 'i'
-                    else:
-                        selected_error_gate_0 = selected_error_gate[0]
-                    
-                    if any([all([idx1 == idx2 for (idx1, idx2) in zip(q2_idx, no_error_mask_idx)]) for no_error_mask_idx in inject_no_error_mask]):
-                        selected_error_gate_1 = 'i'
-                    else:
-                        selected_error_gate_1 = selected_error_gate[1]
-                        
+                else:
+                    selected_error_gate_0 = 'i' if self.is_no_error_qb(inject_no_error_mask, q1_idx) else selected_error_gate[0]
+                    selected_error_gate_1 = 'i' if self.is_no_error_qb(inject_no_error_mask, q2_idx) else selected_error_gate[1]
                     selected_error_gate = selected_error_gate_0 + selected_error_gate_1
 
                 # Apply error gate on quantum circuits
@@ -674,22 +1040,36 @@ class qc_compose_unit:
 
         return meas_qb_list, meas_qb_idx, meas_qb_type
 
-    def select_gate_error_gate (self, op, inject_no_error = False):
+    def sample_error_gate (self, num_sq_op, num_dq_op, inject_no_error = False):
         if inject_no_error:
-            if op == 'cz' or op == 'cnot':
-                return 'ii'
-            else:
-                return 'i'
+            return ['i'] * num_sq_op, ['ii'] * num_dq_op
+
+        error_sq_list = self.rng.choice(ERROR_SQ_GATE, size=num_sq_op, p=self.error_sq_prob).tolist()
+        error_dq_list = self.rng.choice(ERROR_DQ_GATE, size=num_dq_op, p=self.error_dq_prob).tolist()
+        return error_sq_list, error_dq_list
 
-        error_sq_gate = ['x','y','z','i']
-        error_dq_gate = ['xx','xy','xz','xi','yx','yy','yz','yi','zx','zy','zz','zi','ix','iy','iz','ii']
+    def get_no_error_mask (self, inject_no_error_mask):
+        # Boolean (mask_dq, mask_aq) arrays of inject_no_error_mask; rebuilt only if the mask changes
+        key = tuple(inject_no_error_mask)
+        if self.no_error_mask[0] != key:
+            mask_dq = np.zeros((self.num_row_dq, self.num_col_dq), dtype=bool)
+            mask_aq = np.zeros((self.num_row_aq, self.num_col_aq), dtype=bool)
+            for no_error_mask_idx in inject_no_error_mask:
+                row, col = self.get_qb_idx(*no_error_mask_idx)
+                mask = mask_dq if no_error_mask_idx[2] == 'dq' else mask_aq
+                # qubits outside the plane never match an op
+                if row < mask.shape[0] and col < mask.shape[1]:
+                    mask[row][col] = True
+            self.no_error_mask = (key, (mask_dq, mask_aq))
+        return self.no_error_mask[1]
 
-        if op == 'cz' or op == 'cnot':
-            probabilities = [self.physical_error_rate / 15] *15 + [1 - self.physical_error_rate]
-            return np.random.choice(error_dq_gate,size=1,p=probabilities)[0]
+    def is_no_error_qb (self, inject_no_error_mask, q_idx):
+        mask_dq, mask_aq = self.get_no_error_mask(inject_no_error_mask)
+        row, col = self.get_qb_idx(*q_idx)
+        if q_idx[2] == 'dq':
+            return mask_dq[row][col]
         else:
-            probabilities = [self.physical_error_rate / 3, self.physical_error_rate / 3, self.physical_error_rate / 3, 1 - self.physical_error_rate]
-            return np.random.choice(error_sq_gate,size=1,p=probabilities)[0]
+            return mask_aq[row][col]
         
     def init_error_map (self):
         error_map_aq = np.full((self.num_row_aq, self.num_col_aq), '-')
@@ -11,8 +11,6 @@ import numpy as np
 import math
 # Submodule
 import qc_compose_unit as qc_compose_unit
-# ray
-import ray
 
 '''
 # qtexec_unit emulates the qubit plane: 
@@ -27,166 +25,33 @@ import ray
 '''
 
 # Helper functions for emulate_mode
+## Errors are Pauli codes in the symplectic form (bit0: x, bit1: z); all functions work element-wise on arrays
 def merge_pauli(pauli_1, pauli_2):
-    result = 'i'
-    if pauli_1 == 'i' or pauli_1 == '-':
-        if pauli_2 == 'i' or pauli_2 == '-':
-            result = 'i'
-        elif pauli_2 == 'x':
-            result = 'x'
-        elif pauli_2 == 'y':
-            result = 'y'
-        elif pauli_2 == 'z':
-            result = 'z'
-        else:
-            pass
-    elif pauli_1 == 'x':
-        if pauli_2 == 'i' or pauli_2 == '-':
-            result = 'x'
-        elif pauli_2 == 'x':
-            result = 'i'
-        elif pauli_2 == 'y':
-            result = 'z'
-        elif pauli_2 == 'z':
-            result = 'y'
-        else:
-            pass
-    elif pauli_1 == 'y':
-        if pauli_2 == 'i' or pauli_2 == '-':
-            result = 'y'
-        elif pauli_2 == 'x':
-            result = 'z'
-        elif pauli_2 == 'y':
-            result = 'i'
-        elif pauli_2 == 'z':
-            result = 'x'
-        else:
-            pass
-    elif pauli_1 == 'z':
-        if pauli_2 == 'i' or pauli_2 == '-':
-            result = 'z'
-        elif pauli_2 == 'x':
-            result = 'y'
-        elif pauli_2 == 'y':
-            result = 'x'
-        elif pauli_2 == 'z':
-            result = 'i'
-        else:
-            pass
-    else:
-        pass
-
-    return result
+    # Product of two Paulis (up to phase)
+    return pauli_1 ^ pauli_2
 
 def apply_commutation (op_type, target_pauli):
-    if len(target_pauli) == 2:
-        target_pauli = str(target_pauli[0]) + str(target_pauli[1])
-        if target_pauli[0] == '-':
-            target_pauli = 'i' + (target_pauli[1])
-        if target_pauli[1] == '-':
-            target_pauli = (target_pauli[0]) + 'i'
-    elif len(target_pauli) == 1:
-        if target_pauli == '-':
-            target_pauli = 'i'
-
-    if op_type == 'h':
-        if target_pauli == 'x':
-            result_pauli = 'z'
-        elif target_pauli == 'z':
-            result_pauli = 'x'
-        else:
-            result_pauli = target_pauli
-    elif op_type == 's' or op_type == 'sdag':
-        if target_pauli == 'x':
-            result_pauli = 'y'
-        elif target_pauli == 'y':
-            result_pauli = 'x'
-        else:
-            result_pauli = target_pauli
-    elif op_type == 'cz':
-        target_pauli = target_pauli[0] + target_pauli[1]
-        if target_pauli == 'xx':
-            result_pauli = 'yy'
-        elif target_pauli == 'xy':
-            result_pauli = 'yz'
-        elif target_pauli == 'xz':
-            result_pauli = 'xi'
-        elif target_pauli == 'xi':
-            result_pauli = 'xz'
-
-        elif target_pauli == 'yx':
-            result_pauli = 'xy'
-        elif target_pauli == 'yy':
-            result_pauli = 'xx'
-        elif target_pauli == 'yz':
-            result_pauli = 'yi'
-        elif target_pauli == 'yi':
-            result_pauli = 'yz'
-
-        elif target_pauli == 'zx':
-            result_pauli = 'ix'
-        elif target_pauli == 'zy':
-            result_pauli = 'iy'
-        elif target_pauli == 'zz':
-            result_pauli = 'zz'
-        elif target_pauli == 'zi':
-            result_pauli = 'zi'
-
-        elif target_pauli == 'ix':
-            result_pauli = 'zx'
-        elif target_pauli == 'iy':
-            result_pauli = 'zy'
-        elif target_pauli == 'iz':
-            result_pauli = 'iz'
-        elif target_pauli == 'ii':
-            result_pauli = 'ii'
-    elif op_type == 'cnot': # For CNOT: target_pauli=(control qubit, target qubit)
-        target_pauli = target_pauli[0] + target_pauli[1]
-        if target_pauli == 'xx':
-            result_pauli = 'xi'
-        elif target_pauli == 'xy':
-            result_pauli = 'yz'
-        elif target_pauli == 'xz':
-            result_pauli = 'yy'
-        elif target_pauli == 'xi':
-            result_pauli = 'xx'
-
-        elif target_pauli == 'yx':
-            result_pauli = 'yi'
-        elif target_pauli == 'yy':
-            result_pauli = 'xz'
-        elif target_pauli == 'yz':
-            result_pauli = 'xy'
-        elif target_pauli == 'yi':
-            result_pauli = 'yx'
-
-        elif target_pauli == 'zx':
-            result_pauli = 'zx'
-        elif target_pauli == 'zy':
-            result_pauli = 'iy'
-        elif target_pauli == 'zz':
-            result_pauli = 'iz'
-        elif target_pauli == 'zi':
-            result_pauli = 'zi'
-
-        elif target_pauli == 'ix':
-            result_pauli = 'ix'
-        elif target_pauli == 'iy':
-            result_pauli = 'zy'
-        elif target_pauli == 'iz':
-            result_pauli = 'zz'
-        elif target_pauli == 'ii':
-            result_pauli = 'ii'
-        else:
-            pass
+    # Conjugate Paulis by a Clifford gate; target_pauli=(q1, q2) for two-qubit gates
+    if op_type == 'h': # x <-> z
+        x_bit = target_pauli & PAULI_X
+        z_bit = (target_pauli & PAULI_Z) >> 1
+        result_pauli = (x_bit << 1) | z_bit
+    elif op_type == 's' or op_type == 'sdag': # z ^= x
+        result_pauli = target_pauli ^ ((target_pauli & PAULI_X) << 1)
+    elif op_type == 'cz': # z1 ^= x2, z2 ^= x1
+        pauli_1, pauli_2 = target_pauli
+        result_pauli = (pauli_1 ^ ((pauli_2 & PAULI_X) << 1), pauli_2 ^ ((pauli_1 & PAULI_X) << 1))
+    elif op_type == 'cnot': # For CNOT: target_pauli=(control qubit, target qubit); z_c ^= z_t, x_t ^= x_c
+        pauli_c, pauli_t = target_pauli
+        result_pauli = (pauli_c ^ (pauli_t & PAULI_Z), pauli_t ^ (pauli_c & PAULI_X))
     else:
-        pass # Add if needed
+        result_pauli = target_pauli # Add if needed
 
     return result_pauli
 
 
 class qubit_plane_emulator:
-    def __init__(self, config, emulate, num_shots):
+    def __init__(self, config, emulate, num_shots, exact=False, shot_tol=None, seed=None):
         # Parameters
         self.config = config
         self.phy_err_rate   = float(config.phy_err_rate)
@@ -198,6 +63,9 @@ class qubit_plane_emulator:
         self.num_uccol      = self.config.num_uccol
         self.emulate_mode   = emulate
         self.num_shots      = num_shots
+        self.exact          = exact # exact logical-state distribution instead of num_shots samples
+        self.shot_tol       = shot_tol # adaptive number of shots (None: always num_shots)
+        self.seed           = seed # RNG seed of the qubit plane (None: system entropy)
         
         # Variables
         self.latest_dq_meas_arr = None
@@ -208,6 +76,7 @@ class qubit_plane_emulator:
         ## Track measurement counts to determine each measurement type in qtexec_unit
         self.count = -1
         self.lq_prob_extract_timing = None
+        self.lq_state_shots         = None # shots used for the latest (X, Y, Z) distributions
         self.mask_meas_list         = None
         self.inject_no_error_mask   = None
 
@@ -217,21 +86,22 @@ class qubit_plane_emulator:
         self.num_col_dq     = self.num_pchcol * (self.code_dist + 1) +1
         self.num_row_aq     = self.num_row_dq - 1
         self.num_col_aq     = self.num_col_dq - 1
-        self.cx_op          = 'cx'    
+        self.cx_op          = CWD_CODE['cx']
         self.x_op           = 'x'    
         self.i_op           = 'i'    
-        self.h_op           = 'h'
-        self.m_op           = 'm'
-        self.h_s_op         = 'h_s'     
-        self.sdag_h_op      = 'sdag_h'     
-        self.meas_op        = 'meas'  
-        self.cz_op          = 'cz'
-        self.h_sdag_h_op    = 'h_sdag_h'
+        self.h_op           = CWD_CODE['h']
+        self.m_op           = CWD_CODE['m']
+        self.h_s_op         = CWD_CODE['h_s']
+        self.sdag_h_op      = CWD_CODE['sdag_h']
+        self.meas_op        = CWD_CODE['meas']
+        self.cz_op          = CWD_CODE['cz']
+        self.h_sdag_h_op    = CWD_CODE['h_sdag_h']
         
         # Initialization
         self.cur_error_array_aq = self.build_error_array('aq')
         self.cur_error_array_dq = self.build_error_array('dq')
-        self.qc_compose_unit = qc_compose_unit.qc_compose_unit(self.code_dist, self.num_pchrow, self.num_pchcol, self.phy_err_rate, self.emulate_mode)
+        self.qc_compose_unit = qc_compose_unit.qc_compose_unit(self.code_dist, self.num_pchrow, self.num_pchcol, self.phy_err_rate, self.emulate_mode, self.config.qc_backend, 
+                                                              seed=self.seed, branch_param=(self.config.qc_max_branch, self.config.qc_prune_th))
         self.init_plane_info()
         self.init_mask_meas_list()
         self.init_logical_meas_timing_list()
@@ -239,32 +109,77 @@ class qubit_plane_emulator:
     def build_error_array(self, qb_type):
         # Initialize error array
         if qb_type == 'aq':
-            error_array = np.full((self.num_row_aq, self.num_col_aq), 'i')
+            error_array = np.full((self.num_row_aq, self.num_col_aq), PAULI_I, dtype=np.uint8)
         else:
-            error_array = np.full((self.num_row_dq, self.num_col_dq), 'i')
+            error_array = np.full((self.num_row_dq, self.num_col_dq), PAULI_I, dtype=np.uint8)
 
         return error_array
     
     def merge_error_array(self, error_array_1_dq, error_array_1_aq, error_array_2_dq, error_array_2_aq):
         # Element-wise merge of two error arrays
-        result_dq = self.build_error_array('dq')
-        result_aq = self.build_error_array('aq')
-        
-        for i in range(self.num_row_dq):
-            for j in range(self.num_col_dq):
-                result_dq[i][j] = merge_pauli(error_array_1_dq[i][j], error_array_2_dq[i][j])
-
-        for i in range(self.num_row_aq):
-            for j in range(self.num_col_aq):
-                result_aq[i][j] = merge_pauli(error_array_1_aq[i][j], error_array_2_aq[i][j])
+        result_dq = merge_pauli(error_array_1_dq, error_array_2_dq)
+        result_aq = merge_pauli(error_array_1_aq, error_array_2_aq)
                 
         return result_dq, result_aq 
 
+    def build_commute_layer(self, ops):
+        # Group the ops of a time step by their effect on the flattened (dq + aq) error vector
+        ## each qubit is touched at most once per time step, so a whole group is applied at once
+        layer = {'reset': [], 'h': [], 'h_t': [], 'h_s': [], 'sdag_h': [], 'cz': ([], []), 'cnot': ([], [])}
+        for op in ops:
+            op_type, q1_qb_type, q1_idx, q2_qb_type, q2_idx = op
+            q1 = self.get_flat_idx(q1_qb_type, q1_idx)
+            if op_type == 'cz':
+                layer['cz'][0].append(q1)
+                layer['cz'][1].append(self.get_flat_idx(q2_qb_type, q2_idx))
+            elif op_type == 'cnot':
+                # control: aq
+                q2 = self.get_flat_idx(q2_qb_type, q2_idx)
+                if q1_qb_type == 'aq':
+                    layer['cnot'][0].append(q1)
+                    layer['cnot'][1].append(q2)
+                else:
+                    layer['cnot'][0].append(q2)
+                    layer['cnot'][1].append(q1)
+            elif op_type == 'x' or op_type == 'i':
+                layer['reset'].append(q1)
+            elif op_type in layer:
+                layer[op_type].append(q1)
+            else:
+                pass # cx, meas; Add if needed
+        return layer
+
+    def get_flat_idx(self, qb_type, idx):
+        if qb_type == 'dq':
+            return idx[0] * self.num_col_dq + idx[1]
+        else:
+            return self.num_row_dq * self.num_col_dq + idx[0] * self.num_col_aq + idx[1]
+
+    def apply_commute_layer(self, error, layer):
+        # error: flattened (dq + aq) error vector, updated in place
+        if layer['reset']:
+            error[layer['reset']] = PAULI_I
+        if layer['h']:
+            error[layer['h']] = apply_commutation('h', error[layer['h']])
+        if layer['h_t']:
+            error[layer['h_t']] = apply_commutation('h', error[layer['h_t']])
+            if np.any(error[layer['h_t']] & PAULI_X):
+                raise Exception ("Cannot commute h_t with x or y within Clifford set")
+        if layer['h_s']:
+            error[layer['h_s']] = apply_commutation('s', apply_commutation('h', error[layer['h_s']]))
+        if layer['sdag_h']:
+            error[layer['sdag_h']] = apply_commutation('h', apply_commutation('sdag', error[layer['sdag_h']]))
+        for op_type in ['cz', 'cnot']:
+            q1, q2 = layer[op_type]
+            if q1:
+                error[q1], error[q2] = apply_commutation(op_type, (error[q1], error[q2]))
+        return
+
     def commute_error_array(self, trace_buffer, error_buffer, prev_error_dq = None, prev_error_aq = None):
         # Commute errors in the error_buffer through the codewords in the trace_buffer
         
-        error_dq = error_buffer[0]
-        error_aq = error_buffer[1]
+        error_dq = [encode_pauli_array(error) for error in error_buffer[0]]
+        error_aq = [encode_pauli_array(error) for error in error_buffer[1]]
         trace = trace_buffer
         if (prev_error_dq is None) and (prev_error_aq is None):
             start_idx = 1
@@ -275,59 +190,12 @@ class qubit_plane_emulator:
             current_error_dq = prev_error_dq
             current_error_aq = prev_error_aq
         
+        num_dq = self.num_row_dq * self.num_col_dq
         for i in range(start_idx, len(trace)-1):
-            for op in trace[i]:
-                op_type = op[0]
-                q1_qb_type = op[1]
-                q1_idx = op[2]
-                q2_qb_type = op[3]
-                q2_idx = op[4]
-
-                if q1_qb_type == 'dq':
-                    q1_target_array = current_error_dq
-                else:
-                    q1_target_array = current_error_aq
-                if q2_qb_type == 'dq':
-                    q2_target_array = current_error_dq
-                else:
-                    q2_target_array = current_error_aq
-
-                if op_type == 'cz':
-                    target_pauli = apply_commutation('cz', (q1_target_array[q1_idx], q2_target_array[q2_idx]))
-                    q1_target_array[q1_idx] = target_pauli[0]
-                    q2_target_array[q2_idx] = target_pauli[1]
-                    
-                elif op_type == 'cnot':
-                    if q1_qb_type == 'aq':
-                        target_pauli = apply_commutation('cnot', (q1_target_array[q1_idx], q2_target_array[q2_idx]))
-                        q1_target_array[q1_idx] = target_pauli[0]
-                        q2_target_array[q2_idx] = target_pauli[1]
-                    else:
-                        target_pauli = apply_commutation('cnot', (q2_target_array[q2_idx], q1_target_array[q1_idx]))
-                        q1_target_array[q1_idx] = target_pauli[1]
-                        q2_target_array[q2_idx] = target_pauli[0]
-                elif op_type == 'cx':
-                    pass
-                elif op_type == 'x':
-                    q1_target_array[q1_idx] = 'i'
-                elif op_type == 'i':
-                    q1_target_array[q1_idx] = 'i'
-                elif op_type == 'h':
-                    q1_target_array[q1_idx] = apply_commutation('h', q1_target_array[q1_idx])
-                elif op_type == 'h_t':
-                    q1_target_array[q1_idx] = apply_commutation('h', q1_target_array[q1_idx])
-                    if q1_target_array[q1_idx] == 'x' or q1_target_array[q1_idx] == 'y':
-                        raise Exception ("Cannot commute h_t with x or y within Clifford set")
-                elif op_type == 'h_s':
-                    q1_target_array[q1_idx] = apply_commutation('h', q1_target_array[q1_idx])
-                    q1_target_array[q1_idx] = apply_commutation('s', q1_target_array[q1_idx])
-                elif op_type == 'sdag_h':
-                    q1_target_array[q1_idx] = apply_commutation('sdag', q1_target_array[q1_idx])
-                    q1_target_array[q1_idx] = apply_commutation('h', q1_target_array[q1_idx])
-                elif op_type == 'meas':
-                    pass
-                else:
-                    pass # Add if needed
+            error = np.concatenate((current_error_dq.ravel(), current_error_aq.ravel()))
+            self.apply_commute_layer(error, self.build_commute_layer(trace[i]))
+            current_error_dq = error[:num_dq].reshape(current_error_dq.shape)
+            current_error_aq = error[num_dq:].reshape(current_error_aq.shape)
             
             current_error_dq, current_error_aq = self.merge_error_array(current_error_dq, current_error_aq, error_dq[i], error_aq[i])
 
@@ -356,8 +224,11 @@ class qubit_plane_emulator:
         # idx format : (patch_row, patch_col, ucl_row, ucl_col, qb_num)
 
         op_list = []
-        for idx, op in np.ndenumerate(raw_trace):
-            if not len(op) == 0:
+        for idx, cwd in np.ndenumerate(raw_trace):
+            if not cwd == CWD_CODE['']:
+                # Decode the codeword (base | (target+1) << shift)
+                op = int(cwd) & CWD_BASE_MASK
+                target = (int(cwd) >> CWD_TARGET_SHIFT) - 1
                 # Decode indices
                 patch_idx = (idx[0], idx[1])
                 ucl_idx = (idx[2], idx[3])
@@ -378,41 +249,41 @@ class qubit_plane_emulator:
                     qb_type = 'aq'
                     
                 # Convert two qubit gates
-                if op[0:2] == self.cz_op:
+                if op == self.cz_op:
                     if qb_type == 'aq':
                         pass
                     else:
                         ucl_row_off = 0
                         ucl_col_off = 0
                         if idx[4] == 0 or idx[4] == 1:
-                            if int(op[2]) == 5 or int(op[2]) == 7:
+                            if target == 5 or target == 7:
                                 ucl_row_off = -1
                         
                         if idx[4] == 0 or idx[4] == 2:
-                            if int(op[2]) == 5 or int(op[2]) == 6:
+                            if target == 5 or target == 6:
                                 ucl_col_off = -1
 
                         if idx[4] == 5 or idx[4] == 7:
-                            if int(op[2]) == 0 or int(op[2]) == 1:
+                            if target == 0 or target == 1:
                                 ucl_row_off = +1
                         
                         if idx[4] == 5 or idx[4] == 6:
-                            if int(op[2]) == 0 or int(op[2]) == 2:
+                            if target == 0 or target == 2:
                                 ucl_col_off = +1
 
                         target_patch_idx = (idx[0] + (idx[2] + ucl_row_off) // self.ucl_len, idx[1] + (idx[3] + ucl_col_off) // self.ucl_len)
                         target_ucl_idx = ((idx[2] + ucl_row_off) % self.ucl_len, (idx[3] + ucl_col_off) % self.ucl_len)
-                        if int(op[2]) <= 3:
-                            target_qb_num = int(op[2])
+                        if target <= 3:
+                            target_qb_num = target
                             target_qb_type = 'dq'
                         else:
-                            if int(op[2]) == 4:
+                            if target == 4:
                                 target_qb_num = 0
-                            elif int(op[2]) == 5:
+                            elif target == 5:
                                 target_qb_num = 3
-                            elif int(op[2]) == 6:
+                            elif target == 6:
                                 target_qb_num = 1
-                            elif int(op[2]) == 7:
+                            elif target == 7:
                                 target_qb_num = 2
                             else:
                                 raise Exception ("Invalid codeword")
@@ -522,13 +393,13 @@ class qubit_plane_emulator:
             for idx, qb_type in zip(meas_qb_idx, meas_qb_type):
                 if qb_type == 'aq':
                     qb_err = self.cur_error_array_aq[idx]
-                    if qb_err == 'x' or qb_err == 'y':
+                    if qb_err & PAULI_X:
                         aq_result_array[idx[0]][idx[1]] = 1
                     else:
                         aq_result_array[idx[0]][idx[1]] = 0
                 else: # 'dq'
                     qb_err = self.cur_error_array_dq[idx]
-                    if qb_err == 'x' or qb_err == 'y':
+                    if qb_err & PAULI_X:
                         dq_result_array[idx[0]][idx[1]] = 1
                     else:
                         dq_result_array[idx[0]][idx[1]] = 0          
@@ -537,11 +408,8 @@ class qubit_plane_emulator:
         else:
             # Find a probability of each physical qubit measurement
             # Determine measurement results with calculated probabilities
-            qc_sup = self.qc_compose_unit.get_qc()
-            for qb, idx, qb_type in zip(meas_qb_list, meas_qb_idx, meas_qb_type):
-                merged_prob, selected_result = ray.get(qc_sup.get_prob.remote(qb))
-                qc_sup.project_qc.remote(qb, selected_result)
-                
+            selected_result_list = self.qc_compose_unit.measure_many(meas_qb_list)
+            for selected_result, idx, qb_type in zip(selected_result_list, meas_qb_idx, meas_qb_type):
                 if qb_type == 'aq':
                     aq_result_array[idx[0]][idx[1]] = int(selected_result)
                 else: # 'dq'
@@ -562,14 +430,16 @@ class qubit_plane_emulator:
             lq_state_distribution = None
             lq_state_extracted = False
         else:
-            # Measure all logical qubits simultaneously for self.num_shots times
+            # Measure all logical qubits simultaneously for self.num_shots times (or compute the exact distribution)
+            ## shot_tol: stop early once the distribution is within shot_tol (self.num_shots at most)
             if (self.count in self.lq_prob_extract_timing):
                 target_lop_list = ['X','X'] + ['X'] * (self.num_lq-2)
-                lq_state_distribution_x = self.peek_logical_qubits_state(target_lop_list, num_shots = self.num_shots)
+                lq_state_distribution_x, num_shots_x = self.peek_logical_qubits_state(target_lop_list, num_shots = self.num_shots, exact = self.exact, shot_tol = self.shot_tol)
                 target_lop_list = ['Y','Y'] + ['Y'] * (self.num_lq-2)
-                lq_state_distribution_y = self.peek_logical_qubits_state(target_lop_list, num_shots = self.num_shots)
+                lq_state_distribution_y, num_shots_y = self.peek_logical_qubits_state(target_lop_list, num_shots = self.num_shots, exact = self.exact, shot_tol = self.shot_tol)
                 target_lop_list = ['Z','Z'] + ['Z'] * (self.num_lq-2)
-                lq_state_distribution_z = self.peek_logical_qubits_state(target_lop_list, num_shots = self.num_shots)
+                lq_state_distribution_z, num_shots_z = self.peek_logical_qubits_state(target_lop_list, num_shots = self.num_shots, exact = self.exact, shot_tol = self.shot_tol)
+                self.lq_state_shots = (num_shots_x, num_shots_y, num_shots_z)
             else:
                 lq_state_distribution_x = None
                 lq_state_distribution_y = None
@@ -579,9 +449,9 @@ class qubit_plane_emulator:
                 
         return lq_state_distribution, lq_state_extracted
   
-    def peek_logical_qubits_state(self, target_lop_list, num_shots = 8192):
-        prob = self.qc_compose_unit.peek_multi_logical_qubits(target_lop_list, self.lq_pchidx, self.lq_pchtype, num_shots)
-        return prob
+    def peek_logical_qubits_state(self, target_lop_list, num_shots = 8192, exact = False, shot_tol = None):
+        prob, num_shots = self.qc_compose_unit.peek_multi_logical_qubits(target_lop_list, self.lq_pchidx, self.lq_pchtype, num_shots, exact, shot_tol)
+        return prob, num_shots
 
     def init_mask_meas_list(self):
         # FIXME - No errors for
@@ -629,31 +499,8 @@ class qubit_plane_emulator:
                 self.lq_pchidx.append((2,1+(i//2)))
                 self.lq_pchtype.append('m')
   
-# Helper functions for qtexec_unit
-def convert_idx_dim(code_distance, qb_type, row, col):
-    patch_size = (code_distance + 1)
-    ucl_size = 2
-    patch_idx = (row // patch_size, col // patch_size)
-    ucl_idx = ((row % patch_size) // ucl_size, (col % patch_size) // ucl_size)
-    qb_idx = ((row % patch_size) % ucl_size) * 2 + ((col % patch_size) % ucl_size)
-    if qb_type == 'dq':
-        pass
-    else:
-        if qb_idx == 0:
-            qb_idx = 4
-        elif qb_idx == 1:
-            qb_idx = 6
-        elif qb_idx == 2:
-            qb_idx = 7
-        elif qb_idx == 3:
-            qb_idx = 5
-        else:
-            raise Exception ("Invalid qb_idx")
-
-    return patch_idx[0], patch_idx[1], ucl_idx[0], ucl_idx[1], qb_idx   
-
 class qtexec_unit:
-    def __init__(self, unit_stat, config, emulate, num_shots):
+    def __init__(self, unit_stat, config, emulate, num_shots, exact=False, shot_tol=None, seed=None):
         #
         self.config         = config
         self.unit_stat      = unit_stat
@@ -671,8 +518,13 @@ class qtexec_unit:
         
         self.emulate_mode   = emulate
         self.num_shots      = num_shots
+        self.exact          = exact
+        self.shot_tol       = shot_tol
+        self.seed           = seed
 
-        self.emulator = qubit_plane_emulator(self.config, self.emulate_mode, self.num_shots)
+        self.emulator = qubit_plane_emulator(self.config, self.emulate_mode, self.num_shots, self.exact, self.shot_tol, self.seed)
+        ## 5D index of every dq of the 2D measurement array
+        self.dq_idx_map = get_idx_map_2d_to_5d(self.code_dist, 'dq', self.num_pchrow * (self.code_dist + 1), self.num_pchcol * (self.code_dist + 1))
         
         # Wires
         ## Input wire
@@ -702,6 +554,7 @@ class qtexec_unit:
         self.lq_state_dist_list_x = list()
         self.lq_state_dist_list_y = list()
         self.lq_state_dist_list_z = list()
+        self.lq_state_shots_list = list()
         self.debug_lq_pchidx = None
         self.debug_lq_pchtype = None
         self.cycle = 0
@@ -742,6 +595,8 @@ class qtexec_unit:
 
         else:
             pass
+        # stabilizer-rank branches
+        self.unit_stat.qc_branch = self.emulator.qc_compose_unit.branch_stat
         return
 
     def calc_measresult_num (self):
@@ -781,14 +636,15 @@ class qtexec_unit:
         
         # If measurement results of both ancilla qubits and data qubits exist, pass measurement results of data qubits to adjacent ancilla qubits
         if aqmeas_valid and dqmeas_valid:
-            for (i,j), val in np.ndenumerate(dq_result):
-                if val != '-':
-                    # Pass dq result to leftbottom ancilla
-                    aq_result[i][j-1] = val
-                    aq_result[i-1][j-1] = '0'
-                    dq_result[i][j] = '0'
-                else:
-                    pass
+            row, col = np.nonzero(dq_result != '-')
+            # Pass dq result to leftbottom ancilla
+            ## write order of a row-major walk: the '0' of the next row overrides a passed result,
+            ## except for the '0' of row 0 that wraps around to the last row
+            wrap = (row == 0)
+            aq_result[row[wrap]-1, col[wrap]-1] = '0'
+            aq_result[row, col-1] = dq_result[row, col]
+            aq_result[row[~wrap]-1, col[~wrap]-1] = '0'
+            dq_result[row, col] = '0'
             
             dqmeas_valid = False
         
@@ -820,12 +676,7 @@ class qtexec_unit:
                 dq_meas_mem_2d = self.dq_meas_mem[cycle]
 
                 output_dq_meas_mem_5d = np.zeros((self.num_pchrow, self.num_pchcol, self.num_ucrow, self.num_uccol, (self.num_qb_per_uc // 2)), dtype=int)
-                for i in range(self.num_pchrow * (self.code_dist + 1)):
-                    for j in range(self.num_pchcol * (self.code_dist + 1)):
-                        if dq_meas_mem_2d[i][j] == '1':
-                            output_dq_meas_mem_5d[convert_idx_dim(self.code_dist,'dq',i,j)] = 1
-                        else:
-                            output_dq_meas_mem_5d[convert_idx_dim(self.code_dist,'dq',i,j)] = 0
+                output_dq_meas_mem_5d[self.dq_idx_map] = (dq_meas_mem_2d == '1')
                 del self.dq_meas_mem[cycle]
                 
                 self.emulator.latest_dq_meas_arr = dq_meas_mem_2d
@@ -844,6 +695,7 @@ class qtexec_unit:
             self.lq_state_dist_list_x.append(self.lq_state_distribution[0])
             self.lq_state_dist_list_y.append(self.lq_state_distribution[1])
             self.lq_state_dist_list_z.append(self.lq_state_distribution[2])
+            self.lq_state_shots_list.append(self.emulator.lq_state_shots)
 
             self.cur_lq_pchidx = self.emulator.lq_pchidx
             self.cur_lq_pchtype = self.emulator.lq_pchtype
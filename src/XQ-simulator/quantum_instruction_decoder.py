@@ -324,10 +324,11 @@ class quantum_instruction_decoder:
             # accs
             if self.to_pchdec_valid:
                  #print("to_pchdec_valid True: ", self.opcode_loc)
-                self.opcode_acc = copy.deepcopy(self.opcode_loc)
-                self.mregdst_acc = copy.deepcopy(self.mregdst_loc)
-                self.lpplist_acc_pdu = copy.deepcopy(self.lpplist_loc)
-                self.lqlist_acc = copy.deepcopy(self.lqlist_loc)
+                # new lists: the previous ones are held by to_pchdec_buf (elements are str/int)
+                self.opcode_acc = self.opcode_loc[:]
+                self.mregdst_acc = self.mregdst_loc[:]
+                self.lpplist_acc_pdu = self.lpplist_loc[:]
+                self.lqlist_acc = self.lqlist_loc[:]
             else:
                 #print("to_pchdec_valid False: ", self.opcode_loc)
                 for i in range(self.config.num_lq):
@@ -338,7 +339,7 @@ class quantum_instruction_decoder:
                         self.lqlist_acc[i] = self.lqlist_loc[i]
 
             if self.to_lqmeas_valid or self.to_pchdec_valid:
-                self.lpplist_acc_lmu = copy.deepcopy(self.lpplist_loc)
+                self.lpplist_acc_lmu = self.lpplist_loc[:]
             else:
                  for i in range(self.config.num_lq):
                     if self.lqlist_loc[i] == 1:
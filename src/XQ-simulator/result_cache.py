@@ -0,0 +1,143 @@
+import os
+import glob
+import json
+import pickle
+import hashlib
+import tempfile
+
+'''
+# result_cache stores (simulator_stat, pqsim_res) of xq_simulator.run()
+# 1) content-addressed: the key hashes every input that can change the result
+#    (qbin bytes, resolved sim_param, num_shots, skip_pqsim, exact_pqsim, shot_tol, seed, simulator code version)
+#    an unseeded run (seed None) is still cached as one sample of its distribution
+# 2) atomic: a result is written to a temporary file and renamed,
+#    so concurrent workers can share one cache directory
+# 3) LRU: a hit refreshes the file mtime, and the least recently used results are evicted
+#    when the cache grows beyond max_bytes
+# 4) legacy: on a miss, the pre-generated results shipped under simres/<config>/<qbin>.stat (& .pqsim)
+#    are still read by name (load_legacy)
+'''
+
+curr_path = os.path.abspath(__file__)
+curr_dir = os.path.dirname(curr_path)
+par_dir = os.path.join(curr_dir, os.pardir)
+
+# Default cache location & size (overridable by environment variables)
+CACHE_DIR = os.environ.get("XQSIM_CACHE_DIR", os.path.join(curr_dir, "simres", "cache"))
+CACHE_MAX_BYTES = int(float(os.environ.get("XQSIM_CACHE_MAX_MB", "1024")) * 1024 * 1024)
+CACHE_EXT = ".res"
+# Pre-generated, name-keyed results (simres/<config>/<qbin>.stat & .pqsim)
+LEGACY_DIR = os.path.join(curr_dir, "simres")
+
+# Files whose contents define the simulator behavior
+CODE_VERSION_GLOB = [
+        os.path.join(curr_dir, "*.py"),
+        os.path.join(par_dir, "util.py"),
+        os.path.join(par_dir, "sim_param.py"),
+        os.path.join(par_dir, "unit_stat.py"),
+        os.path.join(par_dir, "*.json")
+        ]
+
+_code_version = None
+
+
+def get_code_version():
+    # Hash of the simulator source files; computed once per process
+    global _code_version
+    if _code_version is None:
+        h = hashlib.sha256()
+        filepath_list = sorted({os.path.abspath(p) for pattern in CODE_VERSION_GLOB for p in glob.glob(pattern)})
+        for filepath in filepath_list:
+            h.update(os.path.basename(filepath).encode())
+            with open(filepath, "rb") as f:
+                h.update(f.read())
+        _code_version = h.hexdigest()
+    return _code_version
+
+
+def get_cache_key(qbin_filepath, param, num_shots, skip_pqsim, exact_pqsim=False, shot_tol=None, seed=None):
+    h = hashlib.sha256()
+    with open(qbin_filepath, "rb") as f:
+        h.update(f.read())
+    h.update(json.dumps(vars(param), sort_keys=True, default=str).encode())
+    h.update(json.dumps({"num_shots": num_shots, "skip_pqsim": bool(skip_pqsim), "exact_pqsim": bool(exact_pqsim), "shot_tol": shot_tol, "seed": seed}, sort_keys=True).encode())
+    h.update(get_code_version().encode())
+    return h.hexdigest()
+
+
+def load_legacy(config, qbin, skip_pqsim):
+    # Name-keyed result of a former run, or None if it does not exist
+    ## the name does not pin the qbin, config contents or code: only for runs without the newer (seed, exact, shot_tol) modes
+    dump_path = os.path.join(LEGACY_DIR, config, qbin)
+    if not os.path.exists(dump_path+".stat"):
+        return None
+    if (not skip_pqsim) and (not os.path.exists(dump_path+".pqsim")):
+        return None
+    with open(dump_path+".stat", "rb") as f:
+        simulator_stat = pickle.load(f)
+    if not skip_pqsim:
+        with open(dump_path+".pqsim", "rb") as f:
+            pqsim_res = pickle.load(f)
+    else:
+        pqsim_res = None
+    return simulator_stat, pqsim_res
+
+
+class result_cache:
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = cache_dir if cache_dir is not None else CACHE_DIR
+        self.max_bytes = max_bytes if max_bytes is not None else CACHE_MAX_BYTES
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def get_path(self, key):
+        return os.path.join(self.cache_dir, key + CACHE_EXT)
+
+    def load(self, key):
+        # Return the cached result, or None on a miss
+        path = self.get_path(key)
+        try:
+            with open(path, "rb") as f:
+                res = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        # Refresh the LRU position
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return res
+
+    def store(self, key, res):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(res, f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.get_path(key))
+        except BaseException:
+            try: os.remove(tmp_path)
+            except FileNotFoundError: pass
+            raise
+        self.evict()
+        return
+
+    def evict(self):
+        # Remove the least recently used results until the cache fits in max_bytes
+        entry_list = []
+        for path in glob.glob(os.path.join(self.cache_dir, "*" + CACHE_EXT)):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError: # evicted by another worker
+                continue
+            entry_list.append((st.st_mtime, st.st_size, path))
+        total_bytes = sum(size for _, size, _ in entry_list)
+        for _, size, path in sorted(entry_list):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+        return
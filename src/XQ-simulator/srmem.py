@@ -303,10 +303,11 @@ class srmem_single:
     def update(self):
         # mem
         ## rst_valid
+        ### entries are never written in place: output_data can be kept by reference
         if self.rst_valid:
             for i in range(self.num_rdport):
                 for j in range(self.len_mem):
-                    self.mem[i][j]['valid'] = False
+                    self.mem[i][j] = {'data': self.mem[i][j]['data'], 'valid': False}
         ## shift_en
         else:
             for i in range(self.num_rdport):
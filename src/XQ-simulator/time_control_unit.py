@@ -44,9 +44,13 @@ class time_control_unit:
         # Buffers
         self.timing_buf = buffer.buffer("timing_buf", 2)
         self.opcode_buf = buffer.buffer("opcode_buf", 2)
-        self.cwdbuf_array = np.empty((self.config.num_pchrow, self.config.num_pchcol, self.config.num_ucrow, self.config.num_uccol, self.config.num_qb_per_uc),dtype=object)
-        for (i, j, k, l, m), _ in np.ndenumerate(self.cwdbuf_array):
-            self.cwdbuf_array[i][j][k][l][m] = buffer.buffer("cwdbuf_{}".format((i, j, k, l, m)), 2)
+        ## cwdbuf_array: per-qubit buffers share the same push/pop, so they are kept as one ring buffer
+        ### (depth, pchrow, pchcol, ucrow, uccol, qb)
+        self.cwdbuf_depth = 2
+        self.cwdbuf_array = np.full((self.cwdbuf_depth, self.config.num_pchrow, self.config.num_pchcol, self.config.num_ucrow, self.config.num_uccol, self.config.num_qb_per_uc), CWD_CODE[''], dtype=np.uint8)
+        self.cwdbuf_head = 0
+        self.cwdbuf_tail = 0
+        self.cwdbuf_count = 0
         self.cycle = 0
     
     def transfer(self):
@@ -58,24 +62,16 @@ class time_control_unit:
         if self.input_valid:
             self.timing_buf.input_data = self.input_timing
             self.opcode_buf.input_data = self.input_opcode
-            for (i, j, k, l, m), cwdbuf in np.ndenumerate(self.cwdbuf_array):
-                cwdbuf.input_data = self.input_cwdarray[i][j][k][l][m]
         else:
             self.timing_buf.input_data = None
             self.opcode_buf.input_data = None
-            for (i, j, k, l, m), cwdbuf in np.ndenumerate(self.cwdbuf_array):
-                cwdbuf.input_data = None
         ## input_ready
         self.timing_buf.input_ready = self.timing_match
         self.opcode_buf.input_ready = self.timing_match
-        for (i, j, k, l, m), cwdbuf in np.ndenumerate(self.cwdbuf_array):
-            cwdbuf.input_ready = self.timing_match
 
         # buffer transfer
         self.timing_buf.transfer()
         self.opcode_buf.transfer()
-        for _, cwdbuf in np.ndenumerate(self.cwdbuf_array):
-            cwdbuf.transfer()
 
         # output
         ## output_timebuf_full/empty
@@ -86,9 +82,11 @@ class time_control_unit:
         ## output_opcode
         self.output_opcode = self.opcode_buf.head
         ## output_cwdarray
-        self.output_cwdarray = np.empty((self.config.num_pchrow, self.config.num_pchcol, self.config.num_ucrow, self.config.num_uccol, self.config.num_qb_per_uc), dtype='U8')
-        for (i, j, k, l, m), cwdbuf in np.ndenumerate(self.cwdbuf_array):
-            self.output_cwdarray[i][j][k][l][m] = cwdbuf.head
+        if self.cwdbuf_count != 0:
+            self.output_cwdarray = self.cwdbuf_array[self.cwdbuf_head].copy()
+        else:
+            # head of an empty buffer (None -> empty)
+            self.output_cwdarray = np.full((self.config.num_pchrow, self.config.num_pchcol, self.config.num_ucrow, self.config.num_uccol, self.config.num_qb_per_uc), CWD_CODE[''], dtype=np.uint8)
         return
 
 
@@ -107,8 +105,21 @@ class time_control_unit:
         # buffers
         self.timing_buf.update()
         self.opcode_buf.update()
-        for _, cwdbuf in np.ndenumerate(self.cwdbuf_array):
-            cwdbuf.update()
+        self.update_cwdbuf_array()
+        return
+
+    def update_cwdbuf_array(self):
+        # push
+        cwdbuf_full = (self.cwdbuf_count == self.cwdbuf_depth)
+        cwdbuf_empty = (self.cwdbuf_count == 0)
+        if not cwdbuf_full and self.input_valid:
+            self.cwdbuf_array[self.cwdbuf_tail] = self.input_cwdarray
+            self.cwdbuf_tail = (self.cwdbuf_tail + 1) % self.cwdbuf_depth
+            self.cwdbuf_count += 1
+        # pop
+        if not cwdbuf_empty and self.timing_match:
+            self.cwdbuf_head = (self.cwdbuf_head + 1) % self.cwdbuf_depth
+            self.cwdbuf_count -= 1
         return
 
 
@@ -117,7 +128,7 @@ class time_control_unit:
         # Add variables to check in the debugging mode
         if self.output_valid:
             print("tcu.output_cwdarray:")
-            debug_array(self.config, self.output_cwdarray)
+            debug_array(self.config, self.output_cwdarray, arr_enc='cwd')
         return
 
     def init_stats (self):
@@ -154,12 +165,7 @@ class time_control_unit:
             cycle = sim_cycle - self.unit_stat.data_transfer["QXU"]["last_cyc"]
             self.unit_stat.data_transfer["QXU"]["num_max"].append(self.config.num_pq_eff)
             #
-            num_scheduled_cwd = 0
-            for _, op in np.ndenumerate(self.output_cwdarray):
-                if len(op) != 0:
-                    num_scheduled_cwd += 1
-                else:
-                    pass
+            num_scheduled_cwd = int(np.count_nonzero(self.output_cwdarray))
             self.unit_stat.data_transfer["QXU"]["num_eff"].append(num_scheduled_cwd)
             #
             self.unit_stat.data_transfer["QXU"]["cycle"].append(cycle)
@@ -5,7 +5,6 @@ curr_path = os.path.abspath(__file__)
 curr_dir = os.path.dirname(curr_path)
 par_dir = os.path.join(curr_dir, os.pardir)
 parpar_dir = os.path.join(par_dir, os.pardir)
-res_dir = os.path.join(curr_dir, "simres")
 
 #
 from absl import flags
@@ -16,7 +15,10 @@ from parse import compile
 import timeit
 import pandas as pd
 import pickle
-import ray
+import io
+import types
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 #
 sys.path.insert(0, par_dir)
 from sim_param import sim_param
@@ -34,6 +36,56 @@ from qtexec_unit import qtexec_unit as qxu
 from error_decode_unit import error_decode_unit as edu
 from pauliframe_unit import pauliframe_unit as pfu
 from logical_measurement_unit import logical_measurement_unit as lmu 
+from result_cache import result_cache, get_cache_key, load_legacy
+from profiler import sim_profiler
+from qc_backend import is_qc_handle, QC_BACKEND_ENV
+from qc_compose_unit import derive_seed
+
+# Fast-forward
+## Attributes excluded from the unit state snapshot
+### timer is the TCU countdown itself; the rest never affects the next cycle of an idle unit
+FF_EXCLUDE_ATTR = ["config", "unit_stat", "emulator", "input_current_cycle", "timer"]
+## Minimum number of cycles to skip to take a snapshot
+### a snapshot costs about one simulated cycle
+FF_MIN_SKIP = 32
+
+# Change-driven transfer
+## Wires driven again after the first transfer() of a unit in a cycle (QID<->LMU handshake & stall/ready fan-out)
+### the unit is re-evaluated only if one of them changed since its last evaluation
+REEVAL_WIRE = {
+    "qif": ["input_instbuf_ready"],
+    "qid": ["input_xorz", "input_pchdecbuf_ready", "input_lqmeasbuf_ready"],
+    "pdu": ["input_stall"],
+    "piu": ["input_stall"],
+    "psu": ["input_cwdgen_stall", "input_timebuf_full", "input_pchwr_stall"],
+    "lmu": ["input_a_taken", "input_pchwr_stall"]
+}
+## EDU and PFU also read wires set by their own transfer() (e.g., educell tokens, opbuf_pop),
+## so they are re-evaluated every time as before
+
+# Monte-Carlo trajectories
+## Qubit-plane backend of a trajectory in a pool process (the pool already occupies the cores)
+MC_QC_BACKEND = "inline"
+
+# Checkpoint
+## Units whose state is saved, in the order of setup()
+UNIT_NAME_LIST = ["qif", "qid", "pdu", "piu", "psu", "tcu", "qxu", "edu", "pfu", "lmu"]
+
+
+class state_pickler(pickle.Pickler):
+    def reducer_override(self, obj):
+        # monkeypatched methods (e.g., patch_trace_backend)
+        if isinstance(obj, (types.MethodType, types.FunctionType)):
+            return (str, (obj.__qualname__,))
+        return NotImplemented
+
+
+class ckpt_pickler(pickle.Pickler):
+    def reducer_override(self, obj):
+        # qc_supervisor actors are recreated by setup(); their quantum state is saved separately
+        if is_qc_handle(obj):
+            return (type(None), ())
+        return NotImplemented
 
 
 class xq_simulator:
@@ -43,12 +95,33 @@ class xq_simulator:
         self.num_lq = None
         self.skip_pqsim = None
         self.num_shots = None 
+        self.exact_pqsim = False
+        self.shot_tol = None
+        self.seed = None
         self.dump = None
         self.regen = None
         self.debug = None
+        self.fast_forward = True
+        self.change_driven = True
+        self.reeval_wire_val = dict()
         #
         self.cycle = 0
         self.sim_done = False
+        self.ff_state = None
+        self.ff_stat = None
+        self.ff_num_skip_cyc = 0
+        #
+        self.ckpt_path = None
+        self.ckpt_cycles = None
+        self.ckpt_seconds = None
+        self.resume = False
+        self.ckpt_next_cycle = None
+        self.ckpt_next_time = None
+        self.ckpt_pid = None
+        self.ckpt_extra = None
+        #
+        self.profile = False
+        self.profiler = None
 
 
     def setup(self, 
@@ -57,9 +130,19 @@ class xq_simulator:
               num_lq=None,
               skip_pqsim=None, 
               num_shots=None,
+              exact_pqsim=None,
+              shot_tol=None,
+              seed=None,
               dump=None, 
               regen=None,
-              debug=None):
+              debug=None,
+              fast_forward=None,
+              change_driven=None,
+              ckpt_path=None,
+              ckpt_cycles=None,
+              ckpt_seconds=None,
+              resume=None,
+              profile=None):
         os.chdir(curr_dir)
         #
         if config is not None:
@@ -72,15 +155,32 @@ class xq_simulator:
             self.skip_pqsim = skip_pqsim
         if num_shots is not None: 
             self.num_shots = num_shots
+        if exact_pqsim is not None:
+            self.exact_pqsim = exact_pqsim
+        if shot_tol is not None:
+            self.shot_tol = shot_tol
+        if seed is not None:
+            self.seed = seed
         if dump is not None:
             self.dump = dump
         if regen is not None:
             self.regen = regen
         if debug is not None:
             self.debug = debug
-
-        if self.dump is not None and self.qbin is not None:
-            self.dump_path = self.get_dump_path()
+        if fast_forward is not None:
+            self.fast_forward = fast_forward
+        if change_driven is not None:
+            self.change_driven = change_driven
+        if ckpt_path is not None:
+            self.ckpt_path = ckpt_path
+        if ckpt_cycles is not None:
+            self.ckpt_cycles = ckpt_cycles
+        if ckpt_seconds is not None:
+            self.ckpt_seconds = ckpt_seconds
+        if resume is not None:
+            self.resume = resume
+        if profile is not None:
+            self.profile = profile
 
         if self.config is not None and self.qbin is not None and self.num_lq is not None:
             config_filepath = "{}/configs/{}.json".format(par_dir, self.config)
@@ -88,6 +188,7 @@ class xq_simulator:
             self.qbin_filepath = "{}/quantum_circuits/binary/{}.qbin".format(par_dir, self.qbin)
             self.param = sim_param(config_filepath, isadef_filepath, self.num_lq)
             self.param.refine_psu_param(target="simulator")
+            self.cache_key = get_cache_key(self.qbin_filepath, self.param, self.num_shots, self.skip_pqsim, self.exact_pqsim, self.shot_tol, self.seed)
         
         if self.param is not None:
             self.unit_stat_list = []
@@ -113,7 +214,7 @@ class xq_simulator:
                 elif unit_stat.name == "TCU":
                     self.tcu = tcu(unit_stat, self.param)
                 elif unit_stat.name == "QXU":
-                    self.qxu = qxu(unit_stat, self.param, self.skip_pqsim, self.num_shots)
+                    self.qxu = qxu(unit_stat, self.param, self.skip_pqsim, self.num_shots, self.exact_pqsim, self.shot_tol, self.seed)
                 elif unit_stat.name == "EDU":
                     self.edu = edu(unit_stat, self.param, "layer") 
                 elif unit_stat.name == "PFU":
@@ -122,39 +223,30 @@ class xq_simulator:
                     self.lmu = lmu(unit_stat, self.param)
                 else:
                     raise Exception("Invalid unit: {}".format(unit_stat.name))
-        #
-        return
 
-    def get_dump_path(self):
-        dump_dir = os.path.join(res_dir, self.config)
-        if not os.path.exists(dump_dir):
-            try: os.mkdir(dump_dir)
-            except: pass
-        dump_name = self.qbin
-        dump_path = os.path.join(dump_dir, dump_name)
+            if self.resume and self.ckpt_path is not None and os.path.exists(self.ckpt_path):
+                self.load_checkpoint()
+            self.reset_checkpoint_timer()
 
-        return dump_path
+            if self.profile:
+                self.profiler = sim_profiler()
+                for unit_name in UNIT_NAME_LIST:
+                    unit = getattr(self, unit_name)
+                    self.profiler.wrap_unit(unit.unit_stat.name, unit)
+                self.profiler.start(self.cycle)
+        #
+        return
 
     #
     def run(self):
-        if (not self.regen) and \
-            os.path.exists(self.dump_path+".stat") and \
-            (self.skip_pqsim or os.path.exists(self.dump_path+".pqsim")):
-            
-            f = open(self.dump_path+".stat", 'rb')
-            simulator_stat = pickle.load(f)
-            f.close()
-            if not self.skip_pqsim:
-                f = open(self.dump_path+".pqsim", 'rb')
-                pqsim_res = pickle.load(f)
-                f.close()
-            else:
-                pqsim_res = None
-        
-            return simulator_stat, pqsim_res
+        if not self.regen:
+            cached_res = result_cache().load(self.cache_key)
+            if cached_res is None and self.seed is None and (not self.exact_pqsim) and self.shot_tol is None:
+                cached_res = load_legacy(self.config, self.qbin, self.skip_pqsim)
+            if cached_res is not None:
+                simulator_stat, pqsim_res = cached_res
+                return simulator_stat, pqsim_res
 
-        if not ray.is_initialized():
-            ray.init()
         start = timeit.default_timer()
         print("Simulation starts", flush=True)
         #
@@ -162,10 +254,19 @@ class xq_simulator:
             self.run_cycle_transfer()
             self.run_cycle_update()
             self.run_cycle_tick()
+            self.run_cycle_skip()
+            if self.checkpoint_due():
+                self.save_checkpoint()
+        self.wait_checkpoint()
 
         print("Last cycle: {}".format(self.cycle))
+        if self.fast_forward:
+            print("Fast-forwarded cycles: {}".format(self.ff_num_skip_cyc))
         sim_time = round(timeit.default_timer()-start, 3)
         print("Simulation ends: {} sec".format(sim_time))
+        if self.profiler is not None:
+            profile = self.get_profile()
+            print("Simulation speed: {} cycles/sec".format(profile["cycles_per_sec"]))
        
         if not self.skip_pqsim:
             self.lq_state_dist_list_x = self.qxu.lq_state_dist_list_x
@@ -180,18 +281,17 @@ class xq_simulator:
             
             # To print resultant value
             pqsim_res = self.get_logical_state()
+            if self.shot_tol is not None:
+                # Shots actually used: per basis at the last extraction point, and in total
+                shots_list = self.qxu.lq_state_shots_list
+                pqsim_res["shots"] = {"cx": shots_list[-1][0], "cy": shots_list[-1][1], "cz": shots_list[-1][2], 
+                                      "total": sum(sum(shots) for shots in shots_list)}
         else: 
             pqsim_res = None
 
         simulator_stat = self.unit_stat_list
         if self.dump: 
-            f = open(self.dump_path+".stat", 'wb')
-            pickle.dump(simulator_stat, f)
-            f.close()
-            if not self.skip_pqsim:
-                f = open(self.dump_path+".pqsim", 'wb')
-                pickle.dump(pqsim_res, f)
-                f.close()
+            result_cache().store(self.cache_key, (simulator_stat, pqsim_res))
         else:
             pass
         
@@ -200,18 +300,18 @@ class xq_simulator:
     def run_cycle_transfer (self):
         ###### Transfer ######
         # QIF
-        self.qif.transfer()
+        self.eval_transfer("qif")
         # QID
         ### QIF -> QID
         self.qid.input_inst = self.qif.output_inst
         self.qid.input_instbuf_empty = self.qif.output_instbuf_empty
         self.qid.input_qifdone = self.qif.done
-        self.qid.transfer()
+        self.eval_transfer("qid")
         # PDU
         ### QID -> PDU
         self.pdu.input_from_qid = self.qid.output_to_pchdec 
         self.pdu.input_pchdecbuf_empty = self.qid.output_pchdecbuf_empty
-        self.pdu.transfer()
+        self.eval_transfer("pdu")
         # PIU
         ### PDU -> PIU
         self.piu.input_pdu_valid = self.pdu.output_valid
@@ -220,14 +320,14 @@ class xq_simulator:
         self.piu.input_pchpp_list = self.pdu.output_pchpp_list
         self.piu.input_pchop_list = self.pdu.output_pchop_list 
         self.piu.input_pchmreg_list = self.pdu.output_pchmreg_list
-        self.piu.transfer()
+        self.eval_transfer("piu")
         # PSU
         ## PIU -> PSU
         self.psu.input_topsu_valid = self.piu.output_topsu_valid
         self.psu.input_pchinfo = self.piu.output_pchinfo
         self.psu.input_opcode = self.piu.output_opcode
         self.psu.input_last_pchinfo = self.piu.output_last_pchinfo
-        self.psu.transfer()
+        self.eval_transfer("psu")
         # TCU
         ## PSU -> TCU
         self.tcu.input_valid = self.psu.output_valid
@@ -289,12 +389,12 @@ class xq_simulator:
         ### PFU -> LMU
         self.lmu.input_pf_array = self.pfu.output_pfarray
         self.lmu.input_pf_valid = self.pfu.output_valid
-        self.lmu.transfer()
+        self.eval_transfer("lmu")
         # LMU & QID
         self.qid.input_xorz = self.lmu.output_xorz
-        self.qid.transfer()
+        self.reeval_transfer("qid")
         self.lmu.input_a_taken = self.qid.output_a_taken
-        self.lmu.transfer()
+        self.reeval_transfer("lmu")
 
         # Stall & Ready signal
         physched_pchwr_stall = (self.piu.output_topsu_valid and (self.psu.pchinfo_full or self.pfu.pchinfo_full)) 
@@ -304,7 +404,7 @@ class xq_simulator:
             self.lmu.input_pchwr_stall = physched_pchwr_stall or lqmeas_pchwr_stall
         else:
             self.lmu.input_pchwr_stall = lqmeas_pchwr_stall
-        self.lmu.transfer()
+        self.reeval_transfer("lmu")
 
         ### PFU
         if self.piu.output_topsu_valid and self.piu.output_tolmu_valid:
@@ -323,20 +423,20 @@ class xq_simulator:
             self.psu.input_pchwr_stall = physched_pchwr_stall or lqmeas_pchwr_stall
         else:
             self.psu.input_pchwr_stall = physched_pchwr_stall
-        self.psu.transfer()
+        self.reeval_transfer("psu")
         ### PIU
         self.piu.input_stall = physched_pchwr_stall or lqmeas_pchwr_stall
-        self.piu.transfer()
+        self.reeval_transfer("piu")
         ### PDU
         self.pdu.input_stall = self.pdu.output_valid and (self.piu.input_stall or not self.piu.take_input)
-        self.pdu.transfer()
+        self.reeval_transfer("pdu")
         ### QID
         self.qid.input_pchdecbuf_ready = self.pdu.take_input and not self.pdu.input_stall
         self.qid.input_lqmeasbuf_ready = (not self.lmu.instinfo_full)
-        self.qid.transfer()
+        self.reeval_transfer("qid")
         ### QIM
         self.qif.input_instbuf_ready = (not self.qid.output_instdec_stall)
-        self.qif.transfer()
+        self.reeval_transfer("qif")
 
         ###### Debug ######
         if self.debug:
@@ -352,6 +452,24 @@ class xq_simulator:
             self.lmu.debug()
         return
 
+    def eval_transfer(self, unit_name):
+        # First evaluation in a cycle: registers have changed
+        unit = getattr(self, unit_name)
+        self.reeval_wire_val[unit_name] = tuple(getattr(unit, wire, None) for wire in REEVAL_WIRE[unit_name])
+        unit.transfer()
+        return
+
+    def reeval_transfer(self, unit_name):
+        # Re-evaluation: transfer() is a function of the registers and input wires,
+        # so it is skipped unless a re-driven wire has changed
+        unit = getattr(self, unit_name)
+        wire_val = tuple(getattr(unit, wire, None) for wire in REEVAL_WIRE[unit_name])
+        if self.change_driven and wire_val == self.reeval_wire_val[unit_name]:
+            return
+        self.reeval_wire_val[unit_name] = wire_val
+        unit.transfer()
+        return
+
     def run_cycle_update(self):
         if not self.skip_pqsim:
             self.qxu.save_current_logical_state()
@@ -388,24 +506,228 @@ class xq_simulator:
         else: 
             pass
         self.cycle += 1
+        if self.profiler is not None:
+            self.profiler.tick(self.cycle)
         if self.cycle % 100 == 0: 
-            print("qif.done:",self.qif.done)
-            print("qid.done:",self.qid.done)
-            print("pdu.done:",self.pdu.state == "empty")
-            print("piu.done:",self.piu.state == "ready")
-            print("psu.done:",self.psu.state == "ready")
-            print("tcu.done:",self.tcu.output_timebuf_empty)
-            print("qxu.done:",not (bool(self.qxu.dq_meas_mem) or bool(self.qxu.aq_meas_mem)))
-            print("pfu.done:",self.pfu.state == "ready")
-            print("lmu.done:",self.lmu.done)
-            ###### 
-            if not self.debug:
-                print("Cycle: ", self.cycle)
-            print("sim_done: {}".format(self.sim_done), flush=True)
+            self.print_status()
         if self.debug: 
             print("Cycle: ", self.cycle)
         return
 
+    def print_status(self):
+        print("qif.done:",self.qif.done)
+        print("qid.done:",self.qid.done)
+        print("pdu.done:",self.pdu.state == "empty")
+        print("piu.done:",self.piu.state == "ready")
+        print("psu.done:",self.psu.state == "ready")
+        print("tcu.done:",self.tcu.output_timebuf_empty)
+        print("qxu.done:",not (bool(self.qxu.dq_meas_mem) or bool(self.qxu.aq_meas_mem)))
+        print("pfu.done:",self.pfu.state == "ready")
+        print("lmu.done:",self.lmu.done)
+        ###### 
+        if not self.debug:
+            print("Cycle: ", self.cycle)
+        print("sim_done: {}".format(self.sim_done), flush=True)
+        return
+
+    def run_cycle_skip(self):
+        # Skip idle cycles
+        ## If a whole cycle left every unit unchanged except the TCU timer, 
+        ## the following cycles repeat it until the timer expires or a measurement result becomes visible.
+        ## Those cycles are skipped while accumulating the same stats.
+        if not self.fast_forward or self.sim_done or self.debug:
+            return
+        # Number of cycles until the next event
+        num_skip_max = None
+        if self.tcu.timer > 1:
+            num_skip_max = self.tcu.timer - 1
+        meas_cycle_list = list(self.qxu.aq_meas_mem) + list(self.qxu.dq_meas_mem)
+        if meas_cycle_list:
+            num_release_cyc = min(meas_cycle_list) - self.cycle
+            if num_skip_max is None or num_release_cyc < num_skip_max:
+                num_skip_max = num_release_cyc
+        if num_skip_max is None or num_skip_max < FF_MIN_SKIP or self.tcu.output_valid:
+            self.ff_state = None
+            self.ff_stat = None
+            return
+        # Compare with the snapshot of the previous cycle
+        curr_state = self.get_skip_state()
+        curr_stat = self.get_skip_stat()
+        if self.tcu.timer > 1:
+            prev_timer = self.tcu.timer + 1
+        else:
+            prev_timer = 1
+        if self.ff_state == (curr_state, prev_timer) and self.ff_stat[1] == curr_stat[1]:
+            num_skip = num_skip_max
+            for unit_stat, prev_cyc, curr_cyc in zip(self.unit_stat_list, self.ff_stat[0], curr_stat[0]):
+                unit_stat.num_update_cyc += num_skip * (curr_cyc[0] - prev_cyc[0])
+                unit_stat.num_acc_cyc += num_skip * (curr_cyc[1] - prev_cyc[1])
+            if self.tcu.timer > 1:
+                self.tcu.timer -= num_skip
+            print_status = (self.cycle + num_skip) // 100 != self.cycle // 100
+            self.cycle += num_skip
+            self.ff_num_skip_cyc += num_skip
+            if print_status:
+                self.print_status()
+            # The following cycle is not idle anymore
+            self.ff_state = None
+            self.ff_stat = None
+        else:
+            self.ff_state = (curr_state, self.tcu.timer)
+            self.ff_stat = curr_stat
+        return
+
+    def get_skip_state(self):
+        unit_list = [self.qif, self.qid, self.pdu, self.piu, self.psu, self.tcu, self.qxu, self.edu, self.pfu, self.lmu]
+        state_list = []
+        for unit in unit_list:
+            state_list.append({name: val for name, val in unit.__dict__.items() if name not in FF_EXCLUDE_ATTR})
+        f = io.BytesIO()
+        state_pickler(f, protocol=pickle.HIGHEST_PROTOCOL).dump(state_list)
+        return f.getvalue()
+
+    def get_skip_stat(self):
+        # per-unit cycle counters
+        cyc_list = []
+        # everything else that may be appended during a cycle
+        len_list = []
+        for unit_stat in self.unit_stat_list:
+            cyc_list.append((unit_stat.num_update_cyc, unit_stat.num_acc_cyc))
+            for data_transfer in unit_stat.data_transfer.values():
+                len_list.append(len(data_transfer["cycle"]))
+            if unit_stat.bw_req is not None:
+                len_list.append(len(unit_stat.bw_req["cycle"]))
+            if unit_stat.edu_cycle_result is not None:
+                len_list.append(len(unit_stat.edu_cycle_result["cyc_edu_running_list"]))
+        len_list.append(len(self.qxu.lq_state_dist_list_x))
+        len_list.append(len(self.lmu.byproduct_list))
+        len_list.append(len(self.pfu.output_pfarray_list))
+        return (cyc_list, len_list)
+
+    # Checkpoint & resume
+    ## The whole simulator state is pickled every ckpt_cycles cycles and/or ckpt_seconds seconds.
+    ## The state is collected in the simulation process, and a forked child pickles and writes it,
+    ## so the simulation continues while the checkpoint is written.
+    def reset_checkpoint_timer(self):
+        if self.ckpt_cycles is not None:
+            self.ckpt_next_cycle = self.cycle + self.ckpt_cycles
+        if self.ckpt_seconds is not None:
+            self.ckpt_next_time = timeit.default_timer() + self.ckpt_seconds
+        return
+
+    def checkpoint_due(self):
+        if self.ckpt_path is None:
+            return False
+        if self.ckpt_cycles is not None and self.cycle >= self.ckpt_next_cycle:
+            return True
+        if self.ckpt_seconds is not None and timeit.default_timer() >= self.ckpt_next_time:
+            return True
+        return False
+
+    def get_checkpoint(self, extra=None):
+        unit_state = {}
+        for unit_name in UNIT_NAME_LIST:
+            unit = getattr(self, unit_name)
+            # monkeypatched methods (e.g., patch_trace_backend) are set again by the caller
+            unit_state[unit_name] = {name: val for name, val in unit.__dict__.items() \
+                                     if not isinstance(val, (types.MethodType, types.FunctionType))}
+        ckpt = {
+            "config": self.config,
+            "num_lq": self.num_lq,
+            "skip_pqsim": self.skip_pqsim,
+            "cycle": self.cycle,
+            "sim_done": self.sim_done,
+            "ff_state": self.ff_state,
+            "ff_stat": self.ff_stat,
+            "ff_num_skip_cyc": self.ff_num_skip_cyc,
+            "param": self.param,
+            "unit_stat_list": self.unit_stat_list,
+            "unit_state": unit_state,
+            "rng_state": np.random.get_state(),
+            "qc_state": self.qxu.emulator.qc_compose_unit.get_qc_state(),
+            "extra": extra
+        }
+        return ckpt
+
+    def save_checkpoint(self, extra=None):
+        # At most one writer at a time
+        self.wait_checkpoint()
+        # Profiler wrappers are not picklable; they are set again after the snapshot
+        if self.profiler is not None:
+            self.profiler.unwrap()
+        ckpt = self.get_checkpoint(extra)
+        if hasattr(os, "fork"):
+            pid = os.fork()
+            if pid == 0:
+                # The child sees a copy-on-write snapshot of ckpt
+                try:
+                    self.write_checkpoint(ckpt)
+                    os._exit(0)
+                except BaseException:
+                    os._exit(1)
+            self.ckpt_pid = pid
+        else:
+            self.write_checkpoint(ckpt)
+        if self.profiler is not None:
+            self.profiler.rewrap()
+        self.reset_checkpoint_timer()
+        return
+
+    def write_checkpoint(self, ckpt):
+        # Write a temporary file and rename it, so that the latest checkpoint is always complete
+        tmp_path = "{}.tmp{}".format(self.ckpt_path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            ckpt_pickler(f, protocol=pickle.HIGHEST_PROTOCOL).dump(ckpt)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.ckpt_path)
+        return
+
+    def wait_checkpoint(self):
+        if self.ckpt_pid is None:
+            return
+        _, status = os.waitpid(self.ckpt_pid, 0)
+        self.ckpt_pid = None
+        if status != 0:
+            print("Checkpoint write failed: {}".format(self.ckpt_path), flush=True)
+        return
+
+    def load_checkpoint(self):
+        with open(self.ckpt_path, 'rb') as f:
+            ckpt = pickle.load(f)
+        if (ckpt["config"], ckpt["num_lq"], ckpt["skip_pqsim"]) != (self.config, self.num_lq, self.skip_pqsim):
+            raise Exception("xq_simulator - load_checkpoint: {} was taken with a different setup".format(self.ckpt_path))
+        # The qc_supervisor actor (and its backend) of this setup() replaces the saved (None) handle
+        qc_sup = self.qxu.emulator.qc_compose_unit.qc_sup
+        qc_backend = self.qxu.emulator.qc_compose_unit.backend
+        for unit_name in UNIT_NAME_LIST:
+            getattr(self, unit_name).__dict__.update(ckpt["unit_state"][unit_name])
+        self.qxu.emulator.qc_compose_unit.qc_sup = qc_sup
+        self.qxu.emulator.qc_compose_unit.backend = qc_backend
+        self.qxu.emulator.qc_compose_unit.set_qc_state(ckpt["qc_state"])
+        #
+        self.param = ckpt["param"]
+        self.unit_stat_list = ckpt["unit_stat_list"]
+        self.cycle = ckpt["cycle"]
+        self.sim_done = ckpt["sim_done"]
+        self.ff_state = ckpt["ff_state"]
+        self.ff_stat = ckpt["ff_stat"]
+        self.ff_num_skip_cyc = ckpt["ff_num_skip_cyc"]
+        np.random.set_state(ckpt["rng_state"])
+        self.ckpt_extra = ckpt["extra"]
+        print("Resumed from checkpoint: cycle {}".format(self.cycle), flush=True)
+        return
+
+
+    def get_profile(self):
+        # JSON-safe profile; the per-unit part is also attached to each unit_stat
+        if self.profiler is None:
+            return None
+        profile = self.profiler.get_profile(self.cycle)
+        for unit_stat in self.unit_stat_list:
+            unit_stat.profile = profile["units"].get(unit_stat.name)
+        return profile
+
 
     def get_logical_state (self):
 
@@ -473,9 +795,9 @@ class xq_simulator:
                 pf_product_z = 0
 
                 for pf in [pfarray[idx] for idx in qb_lop_z]:
-                    pf_product_z ^= int(pf == 'x' or pf == 'y')
+                    pf_product_z ^= int(pf == PAULI_X or pf == PAULI_Y)
                 for pf in [pfarray[idx] for idx in qb_lop_x]:
-                    pf_product_x ^= int(pf == 'z' or pf == 'y')
+                    pf_product_x ^= int(pf == PAULI_Z or pf == PAULI_Y)
                 pf_product_y = pf_product_x ^ pf_product_z
                 
                 pf_product_list_x.append(pf_product_x)
@@ -500,11 +822,88 @@ class xq_simulator:
         return res_dict
 
 
+# Monte-Carlo mode
+## num_traj independent trajectories of the whole simulation, each with its own seed derived from seed;
+## a trajectory is cached like a single run (its seed is part of the cache key)
+def init_trajectory_proc():
+    if not os.environ.get(QC_BACKEND_ENV):
+        os.environ[QC_BACKEND_ENV] = MC_QC_BACKEND
+    return
+
+
+def run_trajectory(setup_kwargs):
+    simulator = xq_simulator()
+    simulator.setup(**setup_kwargs)
+    simulator_stat, pqsim_res = simulator.run()
+    edu_cycle_result = None
+    for unit_stat in simulator_stat:
+        if unit_stat.name == "EDU":
+            edu_cycle_result = unit_stat.edu_cycle_result
+    return simulator_stat, pqsim_res, edu_cycle_result
+
+
+def run_mc(setup_kwargs, num_traj, seed=None, num_proc=None):
+    if setup_kwargs.get("ckpt_path") is not None or setup_kwargs.get("resume"):
+        raise Exception("xq_simulator - run_mc: checkpoints are not supported in Monte-Carlo mode")
+    # seed None: fresh entropy, reported in the result to reproduce the run
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    seed_list = derive_seed(seed, num_traj)
+    kwargs_list = [dict(setup_kwargs, seed=traj_seed) for traj_seed in seed_list]
+
+    if num_proc == 1:
+        traj_res_list = [run_trajectory(kwargs) for kwargs in kwargs_list]
+    else:
+        with ProcessPoolExecutor(max_workers=num_proc, mp_context=multiprocessing.get_context("spawn"), 
+                                 initializer=init_trajectory_proc) as pool:
+            traj_res_list = list(pool.map(run_trajectory, kwargs_list))
+    
+    # Aggregation
+    ## pqsim_res: mean and standard error of each state probability over the trajectories
+    pqsim_res = None
+    pqsim_stderr = None
+    pqsim_res_list = [traj_res[1] for traj_res in traj_res_list]
+    if all(res is not None for res in pqsim_res_list):
+        pqsim_res = dict()
+        pqsim_stderr = dict()
+        for basis in ["cx", "cy", "cz"]:
+            state_list = sorted({state for res in pqsim_res_list for state in res[basis]})
+            prob_array = np.array([[res[basis].get(state, 0) for state in state_list] for res in pqsim_res_list], dtype=float)
+            mean_list = prob_array.mean(axis=0)
+            stderr_list = prob_array.std(axis=0, ddof=1) / np.sqrt(num_traj) if num_traj > 1 else np.zeros(len(state_list))
+            pqsim_res[basis] = {state: float(mean) for state, mean in zip(state_list, mean_list)}
+            pqsim_stderr[basis] = {state: float(stderr) for state, stderr in zip(state_list, stderr_list)}
+    ## edu_cycle_result: per-round lists of every trajectory concatenated
+    edu_cycle_result = None
+    edu_res_list = [traj_res[2] for traj_res in traj_res_list if traj_res[2] is not None]
+    if edu_res_list:
+        edu_cycle_result = {key: [val for res in edu_res_list for val in res[key]] for key in edu_res_list[0]}
+    
+    mc_res = {
+            "num_traj": num_traj,
+            "seed": seed,
+            "seed_list": seed_list,
+            "pqsim_res": pqsim_res,
+            "pqsim_stderr": pqsim_stderr,
+            "edu_cycle_result": edu_cycle_result,
+            "simulator_stat_list": [traj_res[0] for traj_res in traj_res_list]
+            }
+    return mc_res
+
+
 ### MAIN ###
 def main(argv):
     config = FLAGS.config
     qbin = FLAGS.qbin
     num_shots = FLAGS.num_shots
+    if FLAGS.exact_pqsim == "True":
+        exact_pqsim = True
+    else:
+        exact_pqsim = False
+    shot_tol = FLAGS.shot_tol if FLAGS.shot_tol > 0 else None
+    seed = FLAGS.seed if FLAGS.seed >= 0 else None
+    num_traj = FLAGS.num_traj
+    num_proc = FLAGS.num_proc if FLAGS.num_proc > 0 else None
 
     if FLAGS.dump_sim == "True":
         dump = True
@@ -522,20 +921,71 @@ def main(argv):
         debug = True
     else:
         debug = False
+    if FLAGS.fast_forward == "True":
+        fast_forward = True
+    else:
+        fast_forward = False
+    if FLAGS.change_driven == "True":
+        change_driven = True
+    else:
+        change_driven = False
+    if FLAGS.resume == "True":
+        resume = True
+    else:
+        resume = False
+    ckpt_path = FLAGS.ckpt_path if FLAGS.ckpt_path else None
+    ckpt_cycles = FLAGS.ckpt_cycles if FLAGS.ckpt_cycles > 0 else None
+    ckpt_seconds = FLAGS.ckpt_seconds if FLAGS.ckpt_seconds > 0 else None
+    if FLAGS.profile == "True":
+        profile = True
+    else:
+        profile = False
     b_format = compile("{}_n{}") 
     _, str_lq = b_format.parse(qbin)
     num_lq = int(str_lq)+2 # total number of lq
 
-    simulator = xq_simulator()
-    simulator.setup(
+    setup_kwargs = dict(
             config=config,
             qbin=qbin,
             num_lq=num_lq,
             skip_pqsim=skip_pqsim,
             num_shots=num_shots,
+            exact_pqsim=exact_pqsim,
+            shot_tol=shot_tol,
+            seed=seed,
             dump=dump,
             regen=regen,
-            debug=debug)
+            debug=debug,
+            fast_forward=fast_forward,
+            change_driven=change_driven,
+            ckpt_path=ckpt_path,
+            ckpt_cycles=ckpt_cycles,
+            ckpt_seconds=ckpt_seconds,
+            resume=resume,
+            profile=profile)
+
+    if num_traj > 1:
+        mc_res = run_mc(setup_kwargs, num_traj, seed, num_proc)
+        print("****** XQ-simulator Result - Monte-Carlo trajectories ******")
+        print("Trajectories: {} (seed: {})".format(mc_res["num_traj"], mc_res["seed"]))
+        edu_cycle_result = mc_res["edu_cycle_result"]
+        if edu_cycle_result is not None and edu_cycle_result["cyc_edu_running_list"]:
+            cyc_list = np.array(edu_cycle_result["cyc_edu_running_list"])
+            print("EDU cycles per round: mean {}, p99 {}, max {}".format(round(cyc_list.mean(), 3), np.percentile(cyc_list, 99), cyc_list.max()))
+        print()
+        if mc_res["pqsim_res"] is not None:
+            print("****** XQ-simulator Result - Loigcal-qubit quantum state distribution (mean +- stderr) ******")
+            for basis, s_dict in mc_res["pqsim_res"].items():
+                print("****** Measurement basis: {} ******".format(basis[1].upper()))
+                for state, prob in s_dict.items():
+                    if prob <= 0:
+                        continue
+                    print("{}: {} +- {}".format(state, round(prob, 5), round(mc_res["pqsim_stderr"][basis][state], 5)))
+                print()
+        return
+
+    simulator = xq_simulator()
+    simulator.setup(**setup_kwargs)
 
     simulator_res, pqsim_res = simulator.run()
 
@@ -543,7 +993,12 @@ def main(argv):
     show_simulator_stat(simulator_res)
 
     print("****** XQ-simulator Result - Loigcal-qubit quantum state distribution ******")
+    if "shots" in pqsim_res:
+        print("Shots used: {}".format(pqsim_res["shots"]))
+        print()
     for basis, s_dict in pqsim_res.items():
+        if basis == "shots":
+            continue
         if basis == "cx": 
             basis = "X"
         elif basis == "cy":
@@ -565,8 +1020,22 @@ if __name__ == "__main__":
     flags.DEFINE_string("config", "example_cmos_d5", "target config name", short_name='c')
     flags.DEFINE_string("qbin", "pprIIZZZ_n5", "target quantum binary", short_name='b')
     flags.DEFINE_integer("num_shots", 2048, "num shots for ftn. correct mode", short_name='s')
+    flags.DEFINE_string("exact_pqsim", "False", "exact logical-state distribution instead of num_shots samples", short_name='ex')
+    flags.DEFINE_float("shot_tol", 0, "stop the shots of a logical-state peek once every outcome probability is within this tolerance "
+                      "(95% Bernstein bound relative to the total branch weight; blocks of 128 shots, "
+                      "num_shots is the budget and is used in full if the tolerance is not met; 0: always num_shots)", short_name='st')
+    flags.DEFINE_integer("seed", -1, "RNG seed of the simulation (-1: system entropy)", short_name='sd')
+    flags.DEFINE_integer("num_traj", 1, "num independent Monte-Carlo trajectories (1: single run)", short_name='nt')
+    flags.DEFINE_integer("num_proc", 0, "num processes for the Monte-Carlo trajectories (0: all cores)", short_name='np')
     flags.DEFINE_string("dump_sim", "False", "dump or not", short_name='di')
     flags.DEFINE_string("regen_sim", "False", "regen or not", short_name='ri')
     flags.DEFINE_string("skip_pqsim", "False", "skip physical-qubit level quantum simulation", short_name='sp')
     flags.DEFINE_string("debug", "False", "debug or not", short_name='db')
+    flags.DEFINE_string("fast_forward", "True", "skip idle cycles or not", short_name='ff')
+    flags.DEFINE_string("change_driven", "True", "skip unchanged transfer re-evaluations or not", short_name='cd')
+    flags.DEFINE_string("ckpt_path", "", "checkpoint file (empty: no checkpoint)", short_name='cp')
+    flags.DEFINE_integer("ckpt_cycles", 0, "checkpoint interval in cycles (0: off)", short_name='cc')
+    flags.DEFINE_float("ckpt_seconds", 0, "checkpoint interval in seconds (0: off)", short_name='cs')
+    flags.DEFINE_string("resume", "False", "resume from ckpt_path or not", short_name='rs')
+    flags.DEFINE_string("profile", "False", "profile the units or not", short_name='pf')
     app.run(main)
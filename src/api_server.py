@@ -17,6 +17,7 @@ XQsim Patch Trace API Server (Interface Layer)
 
 from __future__ import annotations
 
+import importlib.util
 import logging
 import os
 import signal
@@ -120,7 +121,13 @@ async def lifespan(app: FastAPI):
     """
     # 起動時
     logger.info("Starting XQsim API server...")
-    _init_ray_once()
+    # process/inlineバックエンドではRayを起動しない（configでrayを選んだ場合は初回利用時に起動される）
+    # Ray未インストール時はqc_backendがprocessバックエンドにフォールバックする
+    if os.environ.get("XQSIM_QC_BACKEND", "ray") == "ray":
+        if importlib.util.find_spec("ray") is not None:
+            _init_ray_once()
+        else:
+            logger.warning("Ray is not installed, the ray qc backend falls back to process")
     logger.info(f"Configuration: MAX_QASM_SIZE={MAX_QASM_SIZE_BYTES}B, "
                 f"MAX_QUBITS={MAX_QUBITS}, MAX_DEPTH={MAX_DEPTH}, "
                 f"TRACE_TIMEOUT={TRACE_TIMEOUT_SECONDS}s")
@@ -154,6 +161,7 @@ class TraceRequest(BaseModel):
     )
     keep_artifacts: bool = Field(False, description="Keep intermediate artifacts (debug)")
     debug_logging: bool = Field(False, description="Enable verbose debug logging")
+    profile: bool = Field(False, description="Attach a per-unit runtime profile to meta")
     
     @validator("qasm")
     def validate_qasm_size(cls, v):
@@ -265,6 +273,7 @@ def trace(req: TraceRequest) -> TraceResponse:
             skip_pqsim=True,
             keep_artifacts=req.keep_artifacts,
             debug_logging=req.debug_logging,
+            profile=req.profile,
             timeout_seconds=TRACE_TIMEOUT_SECONDS,
         )
         
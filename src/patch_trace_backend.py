@@ -508,6 +508,11 @@ def trace_patches_from_qasm(
     debug_logging: bool = False,
     max_cycles: int = 10_000_000,
     timeout_seconds: Optional[int] = None,
+    checkpoint_path: Optional[str] = None,
+    checkpoint_cycles: Optional[int] = None,
+    checkpoint_seconds: Optional[float] = None,
+    resume: bool = False,
+    profile: bool = False,
 ) -> Dict[str, Any]:
     """
     Main entry: QASM文字列を入力として、既存XQsimを用いてパッチ時系列(JSON)を返す。
@@ -521,6 +526,11 @@ def trace_patches_from_qasm(
         debug_logging: 詳細デバッグログを有効にするか
         max_cycles: 最大サイクル数（無限ループ防止）
         timeout_seconds: wall clockタイムアウト（秒）。Noneの場合はチェックしない
+        checkpoint_path: チェックポイントファイル。Noneの場合は保存しない
+        checkpoint_cycles: チェックポイント間隔（サイクル）
+        checkpoint_seconds: チェックポイント間隔（秒）
+        resume: checkpoint_pathが存在すれば、そこから再開する（eventsも復元）
+        profile: ユニット毎の実行時間プロファイルをmeta.profileに含めるか
     
     Returns:
         パッチトレースを含むJSON形式の辞書
@@ -613,6 +623,11 @@ def trace_patches_from_qasm(
         dump=False,
         regen=True,
         debug=False,
+        ckpt_path=checkpoint_path,
+        ckpt_cycles=checkpoint_cycles,
+        ckpt_seconds=checkpoint_seconds,
+        resume=resume,
+        profile=profile,
     )
 
     # emulate属性の設定
@@ -665,18 +680,31 @@ def trace_patches_from_qasm(
     events: List[Dict[str, Any]] = []
     accepted_inst_count = 0
 
+    # チェックポイントから再開した場合、トレース側の状態も復元する
+    if sim.ckpt_extra is not None:
+        patch_initial = sim.ckpt_extra["patch_initial"]
+        prev_snapshot = sim.ckpt_extra["prev_snapshot"]
+        events = sim.ckpt_extra["events"]
+        accepted_inst_count = sim.ckpt_extra["accepted_inst_count"]
+        # クロージャが参照するtrace_metaはそのまま使う
+        trace_meta.__dict__.update(sim.ckpt_extra["trace_meta"].__dict__)
+
     # デバッグログの間隔
     debug_log_interval = int(os.environ.get("XQSIM_DEBUG_LOG_INTERVAL", "1000"))
     
     # タイムアウトチェック間隔（サイクル）
     timeout_check_interval = 100
 
+    # fast-forwardでサイクルが飛ぶため、剰余ではなく次回チェック位置で判定する
+    next_timeout_check = 0
+
     termination_reason = "normal"
 
     with _intercept_sys_exit() as exit_info:
         while not sim.sim_done:
             # タイムアウトチェック
-            if timeout_seconds is not None and sim.cycle % timeout_check_interval == 0:
+            if timeout_seconds is not None and sim.cycle >= next_timeout_check:
+                next_timeout_check = sim.cycle + timeout_check_interval
                 elapsed = time.time() - start_time
                 if elapsed > timeout_seconds:
                     termination_reason = "timeout"
@@ -721,6 +749,18 @@ def trace_patches_from_qasm(
 
             sim.run_cycle_update()
             sim.run_cycle_tick()
+            # アイドルサイクルの早送り（PIUが受理しないサイクルのみ対象）
+            sim.run_cycle_skip()
+
+            # チェックポイント（書き込みはfork先で行われる）
+            if sim.checkpoint_due():
+                sim.save_checkpoint(extra={
+                    "patch_initial": patch_initial,
+                    "prev_snapshot": prev_snapshot,
+                    "events": events,
+                    "accepted_inst_count": accepted_inst_count,
+                    "trace_meta": trace_meta,
+                })
 
             # デバッグログ（オプション）
             if debug_logging and sim.cycle % debug_log_interval == 0:
@@ -741,6 +781,7 @@ def trace_patches_from_qasm(
                     "states": _get_unit_states(sim),
                 })
                 break
+    sim.wait_checkpoint()
 
     # 5) Build response JSON
     elapsed_time = time.time() - start_time
@@ -761,6 +802,7 @@ def trace_patches_from_qasm(
             "forced_terminations": trace_meta.forced_terminations,
             "stability_check_failures": trace_meta.stability_check_failures[:10],  # 最大10件
             "warnings": trace_meta.warnings,
+            "profile": sim.get_profile(),
         },
         "input": {
             "qasm": qasm_str,
@@ -828,6 +870,31 @@ def main() -> None:
         default=None,
         help="Timeout in seconds",
     )
+    parser.add_argument(
+        "--checkpoint", default=None, help="Checkpoint file path"
+    )
+    parser.add_argument(
+        "--checkpoint_cycles",
+        type=int,
+        default=None,
+        help="Checkpoint interval in cycles",
+    )
+    parser.add_argument(
+        "--checkpoint_seconds",
+        type=float,
+        default=None,
+        help="Checkpoint interval in seconds",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Resume from --checkpoint if it exists",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Attach a per-unit runtime profile to meta",
+    )
     parser.add_argument(
         "--out", default="-", help="Output JSON path, or '-' for stdout"
     )
@@ -846,6 +913,11 @@ def main() -> None:
         keep_artifacts=bool(args.keep_artifacts),
         debug_logging=bool(args.debug),
         timeout_seconds=args.timeout,
+        checkpoint_path=args.checkpoint,
+        checkpoint_cycles=args.checkpoint_cycles,
+        checkpoint_seconds=args.checkpoint_seconds,
+        resume=bool(args.resume),
+        profile=bool(args.profile),
     )
 
     out_json = json.dumps(res, ensure_ascii=False, indent=2)
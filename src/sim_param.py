@@ -261,6 +261,12 @@ class sim_param:
                     unit_cfg["num_qbdmx_out"] = ceil(num_qb_per_uc/num_qbctrl)               
                 else:
                     raise Exception("sim_param - set_uarch_param: Please first define {} microarchitecture for PSU".format(uarch))
+                # Simulation engine of the mask/target generation (does not change the modeled hardware)
+                ## loop: per-generator object model, vector: template-based numpy model
+                if "engine" not in unit_cfg:
+                    unit_cfg["engine"] = "loop"
+                if unit_cfg["engine"] not in ["loop", "vector"]:
+                    raise Exception("sim_param - set_uarch_param: Please first define {} engine for PSU".format(unit_cfg["engine"]))
 
             elif unit_name == "TCU":
                 if uarch in ["baseline", "simplebuf"]:
@@ -273,6 +279,20 @@ class sim_param:
                     pass
                 else:
                     raise Exception("sim_param - set_uarch_param: Please first define {} microarchitecture for QXU".format(uarch))
+                # Execution backend of the stabilizer-rank workers (does not change the modeled hardware)
+                ## ray, process, or inline; XQSIM_QC_BACKEND overrides it at run time
+                ## ray falls back to process when ray is not installed
+                if "backend" not in unit_cfg:
+                    unit_cfg["backend"] = "ray"
+                if unit_cfg["backend"] not in ["ray", "process", "inline"]:
+                    raise Exception("sim_param - set_uarch_param: Please first define {} backend for QXU".format(unit_cfg["backend"]))
+                # Stabilizer-rank branch management
+                ## max_branch: branch budget per worker (0: unlimited; beyond it, branches are sampled)
+                ## prune_th: branches whose |coefficient| falls below it are dropped (0: no pruning)
+                if "max_branch" not in unit_cfg:
+                    unit_cfg["max_branch"] = 0
+                if "prune_th" not in unit_cfg:
+                    unit_cfg["prune_th"] = 0.0
 
             elif unit_name == "EDU":
                 if uarch in ["baseline", "fast", "fastsliding"]:
@@ -290,6 +310,16 @@ class sim_param:
                         unit_cfg["num_pe"] = 1                   
                 else:
                     raise Exception("sim_param - set_uarch_param: Please first define {} microarchitecture for EDU".format(uarch))
+                # Simulation engine of the educell grid (does not change the modeled hardware)
+                ## loop: per-educell object model, vector: numpy arrays over the ancilla grid
+                if "engine" not in unit_cfg:
+                    unit_cfg["engine"] = "vector"
+                if unit_cfg["engine"] not in ["loop", "vector"]:
+                    raise Exception("sim_param - set_uarch_param: Please first define {} engine for EDU".format(unit_cfg["engine"]))
+                # Round memo: outcomes of layer-mode decoding bursts keyed by (layout, syndromes & last_aqmeas_flip, uarch)
+                ## memo_size: max num entries (0: off); vector engine only
+                if "memo_size" not in unit_cfg:
+                    unit_cfg["memo_size"] = 0
 
             elif unit_name == "PFU":
                 if uarch == "baseline":
@@ -379,12 +409,19 @@ class sim_param:
         self.num_ucc = psu_param["num_ucc"]
         self.num_qbctrl = psu_param["num_qbctrl"]
         self.num_mask = psu_param["num_mask"]
+        self.psu_engine = psu_param["engine"]
         ### TCU
+        ### QXU
+        self.qc_backend = self.arch_unit["QXU"]["backend"]
+        self.qc_max_branch = self.arch_unit["QXU"]["max_branch"]
+        self.qc_prune_th = self.arch_unit["QXU"]["prune_th"]
         ### EDU
         edu_param =self.arch_unit["EDU"]
         self.bd_delay = edu_param["bd_delay"]
         self.aqmeas_th = edu_param["aqmeas_th"]
         self.timeout_limit = edu_param["timeout_limit"]
+        self.edu_engine = edu_param["engine"]
+        self.edu_memo_size = edu_param["memo_size"]
         ### PFU
         ### LMU
 
@@ -33,4 +33,7 @@ class unit_stat_sim:
         self.num_update_cyc = 0
         self.data_transfer = dict()
         self.edu_cycle_result = None # EDU
+        self.edu_memo = None # EDU
         self.bw_req = None # TCU
+        self.qc_branch = None # QXU
+        self.profile = None # profiler
@@ -1,3 +1,4 @@
+import os
 import json
 import numpy as np
 from math import *
@@ -17,6 +18,50 @@ def getJsonData (json_path):
         
     return json_data
 
+## uint8 encodings of codewords and Paulis (encoding_format.json)
+_enc_def = getJsonData(os.path.join(os.path.dirname(os.path.abspath(__file__)), "encoding_format.json"))
+CWD_CODE = _enc_def["cwd"]
+CWD_TARGET_SHIFT = _enc_def["cwd_target_shift"]
+CWD_BASE_MASK = (1 << CWD_TARGET_SHIFT) - 1
+PAULI_CODE = _enc_def["pauli"]
+PAULI_I = PAULI_CODE["i"]
+PAULI_X = PAULI_CODE["x"]
+PAULI_Z = PAULI_CODE["z"]
+PAULI_Y = PAULI_CODE["y"]
+_cwd_name = {v: k for (k, v) in CWD_CODE.items()}
+_pauli_name = {v: k for (k, v) in PAULI_CODE.items()}
+
+def encode_cwd (cwd, target=None):
+    # None (no codeword) is encoded as an empty slot
+    code = CWD_CODE[cwd] if cwd is not None else CWD_CODE[""]
+    if target is not None:
+        code |= (int(target) + 1) << CWD_TARGET_SHIFT
+    return code
+
+def decode_cwd (code):
+    cwd = _cwd_name.get(int(code) & CWD_BASE_MASK, '?')
+    target = int(code) >> CWD_TARGET_SHIFT
+    if target > 0:
+        cwd += str(target - 1)
+    return cwd
+
+CWD_STR_TABLE = np.array([decode_cwd(code) for code in range(256)], dtype='U8')
+PAULI_STR_TABLE = np.array([_pauli_name.get(code, '?') for code in range(256)], dtype='U8')
+
+def decode_cwd_array (cwd_array):
+    return CWD_STR_TABLE[np.asarray(cwd_array, dtype=np.uint8)]
+
+def decode_pauli_array (pauli_array):
+    return PAULI_STR_TABLE[np.asarray(pauli_array, dtype=np.uint8)]
+
+## character (code point) -> Pauli code; '-' (no error) is encoded as 'i'
+_PAULI_CHAR_TABLE = np.zeros(128, dtype=np.uint8)
+for _name, _code in PAULI_CODE.items():
+    _PAULI_CHAR_TABLE[ord(_name)] = _code
+
+def encode_pauli_array (pauli_array):
+    return _PAULI_CHAR_TABLE[np.asarray(pauli_array, dtype='U1').view(np.uint32)]
+
 def fill_param_line (src, dst, param_dict):
     lines = open(src, "r").readlines()
     f_dst = open(dst, "w")
@@ -87,7 +132,12 @@ def print_lattice(lattice_array, code_distance):
     
     return
 
-def debug_array(param, cwd_list, arr_qb_type = 'dq'):
+def debug_array(param, cwd_list, arr_qb_type = 'dq', arr_enc = None):
+    # arr_enc: 'cwd' or 'pauli' for the uint8-encoded arrays
+    if arr_enc == 'cwd':
+        cwd_list = decode_cwd_array(cwd_list)
+    elif arr_enc == 'pauli':
+        cwd_list = decode_pauli_array(cwd_list)
     patch_size = (param.code_dist + 1)    
     num_row_dq = param.num_pchrow * patch_size + 1  
     num_col_dq = param.num_pchcol * patch_size + 1  
@@ -172,7 +222,12 @@ def debug_array(param, cwd_list, arr_qb_type = 'dq'):
     print_lattice(lattice_array, param.code_dist)
     return
 
-def debug_patch(param, cwd_list, arr_qb_type = 'dq'):
+def debug_patch(param, cwd_list, arr_qb_type = 'dq', arr_enc = None):
+    # arr_enc: 'cwd' or 'pauli' for the uint8-encoded arrays
+    if arr_enc == 'cwd':
+        cwd_list = decode_cwd_array(cwd_list)
+    elif arr_enc == 'pauli':
+        cwd_list = decode_pauli_array(cwd_list)
     patch_size = (param.code_dist + 1)    
     num_row_dq = patch_size + 1  
     num_col_dq = patch_size + 1  
@@ -290,114 +345,94 @@ def apply_lop_sign_to_c (abcd_reg, lop_sign):
     
     return {'a':a,'b':b,'c':c,'d':d}
 
+## byproduct ('I'/'X'/'Y'/'Z') <-> Pauli code
+BP_CODE = {name.upper(): code for (name, code) in PAULI_CODE.items()}
+BP_NAME = {code: name for (name, code) in BP_CODE.items()}
+
 def merge_bp (current_bp, new_bp):
+    # Product of byproducts (up to phase): XOR of the (x-bit, z-bit) codes
     next_bp = current_bp[:]
     for i, (c, n) in enumerate(zip(next_bp, new_bp)):
-        if c == 'I':
-            next_bp[i] = n
-        elif c == 'X':
-            if n == 'I':
-                next_bp[i] = 'X'
-            elif n == 'X':
-                next_bp[i] = 'I'
-            elif n == 'Y':
-                next_bp[i] = 'Z'
-            elif n == 'Z':
-                next_bp[i] = 'Y'
-            else:
-                raise Exception()
-        elif c == 'Y':
-            if n == 'I':
-                next_bp[i] = 'Y'
-            elif n == 'X':
-                next_bp[i] = 'Z'
-            elif n == 'Y':
-                next_bp[i] = 'I'
-            elif n == 'Z':
-                next_bp[i] = 'X'
-            else:
-                raise Exception()
-        elif c == 'Z':
-            if n == 'I':
-                next_bp[i] = 'Z'
-            elif n == 'X':
-                next_bp[i] = 'Y'
-            elif n == 'Y':
-                next_bp[i] = 'X'
-            elif n == 'Z':
-                next_bp[i] = 'I'
-            else:
-                raise Exception()
-        else:
+        if (c not in BP_CODE) or (n not in BP_CODE):
             raise Exception()
+        next_bp[i] = BP_NAME[BP_CODE[c] ^ BP_CODE[n]]
         
     return next_bp
 
+## (target_pchidx, pchtype, code_distance) -> (qb_lop_x, qb_lop_z); the lists are shared and must not be modified
+_lop_qb_cache = dict()
+
 def get_lop_qb (target_pchidx, pchtype, code_distance):
+    key = (tuple(target_pchidx), pchtype, code_distance)
+    if key not in _lop_qb_cache:
+        _lop_qb_cache[key] = build_lop_qb(target_pchidx, pchtype, code_distance)
+    return _lop_qb_cache[key]
+
+def build_lop_qb (target_pchidx, pchtype, code_distance):
     pchrow, pchcol = target_pchidx
         
     if pchtype == 'x':
-        qb_lop_x = [convert_idx_2d_to_5d (code_distance,'dq',i,j) \
+        qb_lop_x = [(i,j) \
             for i in [(pchrow + 1) * (code_distance + 1) - 1] \
             for j in range((pchcol) * (code_distance + 1) + 1, (pchcol + 1) * (code_distance + 1))]
-        qb_lop_z = [convert_idx_2d_to_5d (code_distance,'dq',i,j) \
+        qb_lop_z = [(i,j) \
             for i in range((pchrow) * (code_distance + 1) + 1, (pchrow + 1) * (code_distance + 1)) \
             for j in [(pchcol) * (code_distance + 1) + 1]]
     elif pchtype == 'mb':
-        qb_lop_x = [convert_idx_2d_to_5d (code_distance,'dq',i,j) \
+        qb_lop_x = [(i,j) \
             for i in [(pchrow + 1) * (code_distance + 1) - 1] \
             for j in range((pchcol) * (code_distance + 1) + 1, (pchcol + 1) * (code_distance + 1))]
-        qb_lop_z = [convert_idx_2d_to_5d (code_distance,'dq',i,j) \
+        qb_lop_z = [(i,j) \
             for i in range((pchrow -1) * (code_distance + 1) + 1, (pchrow) * (code_distance + 1)) \
             for j in [(pchcol) * (code_distance + 1) + 1]] + \
-                [convert_idx_2d_to_5d (code_distance,'dq',i,j) \
+                [(i,j) \
             for i in range((pchrow) * (code_distance + 1) + 1, (pchrow + 1) * (code_distance + 1)) \
             for j in [(pchcol) * (code_distance + 1) + 1]]
     elif pchtype == 'zb':
-        qb_lop_x = [convert_idx_2d_to_5d (code_distance,'dq',i,j) \
+        qb_lop_x = [(i,j) \
             for i in range((pchrow - 1) * (code_distance + 1) +1, (pchrow) * (code_distance + 1) +1) \
             for j in [(pchcol + 1) * (code_distance + 1) - 1]]
-        qb_lop_z = [convert_idx_2d_to_5d (code_distance,'dq',i,j) \
+        qb_lop_z = [(i,j) \
             for i in range((pchrow) * (code_distance + 1), (pchrow + 1) * (code_distance + 1)) \
             for j in [(pchcol + 1) * (code_distance + 1) - 1]]
     elif pchtype == 'm':
-        qb_lop_z = [convert_idx_2d_to_5d (code_distance,'dq',i,j) \
+        qb_lop_z = [(i,j) \
             for i in [(pchrow + 1) * (code_distance + 1) - 1] \
             for j in range((pchcol) * (code_distance + 1) + 1, (pchcol + 1) * (code_distance + 1))]
-        qb_lop_x = [convert_idx_2d_to_5d (code_distance,'dq',i,j) \
+        qb_lop_x = [(i,j) \
             for i in range((pchrow) * (code_distance + 1) + 1, (pchrow + 1) * (code_distance + 1)) \
             for j in [(pchcol) * (code_distance + 1) + 1]]
     elif pchtype == 'dq_eb_l':
-        qb_lop_x = ([convert_idx_2d_to_5d (code_distance,'dq',i,j) \
+        qb_lop_x = ([(i,j) \
             for i in range(pchrow*(code_distance+1), (pchrow+1)*(code_distance+1)) \
             for j in [(pchcol)*(code_distance+1)+1]])
-        qb_lop_z = [convert_idx_2d_to_5d (code_distance,'dq',i,j) \
+        qb_lop_z = [(i,j) \
             for i in range((pchrow -1)*(code_distance+1)+1, pchrow*(code_distance +1) +1) \
             for j in [(pchcol)*(code_distance +1) +1]]
     elif pchtype == 'dq_eb_r':
-        qb_lop_x = ([convert_idx_2d_to_5d (code_distance,'dq',i,j) \
+        qb_lop_x = ([(i,j) \
             for i in range(pchrow*(code_distance+1)+1, (pchrow+1)*(code_distance+1)) \
             for j in [(pchcol+1)*(code_distance+1)-1]])
-        qb_lop_z = [convert_idx_2d_to_5d (code_distance,'dq',i,j) \
+        qb_lop_z = [(i,j) \
             for i in range((pchrow-1)*(code_distance+1)+1, pchrow*(code_distance+1)+2) \
             for j in [(pchcol+1)*(code_distance+1)-1]]
     elif pchtype == 'dq_ob_l':
-        qb_lop_x = ([convert_idx_2d_to_5d (code_distance,'dq',i,j) \
+        qb_lop_x = ([(i,j) \
             for i in range(pchrow*(code_distance+1)+1, (pchrow+1)*(code_distance+1)) \
             for j in [(pchcol)*(code_distance+1)+1]])
-        qb_lop_z = [convert_idx_2d_to_5d (code_distance,'dq',i,j) \
+        qb_lop_z = [(i,j) \
             for i in range((pchrow-1)*(code_distance+1)+1, pchrow*(code_distance+1)+2) \
             for j in [(pchcol)*(code_distance+1)+1]]
     elif pchtype == 'dq_ob_r':
-        qb_lop_x = ([convert_idx_2d_to_5d (code_distance,'dq',i,j) \
+        qb_lop_x = ([(i,j) \
             for i in range(pchrow*(code_distance+1), (pchrow+1)*(code_distance+1)) \
             for j in [(pchcol+1)*(code_distance+1)-1]])
-        qb_lop_z = [convert_idx_2d_to_5d (code_distance,'dq',i,j) \
+        qb_lop_z = [(i,j) \
             for i in range((pchrow-1)*(code_distance+1)+1, pchrow*(code_distance+1)+1) \
             for j in [(pchcol+1)*(code_distance+1)-1]]
     else:
         raise Exception("Undefined pchtype: {} at {}".format(pchtype, target_pchidx))
-    return qb_lop_x, qb_lop_z
+    return convert_idx_list_2d_to_5d(code_distance, 'dq', qb_lop_x), convert_idx_list_2d_to_5d(code_distance, 'dq', qb_lop_z)
 
 def convert_idx_2d_to_5d (code_distance, qb_type, row, col):
     patch_size = (code_distance + 1)
@@ -420,4 +455,36 @@ def convert_idx_2d_to_5d (code_distance, qb_type, row, col):
         else:
             raise Exception ("Invalid qb_idx")
 
-    return patch_idx[0], patch_idx[1], ucl_idx[0], ucl_idx[1], qb_idx   
+    return patch_idx[0], patch_idx[1], ucl_idx[0], ucl_idx[1], qb_idx
+
+## aq qb_idx of the 2D offset ((row % 2) * 2 + (col % 2)) in a unit cell
+AQ_QBIDX_MAP = np.array([4, 6, 7, 5])
+
+def convert_idx_array_2d_to_5d (code_distance, qb_type, row, col):
+    # convert_idx_2d_to_5d over index arrays; the result is a fancy index of the 5D array
+    patch_size = (code_distance + 1)
+    ucl_size = 2
+    qb_idx = ((row % patch_size) % ucl_size) * 2 + ((col % patch_size) % ucl_size)
+    if qb_type != 'dq':
+        qb_idx = AQ_QBIDX_MAP[qb_idx]
+
+    return row // patch_size, col // patch_size, (row % patch_size) // ucl_size, (col % patch_size) // ucl_size, qb_idx
+
+def convert_idx_list_2d_to_5d (code_distance, qb_type, idx_list):
+    # [(row, col)] -> [5D index]
+    if not idx_list:
+        return []
+    row, col = np.array(idx_list).T
+    idx_5d = convert_idx_array_2d_to_5d(code_distance, qb_type, row, col)
+    return [tuple(int(i) for i in idx) for idx in zip(*idx_5d)]
+
+## (code_distance, qb_type, num_row, num_col) -> 5D index of every 2D position
+_idx_map_cache = dict()
+
+def get_idx_map_2d_to_5d (code_distance, qb_type, num_row, num_col):
+    # 5D index arrays with the 2D shape: arr_5d[idx_map] = arr_2d scatters, arr_5d[idx_map] gathers
+    key = (code_distance, qb_type, num_row, num_col)
+    if key not in _idx_map_cache:
+        row, col = np.indices((num_row, num_col))
+        _idx_map_cache[key] = convert_idx_array_2d_to_5d(code_distance, qb_type, row, col)
+    return _idx_map_cache[key]   
@@ -31,6 +31,13 @@ def show_simulator_stat(unit_stat_list):
             print("EDU cycles: ")
             display(df)
             print()
+            edu_memo = getattr(unit_stat, "edu_memo", None)
+            if edu_memo is not None:
+                df = pd.DataFrame([edu_memo])
+                df.index = ['']
+                print("EDU round memo: ")
+                display(df)
+                print()
         
         if unit_stat.name == "TCU":
             df = pd.DataFrame(unit_stat.bw_req).drop_duplicates()
@@ -39,6 +46,14 @@ def show_simulator_stat(unit_stat_list):
             print("Inst. sent from TCU to QXU: ")
             display(df) 
             print()
+
+        if unit_stat.name == "QXU" and getattr(unit_stat, "qc_branch", None) is not None: # pre-generated stats have no qc_branch
+            df = pd.DataFrame([unit_stat.qc_branch])
+            blank_idx = ['']*len(df)
+            df.index = blank_idx
+            print("Stabilizer-rank branches: ")
+            display(df)
+            print()
     return 
 
 def show_estimator_result(unit_stat_list, sfq_detail=False):
@@ -68,6 +83,8 @@ def show_estimator_result(unit_stat_list, sfq_detail=False):
 def draw_pqsim_res(pqsim_res, lqsim_res):
     _pqsim_res = dict()
     for basis, res in pqsim_res.items():
+        if basis == "shots":
+            continue
         _pqsim_res[basis] = dict()
         for state, prob in res.items():
             # _state = state[4:]
@@ -16,10 +16,10 @@ from parse import compile
 from xq_simulator import xq_simulator
 from xq_estimator import xq_estimator
 from sim_param import sim_param
+from util import CWD_CODE
 from visualization import *
 
 #
-import ray
 import time
 from multiprocessing import Process, Queue
 import numpy as np
@@ -158,11 +158,11 @@ class xqsim:
         esm_seq = self.simulator.psu.cwdNtime_srmem["RESM"]
         for entry in esm_seq:
             cwd = entry[1]
-            if cwd == "h":
+            if cwd == CWD_CODE["h"]:
                 esm_latency += param.sqgate_ns
-            elif cwd == "cz":
+            elif cwd == CWD_CODE["cz"]:
                 esm_latency += param.tqgate_ns
-            elif cwd == "meas":
+            elif cwd == CWD_CODE["meas"]:
                 esm_latency += param.meas_ns
             else:
                 raise Exception()